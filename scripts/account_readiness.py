@@ -0,0 +1,117 @@
+"""
+Account-switch readiness probe.
+
+After /v2/session/account_switch the new JWT's claims take a moment to be
+honoured across CSP. Scripts used to sleep a fixed 2-3s to cover that; this
+module instead polls the cheap /v2/current_account endpoint with sub-second,
+adaptive backoff until it answers for the target account, and records the
+observed propagation delay.
+
+Usage:
+  from account_readiness import wait_for_account
+  delay = wait_for_account(session, base_url, headers, account_id)
+
+  # Summarise recorded delays:
+  python3 account_readiness.py
+
+Environment Variables:
+  CSP_SWITCH_READY_TIMEOUT - Max seconds to wait for readiness (default: 10)
+  CSP_SWITCH_DELAY_LOG     - JSONL file of observed delays
+                             (default: ~/.cache/infoblox/switch_delays.jsonl, "off" to disable)
+"""
+
+import os
+import json
+import time
+import random
+
+DEFAULT_TIMEOUT = float(os.environ.get("CSP_SWITCH_READY_TIMEOUT", "10"))
+DEFAULT_DELAY_LOG = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "switch_delays.jsonl")
+
+
+def _delay_log_path():
+    path = os.environ.get("CSP_SWITCH_DELAY_LOG", DEFAULT_DELAY_LOG)
+    return None if path.lower() == "off" else path
+
+
+def _answers_for(data, account_id):
+    """True if a /v2/current_account body refers to account_id (or no id to compare)."""
+    if not account_id:
+        return True
+    result = data.get("result", data) if isinstance(data, dict) else {}
+    current = str(result.get("id", "")) if isinstance(result, dict) else ""
+    return not current or current.split("/")[-1] == str(account_id)
+
+
+def record_delay(account_id, delay, ready, attempts):
+    path = _delay_log_path()
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a") as f:
+            f.write(json.dumps({"ts": round(time.time(), 3), "account_id": account_id,
+                                "delay": round(delay, 3), "ready": ready,
+                                "attempts": attempts}) + "\n")
+    except OSError:
+        pass  # recording is best-effort
+
+
+def wait_for_account(session, base_url, headers, account_id=None, timeout=None,
+                     initial_interval=0.1, max_interval=1.0):
+    """
+    Poll GET /v2/current_account until it returns 200 for account_id.
+    401/403/404/5xx and a mismatching account id count as "not yet".
+    Returns the observed delay in seconds; on timeout it warns and returns
+    anyway, since the callers' own retries still cover late propagation.
+    """
+    timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+    url = f"{base_url}/v2/current_account"
+    start = time.monotonic()
+    interval = initial_interval
+    attempts = 0
+
+    while True:
+        attempts += 1
+        try:
+            r = session.get(url, headers=headers, timeout=(5, 10))
+            if r.status_code == 200 and _answers_for(r.json(), account_id):
+                delay = time.monotonic() - start
+                record_delay(account_id, delay, True, attempts)
+                return delay
+        except ValueError:
+            pass  # non-JSON body: not ready yet
+        except Exception as e:  # network hiccup: keep probing until the deadline
+            print(f"⚠️ Readiness probe error: {e}", flush=True)
+
+        elapsed = time.monotonic() - start
+        if elapsed + interval > timeout:
+            record_delay(account_id, elapsed, False, attempts)
+            print(f"⚠️ Account {account_id} not confirmed ready after {elapsed:.1f}s; continuing", flush=True)
+            return elapsed
+        time.sleep(interval + random.uniform(0, interval / 4))
+        interval = min(max_interval, interval * 1.6)
+
+
+def summarize(path=None):
+    path = path or _delay_log_path()
+    try:
+        with open(path) as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    except (OSError, TypeError):
+        rows = []
+    delays = sorted(r["delay"] for r in rows if r.get("ready"))
+    if not delays:
+        print("ℹ️ No account-switch delays recorded yet.")
+        return
+
+    def pct(p):
+        return delays[min(len(delays) - 1, int(round(p / 100 * (len(delays) - 1))))]
+
+    timeouts = sum(1 for r in rows if not r.get("ready"))
+    print(f"⏱️ Account-switch propagation over {len(delays)} switch(es) ({timeouts} timed out):")
+    print(f"   p50={pct(50):.2f}s  p95={pct(95):.2f}s  max={delays[-1]:.2f}s")
+
+
+if __name__ == "__main__":
+    summarize()
@@ -0,0 +1,124 @@
+"""
+Deterministic admission slotting for script start-up.
+
+The allocation scripts used to open with time.sleep(random.uniform(1, 5))
+(create/delete_subtenant_infoblox.py with up to 15s / 10s) to avoid start-up
+collisions. That cost every student an average 3-8s even when nobody else was
+starting, and two random draws could still collide. admit() instead:
+
+  - runs immediately when there is no contention
+  - on one host, hands out start slots from a shared slot file (flock): a
+    burst as large as the rate-limit bucket's starts at once, later scripts
+    go one slot apart in arrival order
+  - under load, spreads starts over the window by a hash of the participant
+    id, so the same student always lands in the same slot and different
+    students are spread evenly
+
+The load signal is host-local: this host's rate-limit bucket being drained,
+blocked by a WAF 403 / Retry-After, or throttled within the last minute
+(rate_limiter.py records every such response the broker or CSP sends).
+Hosts share no state, so a fresh student VM sees no load before its first
+broker call. To spread a whole class across VMs, set ADMISSION_LOAD in the
+track at a known class start (or pre-allocate with bulk_allocate.py).
+
+Usage:
+  from admission import admit
+  admit("broker", participant_id)                 # before the first broker call
+  admit("csp:write", team_id, spread=15)          # instead of sleep(uniform(1, 15))
+
+Environment Variables:
+  ADMISSION_SPREAD  - Override the spread window in seconds for contended starts
+  ADMISSION_SLOT    - Seconds between host-local start slots (default: 1 / bucket rate)
+  ADMISSION_LOAD    - Force a load signal 0..1 on every VM (e.g. 1 at a known class start)
+  ADMISSION_DISABLE - Set to 1 to start immediately, always
+  RATE_LIMIT_DIR    - Where the slot files live (shared with rate_limiter.py)
+"""
+
+import os
+import json
+import time
+import fcntl
+import hashlib
+from rate_limiter import DEFAULT_BUDGETS, DEFAULT_STATE_DIR, ensure_state_dir, get_limiter
+
+DEFAULT_SPREAD = 5.0
+MAX_HOST_WAIT = 120  # never queue behind more than this on one host
+
+
+def participant_fraction(participant_id):
+    """Stable position in [0, 1) for a participant id."""
+    digest = hashlib.sha256((participant_id or "").encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def _env_float(name, default):
+    """float(os.environ[name]), or default when unset, empty or malformed (with a warning)."""
+    value = os.environ.get(name, "").strip()
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"⚠️ Ignoring bad {name}={value!r}", flush=True)
+        return default
+
+
+def load_signal(bucket):
+    """ADMISSION_LOAD if set, else this host's rate-limit load for bucket (0..1)."""
+    forced = _env_float("ADMISSION_LOAD", None)
+    if forced is not None:
+        return max(0.0, min(1.0, forced))
+    limiter = get_limiter()
+    return limiter.load(bucket) if limiter else 0.0
+
+
+def host_slot(bucket, slot_seconds, burst=1):
+    """
+    Claim the next start slot on this host; returns seconds until it begins.
+    GCRA: the first `burst` simultaneous starts go at once, later ones one slot apart.
+    """
+    state_dir = ensure_state_dir(os.environ.get("RATE_LIMIT_DIR", DEFAULT_STATE_DIR))
+    path = os.path.join(state_dir, f"admission_{bucket.replace(':', '_')}.json")
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(fd, "r+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+            now = time.time()
+            tat = max(now, float(state.get("tat", 0))) + slot_seconds  # theoretical arrival time
+            wait = min(MAX_HOST_WAIT, max(0.0, tat - now - burst * slot_seconds))
+            state["tat"] = tat
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+            f.flush()
+            return wait
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def admit(bucket="broker", participant_id=None, spread=DEFAULT_SPREAD):
+    """Wait for this script's start slot; returns seconds waited (0 when uncontended)."""
+    if os.environ.get("ADMISSION_DISABLE", "0") == "1":
+        return 0.0
+    spread = _env_float("ADMISSION_SPREAD", spread)
+    limiter = get_limiter()
+    budgets = limiter.budgets if limiter else DEFAULT_BUDGETS  # honours RATE_LIMIT_BUDGETS
+    rate, burst = budgets.get(bucket, DEFAULT_BUDGETS["csp:read"])
+    slot = _env_float("ADMISSION_SLOT", 1.0 / rate)
+
+    load = load_signal(bucket)
+    try:
+        local_wait = host_slot(bucket, slot, burst)
+    except OSError:
+        local_wait = 0.0
+    hashed_wait = participant_fraction(participant_id) * spread * load if participant_id else 0.0
+    wait = max(local_wait, hashed_wait)
+    if wait > 0.05:
+        reason = "host slot" if local_wait >= hashed_wait else f"load {load:.0%}"
+        print(f"🚦 Admission: starting in {wait:.1f}s ({reason})", flush=True)
+        time.sleep(wait)
+    return wait
@@ -15,6 +15,10 @@ Environment Variables (Instruqt provides most automatically):
   INSTRUQT_PARTICIPANT_ID - Required. Unique per student (provided by Instruqt).
   INSTRUQT_TRACK_SLUG     - Lab identifier (provided by Instruqt).
   SANDBOX_NAME_PREFIX     - Filter sandboxes by name prefix (default: "lab")
+  PREALLOCATED_BUNDLE_DIR - Bundles from bulk_allocate.py; used instead of /allocate
+  ALLOCATION_WAIT_TIMEOUT - Seconds to wait for a free sandbox when the pool is
+                            exhausted (default: 0 = fail fast on 409)
+  BROKER_HEDGE            - Set to 1 to hedge slow /allocate calls (see hedging.py)
 
 Output Files:
   subtenant_id.txt      - CSP ID (e.g., 2026838)
@@ -23,13 +27,19 @@ Output Files:
   sandbox_name.txt      - Human name (e.g., lab-adventure-0086)
   sfdc_account_id.txt   - Salesforce ID (e.g., 001SAND15956299f9d)
   sandbox_env.sh        - Source-able env vars for bash scripts
+  warm_user.json        - Pre-provisioned user, when bulk_allocate.py --warm-pool
+                          put one in this participant's bundle (read by user_provision.py)
 """
 
 import os
 import sys
 import time
-import random
-import requests
+from broker_client import (BrokerClient, allocation_wait_timeout, bundle_dirname,
+                           load_preallocated_bundle, write_allocation_bundle)
+from warm_pool import WARM_USER_FILE, copy_bundle_warm_user
+from retry_policy import RetryError
+from lab_telemetry import start_run
+from admission import admit
 
 # ----------------------------------
 # Configuration
@@ -43,8 +53,17 @@ INSTRUQT_SANDBOX_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
 INSTRUQT_TRACK_ID = os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab")
 SANDBOX_NAME_PREFIX = os.environ.get("SANDBOX_NAME_PREFIX", "lab")
 
-# Startup jitter
-time.sleep(random.uniform(1, 5))
+# Optional: keep waiting (capped backoff) for a sandbox to free up when the pool
+# is exhausted, instead of failing the track on the first 409
+ALLOCATION_WAIT_TIMEOUT = allocation_wait_timeout()
+
+# One JSONL telemetry record per run (attempts, latencies, outcome), see lab_telemetry.py
+run = start_run("allocate", INSTRUQT_SANDBOX_ID, INSTRUQT_TRACK_ID, attempt_endpoint="/allocate")
+
+# Admission slot (not needed when bulk_allocate.py already did the allocation):
+# immediate when uncontended, spread by participant hash / host slot otherwise
+if not load_preallocated_bundle(INSTRUQT_SANDBOX_ID):
+    admit("broker", INSTRUQT_SANDBOX_ID)
 
 # ----------------------------------
 # Validation
@@ -65,54 +84,45 @@ if SANDBOX_NAME_PREFIX:
 # ----------------------------------
 # Allocate Sandbox
 # ----------------------------------
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "Content-Type": "application/json",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-    "X-Instruqt-Track-ID": INSTRUQT_TRACK_ID,
-}
-if SANDBOX_NAME_PREFIX:
-    headers["X-Sandbox-Name-Prefix"] = SANDBOX_NAME_PREFIX
-
-max_retries = 5
-allocation_response = None
+broker = BrokerClient(
+    base_url=BROKER_API_URL,
+    token=BROKER_API_TOKEN,
+    participant_id=INSTRUQT_SANDBOX_ID,
+    track_id=INSTRUQT_TRACK_ID,
+    name_prefix=SANDBOX_NAME_PREFIX,
+)
 
-for attempt in range(max_retries):
-    try:
-        print(f"🔄 Allocation attempt {attempt + 1}/{max_retries}...", flush=True)
-        resp = requests.post(
-            f"{BROKER_API_URL}/allocate",
-            headers=headers,
-            timeout=(5, 30),
-        )
-
-        if resp.status_code in (200, 201):
-            allocation_response = resp.json()
-            emoji = "✅" if resp.status_code == 201 else "🔄"
-            print(f"{emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
-            break
-        elif resp.status_code == 409:
-            print("❌ Pool exhausted: No sandboxes available", flush=True)
-            sys.exit(1)
-        elif resp.status_code == 403:
-            print("⚠️ Rate limited, waiting...", flush=True)
-            time.sleep(10)
-        elif resp.status_code in {500, 502, 503, 504}:
-            print(f"⚠️ Server error {resp.status_code}, retrying...", flush=True)
-            time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
-        else:
-            print(f"❌ HTTP {resp.status_code}: {resp.text}", flush=True)
-            sys.exit(1)
-
-    except requests.exceptions.Timeout:
-        print("⚠️ Timeout, retrying...", flush=True)
-        time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
-    except Exception as e:
-        print(f"⚠️ Error: {e}", flush=True)
-        time.sleep(min(2 ** attempt + random.uniform(0, 1), 30))
+# Pre-allocated by bulk_allocate.py? Then there is nothing to ask the broker for.
+allocation_response = load_preallocated_bundle(INSTRUQT_SANDBOX_ID)
+if allocation_response:
+    print(f"⚡ Using pre-allocated sandbox from {os.environ.get('PREALLOCATED_BUNDLE_DIR')}", flush=True)
+    run.update(preallocated=True)
+    bundle_dir = os.path.join(os.environ["PREALLOCATED_BUNDLE_DIR"], bundle_dirname(INSTRUQT_SANDBOX_ID))
+    if copy_bundle_warm_user(bundle_dir):
+        print(f"⚡ Pre-provisioned user delivered with the bundle ({WARM_USER_FILE})", flush=True)
 else:
-    print("❌ Allocation failed after all retries", flush=True)
-    sys.exit(1)
+    print("🔄 Requesting sandbox allocation...", flush=True)
+    try:
+        resp = broker.allocate(wait_timeout=ALLOCATION_WAIT_TIMEOUT)
+    except RetryError as e:
+        run.fail("retries_exhausted")
+        print(f"{e}", flush=True)
+        print("❌ Allocation failed after all retries", flush=True)
+        sys.exit(1)
+
+    if resp.status_code == 409:
+        waited = f" after waiting {ALLOCATION_WAIT_TIMEOUT:.0f}s" if ALLOCATION_WAIT_TIMEOUT else ""
+        run.fail("pool_exhausted", waited_seconds=ALLOCATION_WAIT_TIMEOUT)
+        print(f"❌ Pool exhausted: No sandboxes available{waited}", flush=True)
+        sys.exit(1)
+    elif resp.status_code not in (200, 201):
+        run.fail(f"http_{resp.status_code}")
+        print(f"❌ HTTP {resp.status_code}: {resp.text}", flush=True)
+        sys.exit(1)
+
+    allocation_response = resp.json()
+    emoji = "✅" if resp.status_code == 201 else "🔄"
+    print(f"{emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
 
 # ----------------------------------
 # Extract IDs
@@ -134,35 +144,17 @@ if "/" in external_id:
 # ----------------------------------
 # Save to Files
 # ----------------------------------
-files = {
-    "subtenant_id.txt": sandbox_id,
-    "external_id.txt": external_id,
-    "sandbox_id.txt": external_id,
-    "sandbox_name.txt": sandbox_name,
-    "sfdc_account_id.txt": sfdc_account_id,
-}
-
+files = write_allocation_bundle(allocation_response)
 for filename, value in files.items():
-    with open(filename, "w") as f:
-        f.write(value)
     print(f"✅ {filename}: {value}", flush=True)
 
-# ----------------------------------
-# Export Environment Variables
-# ----------------------------------
-with open("sandbox_env.sh", "w") as f:
-    f.write("#!/bin/bash\n")
-    f.write("# Auto-generated by allocation_broker_subtenant.py\n")
-    f.write(f"export STUDENT_TENANT={sandbox_name}\n")
-    f.write(f"export CSP_ACCOUNT_ID={external_id}\n")
-    f.write(f"export BROKER_SANDBOX_ID={sandbox_id}\n")
-    f.write(f"export SFDC_ACCOUNT_ID={sfdc_account_id}\n")
-
 print(f"\n💡 Instruqt: set-var STUDENT_TENANT {sandbox_name}", flush=True)
 print(f"   set-var CSP_ACCOUNT_ID {external_id}", flush=True)
 print(f"   set-var BROKER_SANDBOX_ID {sandbox_id}", flush=True)
 print(f"   set-var SFDC_ACCOUNT_ID {sfdc_account_id}", flush=True)
 
+run.succeed(sandbox_id=sandbox_id, sandbox_name=sandbox_name, expires_at=expires_at)
+
 # ----------------------------------
 # Summary
 # ----------------------------------
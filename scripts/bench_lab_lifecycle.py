@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+End-to-end lab provisioning benchmark with percentile reporting.
+
+Runs the Instruqt setup chain
+
+  allocation_subtenant.py -> user_provision.py -> deploy_aws_discovery_final.py
+  -> infoblox_vpn_configure_final.py -> update_uddi_tunnel_final.py
+
+N times sequentially and N times with K concurrent simulated students,
+against local stand-ins: mock_csp_server.py for CSP, mock_broker_server.py
+for the broker, and fixture files / fake credentials for AWS (the tunnel IPs
+create_aws_vpn.py would write). Every student gets its own work dir and
+HOME, like a separate lab VM. Per-step and total p50/p95/p99 are printed
+and saved as JSON together with the git commit, so regressions between
+commits are visible.
+
+Usage:
+  python3 bench_lab_lifecycle.py --runs 10 --concurrency 5
+  python3 bench_lab_lifecycle.py --runs 10 --concurrency 5 --compare bench_results/<old>.json
+
+  # Against already running stand-ins instead of spawning them:
+  python3 bench_lab_lifecycle.py --csp-url http://127.0.0.1:8080 --broker-url http://127.0.0.1:8081/v1
+
+Options:
+  --runs N               Chains per phase (default: 5)
+  --concurrency K        Simulated students in the concurrent phase (default: 4, 0 to skip)
+  --steps LIST           Comma-separated subset of steps to run
+  --latency S            Mock CSP base latency (default: 0.03)
+  --error-rate F         Mock CSP injected error rate (default: 0)
+  --switch-delay S       Mock CSP switched-JWT propagation delay (default: 0.5)
+  --consistency-delay S  Mock CSP list visibility delay (default: 2)
+  --output FILE          Results JSON (default: bench_results/<timestamp>-<commit>.json)
+  --compare FILE         Print p50/p95 deltas against an earlier results JSON
+  --keep-workdirs        Leave per-student work dirs in place for inspection
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import mock_csp_server
+import mock_broker_server
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STEPS = [
+    ("allocate", "allocation_subtenant.py"),
+    ("user_provision", "user_provision.py"),
+    ("aws_discovery", "deploy_aws_discovery_final.py"),
+    ("vpn_configure", "infoblox_vpn_configure_final.py"),
+    ("tunnel_update", "update_uddi_tunnel_final.py"),
+]
+FIXTURES = ("payload_template.json", "config_vpn.yaml")
+STEP_TIMEOUT = 900
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(durations):
+    return {"n": len(durations),
+            "mean": round(sum(durations) / len(durations), 3) if durations else None,
+            **{f"p{p}": (round(percentile(durations, p), 3) if durations else None) for p in (50, 95, 99)},
+            "max": round(max(durations), 3) if durations else None}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# ---------- stand-ins ----------
+def start_standins(args):
+    """Run the CSP and broker mocks in background threads on free ports."""
+    csp = mock_csp_server.serve(mock_csp_server.parse_args([
+        "--port", "0", "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+        "--switch-delay", str(args.switch_delay), "--consistency-delay", str(args.consistency_delay)]))
+    broker = mock_broker_server.serve(mock_broker_server.parse_args([
+        "--port", "0", "--pool-size", str(args.runs * 2 + 10)]))
+    for server in (csp, broker):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    return (f"http://127.0.0.1:{csp.server_address[1]}",
+            f"http://127.0.0.1:{broker.server_address[1]}/v1", (csp, broker))
+
+
+def student_env(workdir, student, csp_url, broker_url):
+    env = dict(os.environ)
+    env.update({
+        "HOME": workdir,  # own token cache / delay log / rate-limit state, like a separate VM
+        "RATE_LIMIT_DIR": os.path.join(workdir, ".ratelimit"),
+        "CSP_METRICS_DIR": "off",
+        "CSP_POOL_STATS": "0",
+        "PYTHONPATH": SCRIPTS_DIR,
+        "CSP_BASE_URL": csp_url,
+        "BROKER_API_URL": broker_url,
+        "BROKER_API_TOKEN": "bench-token",
+        "INSTRUQT_PARTICIPANT_ID": student,
+        "INSTRUQT_TRACK_SLUG": "bench-lab",
+        "INSTRUQT_EMAIL": f"{student}@bench.lab",
+        "INFOBLOX_EMAIL": "admin@bench.lab",
+        "INFOBLOX_PASSWORD": "bench",
+        "INSTRUQT_AWS_ACCOUNT_INFOBLOX_DEMO_ACCOUNT_ID": "123456789012",
+        "INSTRUQT_AWS_ACCOUNT_INFOBLOX_DEMO_AWS_ACCESS_KEY_ID": "AKIABENCHMARK",
+        "INSTRUQT_AWS_ACCOUNT_INFOBLOX_DEMO_AWS_SECRET_ACCESS_KEY": "bench-secret",
+    })
+    return env
+
+
+# ---------- one simulated student ----------
+def run_chain(student, steps, csp_url, broker_url, keep_workdir=False):
+    workdir = tempfile.mkdtemp(prefix=f"bench-{student}-")
+    for name in FIXTURES:
+        shutil.copy(os.path.join(SCRIPTS_DIR, name), workdir)
+    with open(os.path.join(workdir, "aws_tunnels.txt"), "w") as f:  # AWS stand-in
+        f.write("tunnel1,198.51.100.1\ntunnel2,198.51.100.2\n")
+    env = student_env(workdir, student, csp_url, broker_url)
+
+    result = {"student": student, "steps": {}, "ok": True}
+    chain_start = time.monotonic()
+    try:
+        for name, script in steps:
+            start = time.monotonic()
+            proc = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, script)],
+                                  cwd=workdir, env=env, capture_output=True, text=True,
+                                  timeout=STEP_TIMEOUT)
+            result["steps"][name] = round(time.monotonic() - start, 3)
+            if proc.returncode != 0:
+                result.update(ok=False, failed_step=name,
+                              error=(proc.stdout + proc.stderr).strip().splitlines()[-5:])
+                break
+    except subprocess.TimeoutExpired as e:
+        result.update(ok=False, failed_step=name, error=[f"timeout after {e.timeout}s"])
+    finally:
+        if not keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    result["total"] = round(time.monotonic() - chain_start, 3)
+    return result
+
+
+def run_phase(label, runs, concurrency, steps, csp_url, broker_url, keep):
+    print(f"\n🏁 Phase '{label}': {runs} chain(s), concurrency={concurrency}", flush=True)
+    start = time.monotonic()
+    students = [f"bench-{label}-{i:03d}-{int(time.time())}" for i in range(runs)]
+
+    def one(student):
+        r = run_chain(student, steps, csp_url, broker_url, keep)
+        status = "✅" if r["ok"] else f"❌ failed at {r['failed_step']}"
+        print(f"   {status} {student}: {r['total']:.1f}s", flush=True)
+        for line in r.get("error", []):
+            print(f"      {line}", flush=True)
+        return r
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        results = list(pool.map(one, students))
+    wall = time.monotonic() - start
+    ok = [r for r in results if r["ok"]]
+    report = {
+        "runs": runs, "concurrency": concurrency, "succeeded": len(ok),
+        "wall_seconds": round(wall, 3),
+        "throughput_per_min": round(60 * len(ok) / wall, 2) if wall else None,
+        "steps": {name: summarize([r["steps"][name] for r in ok if name in r["steps"]])
+                  for name, _ in steps},
+        "total": summarize([r["total"] for r in ok]),
+        "failures": [{k: r[k] for k in ("student", "failed_step", "error")} for r in results if not r["ok"]],
+    }
+    print_phase(label, report)
+    return report
+
+
+def print_phase(label, report):
+    print(f"\n📊 {label}: {report['succeeded']}/{report['runs']} ok, wall {report['wall_seconds']:.1f}s, "
+          f"{report['throughput_per_min']} chains/min", flush=True)
+    print(f"   {'step':<16}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}", flush=True)
+    for name, s in [*report["steps"].items(), ("TOTAL", report["total"])]:
+        if s["n"]:
+            print(f"   {name:<16}{s['p50']:>8.2f}{s['p95']:>8.2f}{s['p99']:>8.2f}{s['max']:>8.2f}", flush=True)
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\n🔍 vs {baseline_path} (commit {baseline.get('commit')}):", flush=True)
+    for phase, report in current["phases"].items():
+        old = baseline.get("phases", {}).get(phase)
+        if not old:
+            continue
+        for name, s in [*report["steps"].items(), ("TOTAL", report["total"])]:
+            o = old["total"] if name == "TOTAL" else old["steps"].get(name)
+            if not o or not s["n"] or not o.get("n"):
+                continue
+            d50, d95 = s["p50"] - o["p50"], s["p95"] - o["p95"]
+            flag = "⚠️" if d95 > 0.1 * o["p95"] else "  "
+            print(f"   {flag} {phase:<11}{name:<16} p50 {d50:+7.2f}s   p95 {d95:+7.2f}s", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lab provisioning chain")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--steps", help="Comma-separated subset of: " + ",".join(n for n, _ in STEPS))
+    parser.add_argument("--csp-url")
+    parser.add_argument("--broker-url")
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--switch-delay", type=float, default=0.5)
+    parser.add_argument("--consistency-delay", type=float, default=2.0)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--keep-workdirs", action="store_true")
+    args = parser.parse_args()
+
+    steps = STEPS
+    if args.steps:
+        wanted = set(args.steps.split(","))
+        steps = [s for s in STEPS if s[0] in wanted]
+
+    csp_url, broker_url = args.csp_url, args.broker_url
+    if not (csp_url and broker_url):
+        mock_csp, mock_broker, _ = start_standins(args)
+        csp_url, broker_url = csp_url or mock_csp, broker_url or mock_broker
+    print(f"🧪 CSP: {csp_url}   Broker: {broker_url}", flush=True)
+
+    results = {"commit": git_commit(), "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+               "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+               "phases": {}}
+    results["phases"]["sequential"] = run_phase("sequential", args.runs, 1, steps, csp_url, broker_url,
+                                                args.keep_workdirs)
+    if args.concurrency > 1:
+        results["phases"]["concurrent"] = run_phase("concurrent", args.runs, args.concurrency, steps,
+                                                    csp_url, broker_url, args.keep_workdirs)
+
+    output = args.output or os.path.join("bench_results", f"{time.strftime('%Y%m%d-%H%M%S')}-{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results saved to {output}", flush=True)
+
+    if args.compare:
+        compare(results, args.compare)
+    failed = sum(len(p["failures"]) for p in results["phases"].values())
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
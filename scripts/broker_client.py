@@ -0,0 +1,206 @@
+"""
+Sandbox Broker API client shared by the allocation / deallocation scripts.
+
+Calls go through the pooled session from csp_client, so they are metered by
+the host-wide rate limiter: a WAF 403 or a Retry-After from the broker blocks
+the "broker" bucket for every script on the host instead of each one
+sleeping a flat 10s on its own.
+
+Usage:
+  broker = BrokerClient(participant_id=..., track_id=..., name_prefix="lab")
+  resp = broker.allocate()               # retried under the "broker_allocate" policy
+  resp = broker.allocate(wait_timeout=900)  # also queue on 409 (pool exhausted) for up to 15 min
+  resp = broker.mark_for_deletion(subtenant_id)
+  resp = broker.deallocate(subtenant_id)  # same, retried under "broker_deallocate"
+  broker = BrokerClient(..., hedge=True)  # hedge slow /allocate calls (default: $BROKER_HEDGE)
+
+  write_allocation_bundle(resp.json(), "bundles/<participant>")  # sandbox_id.txt & co.
+  allocation = load_preallocated_bundle(participant_id)          # from bulk_allocate.py
+
+Environment Variables:
+  BROKER_API_URL   - Broker endpoint (default: https://api-sandbox-broker.highvelocitynetworking.com/v1)
+  BROKER_API_TOKEN - API token for the Broker
+  PREALLOCATED_BUNDLE_DIR - Directory of per-participant bundles written by
+                            bulk_allocate.py (checked before calling /allocate)
+  BROKER_HEDGE     - Set to 1 to hedge /allocate: send a second request when the
+                     first is slower than the observed p95 (see hedging.py)
+  ALLOCATION_WAIT_TIMEOUT - Seconds to keep waiting for a free sandbox when the
+                            pool is exhausted (default: 0 = fail fast on 409)
+"""
+
+import os
+import re
+import json
+import time
+from csp_client import get_session
+from retry_policy import get_policy, RetryError
+from hedging import LatencyWindow, hedged_call
+
+DEFAULT_BROKER_API_URL = "https://api-sandbox-broker.highvelocitynetworking.com/v1"
+ALLOCATE_TIMEOUT = (5, 30)   # connect=5s, read=30s
+DEALLOCATE_TIMEOUT = (5, 15)
+
+
+def allocation_wait_timeout():
+    """ALLOCATION_WAIT_TIMEOUT in seconds (0 disables queue-and-wait)."""
+    try:
+        return max(0.0, float(os.environ.get("ALLOCATION_WAIT_TIMEOUT", "0")))
+    except ValueError:
+        return 0.0
+
+
+BUNDLE_ALLOCATION_FILE = "allocation.json"
+
+
+def bundle_dirname(participant_id):
+    """Filesystem-safe per-participant bundle directory name."""
+    return re.sub(r"[^A-Za-z0-9_.@-]", "_", participant_id)
+
+
+def allocation_bundle(allocation):
+    """{filename: value} the lifecycle scripts read after allocation, from an /allocate response."""
+    external_id = (allocation.get("external_id") or "").split("/")[-1]
+    return {
+        "subtenant_id.txt": allocation.get("sandbox_id") or "",
+        "external_id.txt": external_id,
+        "sandbox_id.txt": external_id,  # same as external_id (backward compat)
+        "sandbox_name.txt": allocation.get("name") or "",
+        "sfdc_account_id.txt": allocation.get("sfdc_account_id") or "",
+    }
+
+
+def write_allocation_bundle(allocation, directory="."):
+    """Write the ID files, sandbox_env.sh and the raw response into directory; returns the ID files."""
+    files = allocation_bundle(allocation)
+    os.makedirs(directory, exist_ok=True)
+    for filename, value in files.items():
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(value)
+    with open(os.path.join(directory, "sandbox_env.sh"), "w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("# Auto-generated by allocation_broker_subtenant.py\n")
+        f.write(f"export STUDENT_TENANT={files['sandbox_name.txt']}\n")
+        f.write(f"export CSP_ACCOUNT_ID={files['external_id.txt']}\n")
+        f.write(f"export BROKER_SANDBOX_ID={files['subtenant_id.txt']}\n")
+        f.write(f"export SFDC_ACCOUNT_ID={files['sfdc_account_id.txt']}\n")
+    with open(os.path.join(directory, BUNDLE_ALLOCATION_FILE), "w") as f:
+        json.dump(allocation, f, indent=2)
+    return files
+
+
+def load_preallocated_bundle(participant_id, bundle_root=None):
+    """The /allocate response bulk_allocate.py saved for participant_id, or None."""
+    bundle_root = bundle_root or os.environ.get("PREALLOCATED_BUNDLE_DIR")
+    if not bundle_root or not participant_id:
+        return None
+    path = os.path.join(bundle_root, bundle_dirname(participant_id), BUNDLE_ALLOCATION_FILE)
+    try:
+        with open(path) as f:
+            allocation = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if allocation.get("expires_at") and allocation["expires_at"] <= time.time():
+        return None  # stale bundle from an earlier class
+    return allocation
+
+
+def _queue_position(resp):
+    """Queue position if the broker reports one (JSON body or X-Queue-Position header)."""
+    position = resp.headers.get("X-Queue-Position")
+    if position is None:
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict):
+            position = body.get("queue_position", body.get("position"))
+    return position
+
+
+class BrokerClient:
+    def __init__(self, base_url=None, token=None, participant_id=None,
+                 track_id=None, name_prefix=None, session=None, hedge=None):
+        self.base_url = (base_url or os.environ.get("BROKER_API_URL", DEFAULT_BROKER_API_URL)).rstrip("/")
+        self.token = token or os.environ.get("BROKER_API_TOKEN")
+        self.participant_id = participant_id
+        self.track_id = track_id
+        self.name_prefix = name_prefix
+        self.session = session or get_session()
+        self.hedge = hedge if hedge is not None else os.environ.get("BROKER_HEDGE", "0") == "1"
+        self.latency = LatencyWindow("broker_allocate")
+
+    def _headers(self):
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "X-Instruqt-Sandbox-ID": self.participant_id,
+        }
+        if self.track_id:
+            headers["X-Instruqt-Track-ID"] = self.track_id
+        # Optional server-side filter on sandbox name prefix
+        if self.name_prefix:
+            headers["X-Sandbox-Name-Prefix"] = self.name_prefix
+        return headers
+
+    def allocate_request(self, timeout=ALLOCATE_TIMEOUT):
+        """
+        Single POST /allocate (201 = new allocation, 200 = idempotent repeat).
+        With hedging on, a second identical POST goes out once the first has
+        taken longer than the observed p95 and the faster answer wins; safe
+        because the broker allocates at most one sandbox per participant.
+        """
+        def send():
+            return self.session.post(f"{self.base_url}/allocate", headers=self._headers(), timeout=timeout)
+        if not self.hedge:
+            return send()
+        return hedged_call(send, self.latency, label="Allocation")
+
+    def allocate(self, policy=None, wait_timeout=None):
+        """
+        POST /allocate with retries on WAF 403 / 5xx / network errors.
+        With wait_timeout, a 409 (pool exhausted) is retried too, until a
+        sandbox frees up or wait_timeout seconds have passed.
+        Returns the final response (200/201, 409 pool exhausted, or another
+        non-retryable status); raises retry_policy.RetryError once the policy
+        gives up.
+        """
+        policy = policy or get_policy("broker_allocate")
+        if not wait_timeout:
+            return policy.call(self.allocate_request, label="Allocation")
+
+        # Queue-and-wait: keep the request alive across 409s with capped backoff.
+        # The queue deadline also bounds the inner allocate retries (nested budget).
+        queue = get_policy("broker_queue", deadline=wait_timeout)
+        start = time.monotonic()
+
+        def attempt():
+            resp = policy.call(self.allocate_request, label="Allocation")
+            if resp.status_code == 409:
+                position = _queue_position(resp)
+                where = f", queue position {position}" if position is not None else ""
+                print(f"⏳ Pool exhausted; waiting for a free sandbox "
+                      f"({time.monotonic() - start:.0f}s of {wait_timeout:.0f}s{where})", flush=True)
+            return resp
+
+        try:
+            resp = queue.call(attempt, label="Sandbox queue")
+        except RetryError as e:
+            if getattr(e.last, "status_code", None) != 409:
+                raise
+            resp = e.last  # deadline passed while still exhausted: hand back the 409
+        if resp.status_code in (200, 201) and time.monotonic() - start > 1:
+            print(f"✅ Sandbox freed up after {time.monotonic() - start:.0f}s in queue", flush=True)
+        return resp
+
+    def mark_for_deletion(self, sandbox_id, timeout=DEALLOCATE_TIMEOUT):
+        """POST /sandboxes/{id}/mark-for-deletion."""
+        return self.session.post(
+            f"{self.base_url}/sandboxes/{sandbox_id}/mark-for-deletion",
+            headers=self._headers(),
+            timeout=timeout,
+        )
+
+    def deallocate(self, sandbox_id, policy=None):
+        """mark_for_deletion retried on WAF 403 / 429 / 5xx / network errors; raises RetryError on give-up."""
+        policy = policy or get_policy("broker_deallocate")
+        return policy.call(lambda: self.mark_for_deletion(sandbox_id), label=f"Deallocate {sandbox_id}")
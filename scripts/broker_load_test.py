@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Allocation-storm load test against the local Sandbox Broker stand-in.
+
+Starts mock_broker_server.py in-process (finite pool, name-prefix filtering,
+idempotency, 409 on exhaustion, WAF 403 throttling) and fires hundreds of
+concurrent allocators at it, the way a class of students clicking "Start"
+at once does. Allocators are either threads driving BrokerClient directly
+(cheap, hundreds at once) or real allocation script processes. Every
+allocator writes a lab_telemetry record; the report gives the success rate,
+outcome breakdown, attempts and the latency distribution, plus the
+broker-side counts (WAF blocks, 409s, peak allocated).
+
+With --rate-limit shared every allocator draws from the one host-wide
+"broker" bucket (1 req/s, burst 3 by default), so N allocators need about
+N / rate seconds just to get through the limiter. The header prints that
+throughput, and the "broker_allocate" deadline is extended by the drain time
+for the run, so late allocators are not reported as retries_exhausted
+because of the harness's own limiter (RETRY_BROKER_ALLOCATE_DEADLINE, when
+set, still wins).
+
+Usage:
+  python3 broker_load_test.py --allocators 300 --pool-size 250 --waf-rps 20
+  python3 broker_load_test.py --allocators 50 --mode process --script allocation_broker_subtenant.py
+  python3 broker_load_test.py --allocators 200 --rate-limit off        # no host-wide limiter
+  python3 broker_load_test.py --broker-url http://127.0.0.1:8081/v1    # already running stand-in
+
+Options:
+  --allocators N      Concurrent allocators (default: 200)
+  --mode MODE         thread (BrokerClient in-process) or process (default: thread)
+  --script FILE       Allocation script for --mode process (default: instruqt_broker_allocation.py)
+  --ramp S            Spread allocator starts over S seconds (default: 0 = all at once)
+  --prefix P          X-Sandbox-Name-Prefix sent by the allocators (default: lab)
+  --wait-timeout S    Queue-and-wait on 409 (default: 0)
+  --rate-limit MODE   shared (host-wide limiter, like one lab host) or off (default: shared)
+  --deallocate        Mark every allocated sandbox for deletion afterwards
+  --pool-size, --prefixes, --latency, --jitter, --waf-rate, --waf-rps, --waf-burst,
+  --slow-rate, --recycle-delay   Passed to the mock broker (see mock_broker_server.py)
+  --output FILE       Save the report as JSON
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import mock_broker_server
+from telemetry_report import percentile, load_records
+from rate_limiter import DEFAULT_BUDGETS, parse_budgets
+from retry_policy import POLICIES
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def allocator_thread(participant, args):
+    """One simulated student, in-process: BrokerClient.allocate under a TelemetryRun."""
+    from broker_client import BrokerClient
+    from lab_telemetry import TelemetryRun
+    from retry_policy import RetryError
+
+    broker = BrokerClient(participant_id=participant, track_id="load-test", name_prefix=args.prefix)
+    with TelemetryRun("allocate", participant, "load-test", attempt_endpoint="/allocate") as run:
+        try:
+            resp = broker.allocate(wait_timeout=args.wait_timeout)
+        except RetryError:
+            run.fail("retries_exhausted")
+            return
+        if resp.status_code in (200, 201):
+            run.succeed(sandbox_id=resp.json().get("sandbox_id"), http_status=resp.status_code)
+        else:
+            run.fail("pool_exhausted" if resp.status_code == 409 else f"http_{resp.status_code}")
+
+
+def allocator_process(participant, args, env):
+    """One simulated student as a real allocation script run in its own work dir."""
+    with tempfile.TemporaryDirectory(prefix="loadtest-") as workdir:
+        subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, args.script)], cwd=workdir,
+                       env={**env, "INSTRUQT_PARTICIPANT_ID": participant},
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=900)
+
+
+def broker_budget(env):
+    """(rate/s, burst) of the shared broker bucket the allocators draw from."""
+    return {**DEFAULT_BUDGETS, **parse_budgets(env.get("RATE_LIMIT_BUDGETS"))}["broker"]
+
+
+def limiter_drain_seconds(allocators, rate, burst):
+    """Seconds the bucket needs to admit one allocate request per allocator."""
+    return max(0, allocators - burst) / rate
+
+
+def run_storm(args, broker_url, workdir):
+    telemetry = os.path.join(workdir, "telemetry.jsonl")
+    env = {**os.environ, "BROKER_API_URL": broker_url, "BROKER_API_TOKEN": "load-test",
+           "INSTRUQT_TRACK_SLUG": "load-test", "SANDBOX_NAME_PREFIX": args.prefix,
+           "ALLOCATION_WAIT_TIMEOUT": str(args.wait_timeout), "LAB_TELEMETRY_FILE": telemetry,
+           "RATE_LIMIT_DIR": os.path.join(workdir, "ratelimit"), "CSP_METRICS_DIR": "off",
+           "CSP_POOL_STATS": "0", "PYTHONPATH": SCRIPTS_DIR}
+    limiter = "off"
+    if args.rate_limit == "off":
+        env["RATE_LIMIT_DISABLE"] = "1"
+    else:
+        rate, burst = broker_budget(env)
+        drain = limiter_drain_seconds(args.allocators, rate, burst)
+        deadline = env.get("RETRY_BROKER_ALLOCATE_DEADLINE")
+        if not deadline:
+            deadline = env["RETRY_BROKER_ALLOCATE_DEADLINE"] = f"{POLICIES['broker_allocate'].deadline + drain:.0f}"
+        limiter = (f"shared broker bucket {rate:g} req/s burst {burst}, ~{drain:.0f}s to admit "
+                   f"{args.allocators}; allocate deadline {deadline}s")
+    if args.mode == "thread":
+        os.environ.update(env)  # BrokerClient / rate limiter / telemetry read these lazily
+
+    participants = [f"load-{i:04d}-{int(time.time())}" for i in range(args.allocators)]
+    print(f"🌩️  {args.allocators} {args.mode} allocator(s) -> {broker_url} "
+          f"(ramp {args.ramp:.0f}s, rate limit {limiter})", flush=True)
+    start = time.monotonic()
+
+    def one(i):
+        if args.ramp:
+            time.sleep(args.ramp * i / args.allocators)
+        if args.mode == "thread":
+            allocator_thread(participants[i], args)
+        else:
+            allocator_process(participants[i], args, env)
+
+    with ThreadPoolExecutor(max_workers=args.allocators) as pool:
+        list(pool.map(one, range(args.allocators)))
+    wall = time.monotonic() - start
+    return [r for r in load_records([telemetry]) if r.get("kind") == "allocate"], wall, limiter
+
+
+def deallocate_all(records, broker_url):
+    from broker_client import BrokerClient
+    ids = [(r["participant_id"], r["sandbox_id"]) for r in records if r.get("outcome") == "ok" and r.get("sandbox_id")]
+
+    def one(pair):
+        client = BrokerClient(base_url=broker_url, token="load-test", participant_id=pair[0])
+        return client.deallocate(pair[1]).status_code
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        codes = list(pool.map(one, ids))
+    print(f"🧹 Marked {sum(1 for c in codes if c == 200)}/{len(ids)} sandbox(es) for deletion", flush=True)
+
+
+def build_report(records, wall, args, limiter):
+    walls = [r["wall_seconds"] for r in records]
+    ok = [r for r in records if r.get("outcome") == "ok"]
+    outcomes = {}
+    for r in records:
+        key = "ok" if r.get("outcome") == "ok" else r.get("reason") or "failed"
+        outcomes[key] = outcomes.get(key, 0) + 1
+    attempts = [r.get("attempts", 0) for r in records]
+    statuses = {}
+    for r in records:
+        for req in r.get("requests", []):
+            statuses[str(req["status"])] = statuses.get(str(req["status"]), 0) + 1
+    return {
+        "allocators": args.allocators, "recorded": len(records), "mode": args.mode,
+        "rate_limit": args.rate_limit, "limiter": limiter, "wall_seconds": round(wall, 2),
+        "success_rate": round(100 * len(ok) / len(records), 1) if records else None,
+        "outcomes": outcomes, "client_statuses": statuses,
+        "attempts": {"mean": round(sum(attempts) / len(attempts), 2) if attempts else None,
+                     "max": max(attempts) if attempts else None},
+        "latency": {**{f"p{p}": percentile(walls, p) for p in (50, 90, 95, 99)},
+                    "max": max(walls) if walls else None},
+        "latency_ok": {f"p{p}": percentile([r["wall_seconds"] for r in ok], p) for p in (50, 95, 99)},
+    }
+
+
+def print_report(report, server_stats):
+    print(f"\n📊 {report['recorded']}/{report['allocators']} allocator(s) reported in {report['wall_seconds']:.1f}s", flush=True)
+    print(f"   ✅ success rate: {report['success_rate']}%", flush=True)
+    print(f"   limiter:    {report['limiter']}", flush=True)
+    print("   outcomes:   " + ", ".join(f"{k}={v}" for k, v in sorted(report["outcomes"].items())), flush=True)
+    print("   HTTP seen:  " + ", ".join(f"{k}={v}" for k, v in sorted(report["client_statuses"].items())), flush=True)
+    print(f"   attempts:   mean {report['attempts']['mean']}, max {report['attempts']['max']}", flush=True)
+    lat = report["latency"]
+    print("   latency:    " + "  ".join(f"{k} {v:.2f}s" for k, v in lat.items() if v is not None), flush=True)
+    if server_stats:
+        print(f"   broker:     free {server_stats['free']}, allocated {server_stats['allocated']}, "
+              f"peak {server_stats['peak_allocated']}, responses "
+              + ", ".join(f"{k}={v}" for k, v in sorted(server_stats["responses"].items())), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Allocation-storm load test against a local broker")
+    parser.add_argument("--allocators", type=int, default=200)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--script", default="instruqt_broker_allocation.py")
+    parser.add_argument("--ramp", type=float, default=0.0)
+    parser.add_argument("--prefix", default="lab")
+    parser.add_argument("--wait-timeout", type=float, default=0.0)
+    parser.add_argument("--rate-limit", choices=("shared", "off"), default="shared")
+    parser.add_argument("--deallocate", action="store_true")
+    parser.add_argument("--broker-url")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--prefixes", default="lab")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--waf-rate", type=float, default=0.0)
+    parser.add_argument("--waf-rps", type=float, default=0.0)
+    parser.add_argument("--waf-burst", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--recycle-delay", type=float, default=-1)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    server = None
+    broker_url = args.broker_url
+    if not broker_url:
+        server = mock_broker_server.serve(mock_broker_server.parse_args([
+            "--port", "0", "--pool-size", str(args.pool_size or args.allocators),
+            "--prefixes", args.prefixes, "--latency", str(args.latency), "--jitter", str(args.jitter),
+            "--waf-rate", str(args.waf_rate), "--waf-rps", str(args.waf_rps), "--waf-burst", str(args.waf_burst),
+            "--slow-rate", str(args.slow_rate), "--recycle-delay", str(args.recycle_delay)]))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        broker_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    with tempfile.TemporaryDirectory(prefix="broker-load-") as workdir:
+        records, wall, limiter = run_storm(args, broker_url, workdir)
+        report = build_report(records, wall, args, limiter)
+        if args.deallocate:
+            deallocate_all(records, broker_url)
+    server_stats = mock_broker_server.Handler.broker.snapshot() if server else None
+    report["broker"] = server_stats
+    print_report(report, server_stats)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to {args.output}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Bulk classroom pre-allocation for the Sandbox Broker.
+
+Instead of every student's Instruqt VM hitting /allocate in the first
+minutes of a workshop, the instructor allocates the whole class up front:
+participants are allocated concurrently (bounded by --parallel, and paced
+host-wide by the "broker" rate-limit bucket), and each participant gets a
+bundle directory with sandbox_id.txt / external_id.txt / sandbox_name.txt /
+sfdc_account_id.txt / sandbox_env.sh / allocation.json.
+
+Point the track at the bundles with PREALLOCATED_BUNDLE_DIR and the
+allocation scripts (allocation_subtenant.py, allocation_broker_subtenant.py,
+instruqt_broker_allocation.py) pick them up without calling the broker. Because
+the broker is idempotent per participant, re-running is safe; existing
+bundles are skipped unless --force.
+
+With --warm-pool, each allocated sandbox's pre-provisioned user (see
+warm_pool.py) is claimed here, on the host that holds the pool, and written
+as warm_user.json (0600) into that participant's bundle. A bundle then
+carries a credential: deliver each VM only its own bundle directory.
+
+Usage:
+  python3 bulk_allocate.py participants.csv --out-dir bundles --parallel 8
+
+CSV format (header required; extra columns ignored):
+  participant_id,track_slug
+  abc123,lab-adventure
+  def456,lab-adventure
+
+Options:
+  --out-dir DIR       Bundle root (default: bundles)
+  --parallel N        Concurrent allocations (default: 8)
+  --track-slug SLUG   Track for rows without a track_slug column (default: $INSTRUQT_TRACK_SLUG)
+  --name-prefix P     Sandbox name prefix filter (default: $SANDBOX_NAME_PREFIX or "lab")
+  --wait-timeout S    Queue-and-wait on 409 per participant (default: $ALLOCATION_WAIT_TIMEOUT)
+  --warm-pool         Claim each sandbox's warm user into its bundle (pool: $WARM_POOL_DIR)
+  --force             Re-request participants that already have a bundle
+
+Environment Variables:
+  BROKER_API_URL   - Broker endpoint (default: https://api-sandbox-broker.highvelocitynetworking.com/v1)
+  BROKER_API_TOKEN - Required. API token for the Broker
+  WARM_POOL_DIR    - Warm pool records for --warm-pool (default: ~/.cache/infoblox/warm_pool)
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from broker_client import (BrokerClient, BUNDLE_ALLOCATION_FILE, allocation_wait_timeout,
+                           bundle_dirname, write_allocation_bundle)
+from retry_policy import RetryError
+from lab_telemetry import TelemetryRun
+from warm_pool import claim_into_bundle
+
+PARTICIPANT_COLUMNS = ("participant_id", "instruqt_participant_id", "participant", "id")
+
+
+def read_participants(path, default_track):
+    """[(participant_id, track_slug)] from a CSV, de-duplicated, in file order."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        id_col = next((columns[c] for c in PARTICIPANT_COLUMNS if c in columns), None)
+        if id_col is None:
+            raise SystemExit(f"❌ {path}: no participant_id column (have: {', '.join(columns)})")
+        track_col = columns.get("track_slug") or columns.get("track")
+        seen, rows = set(), []
+        for row in reader:
+            pid = (row.get(id_col) or "").strip()
+            if pid and pid not in seen:
+                seen.add(pid)
+                track = (row.get(track_col) or "").strip() if track_col else ""
+                rows.append((pid, track or default_track))
+        return rows
+
+
+def allocate_one(participant_id, track_slug, args):
+    bundle_dir = os.path.join(args.out_dir, bundle_dirname(participant_id))
+    if not args.force and os.path.exists(os.path.join(bundle_dir, BUNDLE_ALLOCATION_FILE)):
+        return {"participant_id": participant_id, "status": "skipped", "dir": bundle_dir}
+
+    broker = BrokerClient(participant_id=participant_id, track_id=track_slug,
+                          name_prefix=args.name_prefix)
+    start = time.monotonic()
+    with TelemetryRun("allocate", participant_id, track_slug, attempt_endpoint="/allocate", bulk=True) as run:
+        try:
+            resp = broker.allocate(wait_timeout=args.wait_timeout)
+        except RetryError as e:
+            run.fail("retries_exhausted")
+            return {"participant_id": participant_id, "status": "failed", "error": str(e)}
+        elapsed = round(time.monotonic() - start, 2)
+        if resp.status_code not in (200, 201):
+            error = "pool exhausted" if resp.status_code == 409 else f"HTTP {resp.status_code}: {resp.text[:200]}"
+            run.fail("pool_exhausted" if resp.status_code == 409 else f"http_{resp.status_code}")
+            return {"participant_id": participant_id, "status": "failed", "error": error, "seconds": elapsed}
+
+        allocation = resp.json()
+        files = write_allocation_bundle(allocation, bundle_dir)
+        warm = claim_into_bundle(files["external_id.txt"], participant_id, bundle_dir) if args.warm_pool else None
+        run.succeed(sandbox_id=files["subtenant_id.txt"], sandbox_name=files["sandbox_name.txt"],
+                    expires_at=allocation.get("expires_at"), warm=bool(warm))
+    return {"participant_id": participant_id, "status": "allocated" if resp.status_code == 201 else "existing",
+            "sandbox_name": files["sandbox_name.txt"], "external_id": files["external_id.txt"],
+            "warm": bool(warm), "dir": bundle_dir, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-allocate broker sandboxes for a whole class")
+    parser.add_argument("csv", help="Participant list (CSV with a participant_id column)")
+    parser.add_argument("--out-dir", default="bundles")
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--track-slug", default=os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab"))
+    parser.add_argument("--name-prefix", default=os.environ.get("SANDBOX_NAME_PREFIX", "lab"))
+    parser.add_argument("--wait-timeout", type=float, default=allocation_wait_timeout())
+    parser.add_argument("--warm-pool", action="store_true")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if not os.environ.get("BROKER_API_TOKEN"):
+        print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
+        sys.exit(1)
+
+    participants = read_participants(args.csv, args.track_slug)
+    print(f"🎓 Allocating {len(participants)} participant(s) with parallel={args.parallel} "
+          f"into {args.out_dir}/", flush=True)
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    start = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        futures = {pool.submit(allocate_one, pid, track, args): pid for pid, track in participants}
+        for future in as_completed(futures):
+            try:
+                r = future.result()
+            except Exception as e:  # one bad participant must not sink the class
+                r = {"participant_id": futures[future], "status": "failed", "error": str(e)}
+            results.append(r)
+            icon = {"allocated": "✅", "existing": "🔄", "skipped": "⏭️"}.get(r["status"], "❌")
+            detail = r.get("sandbox_name") or r.get("error") or r.get("dir", "")
+            print(f"   {icon} [{len(results)}/{len(participants)}] {r['participant_id']}: {detail}", flush=True)
+
+    order = {pid: i for i, (pid, _) in enumerate(participants)}
+    results.sort(key=lambda r: order[r["participant_id"]])
+    manifest = os.path.join(args.out_dir, "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "results": results}, f, indent=2)
+
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    print(f"\n🏁 {len(participants)} participant(s) in {time.monotonic() - start:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())), flush=True)
+    print(f"📋 Manifest: {manifest}", flush=True)
+    print(f"💡 In the track: export PREALLOCATED_BUNDLE_DIR={os.path.abspath(args.out_dir)}", flush=True)
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
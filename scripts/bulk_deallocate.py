@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Bulk Sandbox Broker deallocation from a participant list.
+
+deallocation_subtenant.py / cleanup_broker_allocation.py /
+instruqt_broker_cleanup.py each mark the one sandbox of the VM they run on.
+After an event the leftovers are cleaned up here instead: every
+(participant id, broker sandbox id) pair is marked for deletion concurrently
+(bounded by --parallel, paced host-wide by the "broker" rate-limit bucket,
+retried under the "broker_deallocate" policy), with a live progress count and
+a per-item status report at the end.
+
+Usage:
+  python3 bulk_deallocate.py leftovers.csv --parallel 8
+  python3 bulk_deallocate.py --from-bundles bundles      # undo bulk_allocate.py
+  python3 bulk_deallocate.py leftovers.csv --dry-run
+
+CSV format (header required; extra columns ignored):
+  participant_id,sandbox_id
+  abc123,2026838
+
+  sandbox_id may also be called subtenant_id or broker_sandbox_id (the
+  broker's CSP ID from subtenant_id.txt, not the external account UUID).
+
+Options:
+  --from-bundles DIR  Read pairs from bulk_allocate.py bundle directories
+  --parallel N        Concurrent mark-for-deletion calls (default: 8)
+  --report FILE       Write the per-item results as JSON
+  --dry-run           Only list what would be marked for deletion
+
+Environment Variables:
+  BROKER_API_URL   - Broker endpoint (default: https://api-sandbox-broker.highvelocitynetworking.com/v1)
+  BROKER_API_TOKEN - Required. API token for the Broker
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from broker_client import BrokerClient
+from retry_policy import RetryError
+from lab_telemetry import TelemetryRun
+
+PARTICIPANT_COLUMNS = ("participant_id", "instruqt_participant_id", "participant", "id")
+SANDBOX_COLUMNS = ("sandbox_id", "subtenant_id", "broker_sandbox_id", "csp_id")
+
+
+def read_pairs(path):
+    """[(participant_id, sandbox_id)] from a CSV, de-duplicated by sandbox id, in file order."""
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        pid_col = next((columns[c] for c in PARTICIPANT_COLUMNS if c in columns), None)
+        sid_col = next((columns[c] for c in SANDBOX_COLUMNS if c in columns), None)
+        if pid_col is None or sid_col is None:
+            raise SystemExit(f"❌ {path}: need participant_id and sandbox_id columns "
+                             f"(have: {', '.join(columns)})")
+        seen, pairs = set(), []
+        for row in reader:
+            pid, sid = (row.get(pid_col) or "").strip(), (row.get(sid_col) or "").strip()
+            if pid and sid and sid not in seen:
+                seen.add(sid)
+                pairs.append((pid, sid))
+        return pairs
+
+
+def read_bundles(root):
+    """[(participant_id, sandbox_id)] from bulk_allocate.py bundle directories."""
+    try:
+        with open(os.path.join(root, "manifest.json")) as f:
+            names = {os.path.basename(r["dir"]): r["participant_id"]
+                     for r in json.load(f).get("results", []) if r.get("dir")}
+    except (OSError, ValueError):
+        names = {}  # bundle dir names are the (sanitized) participant ids
+    pairs = []
+    for name in sorted(os.listdir(root)):
+        try:
+            with open(os.path.join(root, name, "subtenant_id.txt")) as f:
+                sandbox_id = f.read().strip()
+        except OSError:
+            continue
+        if sandbox_id:
+            pairs.append((names.get(name, name), sandbox_id))
+    return pairs
+
+
+class Progress:
+    """Thread-safe done/ok/failed counter printed as each item finishes."""
+
+    def __init__(self, total):
+        self.total = total
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def update(self, result):
+        with self.lock:
+            self.counts[result["status"]] = self.counts.get(result["status"], 0) + 1
+            done = sum(self.counts.values())
+            icon = {"marked": "✅", "not_found": "⚠️"}.get(result["status"], "❌")
+            detail = result.get("error") or result.get("broker_status", "")
+            print(f"   {icon} [{done}/{self.total}] {result['sandbox_id']} ({result['participant_id']}): "
+                  f"{result['status']} {detail}".rstrip(), flush=True)
+
+
+def deallocate_one(participant_id, sandbox_id):
+    broker = BrokerClient(participant_id=participant_id)
+    result = {"participant_id": participant_id, "sandbox_id": sandbox_id}
+    start = time.monotonic()
+    with TelemetryRun("deallocate", participant_id, attempt_endpoint="/mark-for-deletion",
+                      sandbox_id=sandbox_id, bulk=True) as run:
+        try:
+            resp = broker.deallocate(sandbox_id)
+        except RetryError as e:
+            run.fail("retries_exhausted")
+            result.update(status="failed", error=str(e).lstrip("❌ "))
+        else:
+            if resp.status_code == 200:
+                try:
+                    broker_status = resp.json().get("status", "")
+                except ValueError:
+                    broker_status = ""
+                run.succeed()
+                result.update(status="marked", broker_status=broker_status)
+            elif resp.status_code == 404:
+                run.succeed(reason="not_found")
+                result.update(status="not_found")  # already cleaned up
+            else:
+                run.fail(f"http_{resp.status_code}")
+                result.update(status="failed", error=f"HTTP {resp.status_code}: {resp.text[:200]}")
+    result["seconds"] = round(time.monotonic() - start, 2)
+    return result
+
+
+def print_report(results):
+    print(f"\n{'=' * 72}", flush=True)
+    print(f"{'PARTICIPANT':<28}{'SANDBOX':<14}{'STATUS':<12}DETAIL", flush=True)
+    for r in results:
+        detail = r.get("error") or r.get("broker_status", "")
+        print(f"{r['participant_id'][:27]:<28}{r['sandbox_id'][:13]:<14}{r['status']:<12}{detail}", flush=True)
+    print(f"{'=' * 72}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark many broker sandboxes for deletion")
+    parser.add_argument("csv", nargs="?", help="CSV with participant_id and sandbox_id columns")
+    parser.add_argument("--from-bundles")
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--report")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    if not (args.csv or args.from_bundles):
+        parser.error("give a CSV file or --from-bundles DIR")
+    pairs = read_pairs(args.csv) if args.csv else read_bundles(args.from_bundles)
+    if not pairs:
+        print("ℹ️ Nothing to deallocate", flush=True)
+        return
+
+    if args.dry_run:
+        print(f"🔍 Would mark {len(pairs)} sandbox(es) for deletion:", flush=True)
+        for pid, sid in pairs:
+            print(f"   {sid} ({pid})", flush=True)
+        return
+
+    if not os.environ.get("BROKER_API_TOKEN"):
+        print("❌ BROKER_API_TOKEN environment variable not set", flush=True)
+        sys.exit(1)
+
+    print(f"🧹 Marking {len(pairs)} sandbox(es) for deletion with parallel={args.parallel}", flush=True)
+    progress = Progress(len(pairs))
+    start = time.monotonic()
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        futures = {pool.submit(deallocate_one, pid, sid): (pid, sid) for pid, sid in pairs}
+        for future in as_completed(futures):
+            try:
+                r = future.result()
+            except Exception as e:  # one bad item must not stop the sweep
+                pid, sid = futures[future]
+                r = {"participant_id": pid, "sandbox_id": sid, "status": "failed", "error": str(e)}
+            progress.update(r)
+            results.append(r)
+
+    order = {sid: i for i, (_, sid) in enumerate(pairs)}
+    results.sort(key=lambda r: order[r["sandbox_id"]])
+    print_report(results)
+    print(f"🏁 {len(pairs)} sandbox(es) in {time.monotonic() - start:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(progress.counts.items())), flush=True)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "results": results}, f, indent=2)
+        print(f"📋 Report: {args.report}", flush=True)
+    sys.exit(1 if progress.counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
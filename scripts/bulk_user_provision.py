@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Bulk CSV-driven CSP user provisioning for workshops.
+
+user_provision.py, create_user_final.py and create_user_broker.py each
+create one user in one account per process. This creates a whole class:
+rows are grouped per sandbox account, every account is switched into once
+(AccountSessionPool, one admin sign-in for the batch) and its groups are
+fetched once, then its users are created and given passwords. Accounts are
+worked on concurrently (--parallel), users within one account in order.
+
+Credentials go to a 0600 JSON manifest that is rewritten after every user.
+Re-running with the same manifest resumes: users already provisioned are
+skipped, users that failed (or whose password was never set) are retried;
+an existing CSP user with the same email is adopted rather than duplicated.
+
+Usage:
+  python3 bulk_user_provision.py users.csv --manifest users.json --parallel 8
+
+CSV format (header required; extra columns ignored):
+  account_id,participant_id,email
+  5f0c...e1,abc123,abc123@infoblox.lab
+  5f0c...e1,def456,                      # empty email -> <participant>@USER_DOMAIN
+
+An email is provisioned once per account (case-insensitive); later rows
+repeating it are skipped and counted as "duplicate" in the summary.
+
+Options:
+  --manifest FILE     Credentials manifest, read on resume (default: user_manifest.json)
+  --parallel N        Accounts worked on concurrently (default: 8)
+  --track-slug SLUG   Track recorded in telemetry (default: $INSTRUQT_TRACK_SLUG)
+  --force             Re-provision users the manifest already lists as ok
+
+Environment Variables:
+  INFOBLOX_EMAIL    - Required. Admin email for CSP JWT auth.
+  INFOBLOX_PASSWORD - Required. Admin password for CSP JWT auth.
+  CSP_BASE_URL      - CSP URL override (e.g. a local mock_csp_server.py)
+  USER_DOMAIN       - Domain for rows without an email (default: infoblox.lab)
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from session_pool import AccountSessionPool
+from lab_telemetry import TelemetryRun
+from user_provision import generate_password, get_groups, create_user, set_password
+
+ACCOUNT_COLUMNS = ("account_id", "external_id", "sandbox_id", "csp_account_id")
+PARTICIPANT_COLUMNS = ("participant_id", "instruqt_participant_id", "participant", "name")
+
+
+def read_users(path, domain):
+    """
+    (OrderedDict {account_id: [(participant_id, email)]}, [duplicate rows]) in file order.
+    An email (case-insensitive) is provisioned once per account; later rows with
+    the same email are returned as duplicates (account_id, participant_id, email).
+    """
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        account_col = next((columns[c] for c in ACCOUNT_COLUMNS if c in columns), None)
+        pid_col = next((columns[c] for c in PARTICIPANT_COLUMNS if c in columns), None)
+        if account_col is None or pid_col is None:
+            raise SystemExit(f"❌ {path}: need account_id and participant_id columns (have: {', '.join(columns)})")
+        email_col = columns.get("email")
+        accounts, duplicates = OrderedDict(), []
+        for row in reader:
+            account_id = (row.get(account_col) or "").strip().split("/")[-1]
+            pid = (row.get(pid_col) or "").strip()
+            if not account_id or not pid:
+                continue
+            email = ((row.get(email_col) or "").strip() if email_col else "") or f"{pid}@{domain}"
+            users = accounts.setdefault(account_id, [])
+            if any(e.lower() == email.lower() for _, e in users):
+                duplicates.append((account_id, pid, email))
+            else:
+                users.append((pid, email))
+        return accounts, duplicates
+
+
+class Manifest:
+    """Credentials manifest keyed by account_id/email, saved atomically after every change."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        try:
+            with open(path) as f:
+                for entry in json.load(f).get("users", []):
+                    self.entries[self.key(entry["account_id"], entry["email"])] = entry
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def key(account_id, email):
+        return f"{account_id}/{email.lower()}"
+
+    def get(self, account_id, email):
+        with self.lock:
+            return self.entries.get(self.key(account_id, email))
+
+    def put(self, entry):
+        with self.lock:
+            self.entries[self.key(entry["account_id"], entry["email"])] = entry
+            self._save()
+
+    def _save(self):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "users": list(self.entries.values())}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+def provision_user(client, account_id, groups, participant_id, email, manifest, args):
+    entry = {"account_id": account_id, "participant_id": participant_id, "email": email}
+    with TelemetryRun("user_provision", participant_id, args.track_slug,
+                      attempt_endpoint="/v2/users", bulk=True) as run:
+        user_id = create_user(client.base_url, client.auth_headers(), participant_id, email, *groups)
+        if not user_id:
+            run.fail("create_failed")
+            manifest.put({**entry, "status": "failed", "error": "user creation failed"})
+            return "failed"
+        password = generate_password()
+        if not set_password(client.base_url, client.auth_headers(), user_id, password):
+            run.fail("password_failed")
+            manifest.put({**entry, "status": "failed", "user_id": user_id, "error": "password set failed"})
+            return "failed"
+        run.succeed(user_id=user_id)
+    manifest.put({**entry, "status": "ok", "user_id": user_id, "password": password,
+                  "provisioned": int(time.time())})
+    return "ok"
+
+
+def provision_account(account_id, client, users, manifest, progress, args):
+    """All pending users of one account over its switched session; {email: status}."""
+    pending = [(pid, email) for pid, email in users
+               if args.force or (manifest.get(account_id, email) or {}).get("status") != "ok"]
+    statuses = {email.lower(): "skipped" for _, email in users}
+    if not pending:
+        return statuses
+    groups = get_groups(client.base_url, client.auth_headers(), account_id)
+    if not all(groups):
+        raise RuntimeError("required groups not found")
+    for pid, email in pending:
+        key = email.lower()
+        try:
+            statuses[key] = provision_user(client, account_id, groups, pid, email, manifest, args)
+        except Exception as e:  # keep going with the account's other users
+            manifest.put({"account_id": account_id, "participant_id": pid, "email": email,
+                          "status": "failed", "error": str(e)})
+            statuses[key] = "failed"
+        progress(account_id, pid, email, statuses[key])
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provision CSP users for a whole class from a CSV")
+    parser.add_argument("csv", help="Rows of account_id, participant_id, email")
+    parser.add_argument("--manifest", default="user_manifest.json")
+    parser.add_argument("--parallel", type=int, default=8)
+    parser.add_argument("--track-slug", default=os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab"))
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    if not os.getenv("INFOBLOX_EMAIL") or not os.getenv("INFOBLOX_PASSWORD"):
+        print("❌ Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD", flush=True)
+        sys.exit(1)
+
+    accounts, duplicates = read_users(args.csv, os.environ.get("USER_DOMAIN", "infoblox.lab"))
+    total = sum(len(users) for users in accounts.values())
+    manifest = Manifest(args.manifest)
+    print(f"👥 Provisioning {total} user(s) in {len(accounts)} account(s) with parallel={args.parallel} "
+          f"(manifest: {args.manifest}, {len(manifest.entries)} existing entr{'y' if len(manifest.entries) == 1 else 'ies'})",
+          flush=True)
+    for account_id, pid, email in duplicates:
+        print(f"   ⚠️ Skipping {pid}: {email} is already listed for account {account_id[:8]}", flush=True)
+
+    done = []
+    print_lock = threading.Lock()
+
+    def progress(account_id, pid, email, status):
+        with print_lock:
+            done.append(pid)
+            icon = "✅" if status == "ok" else "❌"
+            print(f"   {icon} [{len(done)}/{total}] {email} ({account_id[:8]})", flush=True)
+
+    start = time.monotonic()
+    pool = AccountSessionPool(max_accounts=max(args.parallel * 2, 16))
+    results = pool.map(lambda account_id, client: provision_account(
+        account_id, client, accounts[account_id], manifest, progress, args),
+        accounts, max_workers=max(1, args.parallel))
+
+    counts = {}
+    for account_id, result in results.items():
+        if isinstance(result, Exception):
+            print(f"   ❌ account {account_id}: {result}", flush=True)
+            error, result = f"account: {result}", {}
+            for pid, email in accounts[account_id]:
+                if (manifest.get(account_id, email) or {}).get("status") == "ok" and not args.force:
+                    result[email.lower()] = "skipped"
+                    continue
+                manifest.put({"account_id": account_id, "participant_id": pid, "email": email,
+                              "status": "failed", "error": error})
+                result[email.lower()] = "failed"
+        for status in result.values():
+            counts[status] = counts.get(status, 0) + 1
+    if duplicates:
+        counts["duplicate"] = len(duplicates)
+
+    print(f"\n🏁 {total} user(s) in {time.monotonic() - start:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())), flush=True)
+    print(f"📋 Manifest: {args.manifest}", flush=True)
+    if counts.get("failed"):
+        print("💡 Re-run the same command to retry the failed users", flush=True)
+    sys.exit(1 if counts.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,8 @@ Usage in Instruqt:
 import os
 import sys
 import requests
+from broker_client import BrokerClient
+from lab_telemetry import start_run
 
 # ----------------------------------
 # Configuration
@@ -61,27 +63,26 @@ print(f"🧹 Marking sandbox (Broker subtenant ID: {subtenant_id}) for deletion.
 # ----------------------------------
 # Mark Sandbox for Deletion
 # ----------------------------------
-delete_url = f"{BROKER_API_URL}/sandboxes/{subtenant_id}/mark-for-deletion"
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-    "Content-Type": "application/json",
-}
+run = start_run("deallocate", INSTRUQT_SANDBOX_ID, attempt_endpoint="/mark-for-deletion",
+                sandbox_id=subtenant_id)
+broker = BrokerClient(
+    base_url=BROKER_API_URL,
+    token=BROKER_API_TOKEN,
+    participant_id=INSTRUQT_SANDBOX_ID,
+)
 
 try:
-    resp = requests.post(
-        delete_url,
-        headers=headers,
-        timeout=(5, 15),
-    )
+    resp = broker.mark_for_deletion(subtenant_id)
 
     if resp.status_code == 200:
         result = resp.json()
+        run.succeed()
         print(f"✅ Sandbox marked for deletion", flush=True)
         print(f"   Status: {result.get('status', 'unknown')}", flush=True)
         print("   Cleanup: Background job will delete from CSP within ~5 minutes", flush=True)
 
     elif resp.status_code == 404:
+        run.succeed(reason="not_found")
         print(f"⚠️ Sandbox {subtenant_id} not found (may have already been cleaned up)", flush=True)
 
     elif resp.status_code == 403:
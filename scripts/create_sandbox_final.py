@@ -5,7 +5,7 @@ import random
 from sandbox_api import SandboxAccountAPI
 
 # Configuration
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/") + "/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 TEAM_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID", "default-team")
 SANDBOX_ID_FILE = "sandbox_id.txt"
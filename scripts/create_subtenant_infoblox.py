@@ -5,18 +5,19 @@ import random
 import uuid
 import requests
 from sandbox_api import SandboxAccountAPI
+from admission import admit
 
 # ----------------------------------
 # Configuration
 # ----------------------------------
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/") + "/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 TEAM_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID", "default-team")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 EXTERNAL_ID_FILE = "external_id.txt"
 
-# Startup jitter (avoid host collisions)
-time.sleep(random.uniform(1, 15))
+# Admission slot (replaces a flat 1-15s random startup jitter)
+admit("csp:write", TEAM_ID, spread=15)
 
 # Request body for sandbox creation
 sandbox_request_body = {
@@ -47,7 +48,7 @@ headers = {**api._headers(), "X-Request-ID": str(uuid.uuid4())}
 create_response = None
 for attempt in range(max_retries):
     try:
-        resp = requests.post(
+        resp = api.session.post(
             f"{BASE_URL}/sandbox/accounts",
             json=sandbox_request_body,
             headers=headers,
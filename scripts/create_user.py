@@ -1,10 +1,9 @@
 import os
 import json
-import requests
-import time
+from csp_client import CSPClient
 
 # === Required Environment Variables ===
-BASE_URL = "https://csp.infoblox.com"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/")
 EMAIL = os.getenv("INFOBLOX_EMAIL")
 PASSWORD = os.getenv("INFOBLOX_PASSWORD")
 USER_EMAIL = os.getenv("INSTRUQT_EMAIL")
@@ -17,31 +16,21 @@ if not all([EMAIL, PASSWORD, USER_EMAIL, USER_NAME]):
     raise RuntimeError("❌ Missing one of: INFOBLOX_EMAIL, INFOBLOX_PASSWORD, INSTRUQT_EMAIL, INSTRUQT_PARTICIPANT_ID")
 
 # === Step 1: Authenticate ===
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {
-    "Authorization": f"Bearer {jwt}",
-    "Content-Type": "application/json"
-}
+client = CSPClient(BASE_URL, EMAIL, PASSWORD)
+jwt = client.login()
+headers = client.auth_headers()
 print("✅ Logged in and obtained JWT")
 
 # === Step 2: Switch Account ===
 with open(SANDBOX_ID_FILE, "r") as f:
     sandbox_id = f.read().strip()
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_payload = {"id": f"identity/accounts/{sandbox_id}"}
-switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
+jwt = client.switch_account(sandbox_id)
+headers = client.auth_headers()
 print(f"🔁 Switched to sandbox account {sandbox_id}")
-time.sleep(3)
 
 # === Step 3: Get Groups and Extract "user" and "act_admin" ===
 group_url = f"{BASE_URL}/v2/groups"
-group_resp = requests.get(group_url, headers=headers)
+group_resp = client.session.get(group_url, headers=headers)
 group_resp.raise_for_status()
 groups = group_resp.json().get("results", [])
 
@@ -70,7 +59,7 @@ user_payload = {
 
 print(f"📤 Creating user '{USER_NAME}'...")
 user_url = f"{BASE_URL}/v2/users"
-user_resp = requests.post(user_url, headers=headers, json=user_payload)
+user_resp = client.session.post(user_url, headers=headers, json=user_payload)
 user_resp.raise_for_status()
 user_data = user_resp.json()
 print("✅ User created successfully.")
@@ -1,12 +1,11 @@
 import os
 import json
 import sys
-import requests
-import time
-import random
+from csp_client import CSPClient
+from retry_policy import get_policy, RetryError
 
 # === Required Environment Variables ===
-BASE_URL = "https://csp.infoblox.com"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/")
 EMAIL = os.getenv("INFOBLOX_EMAIL")
 PASSWORD = os.getenv("INFOBLOX_PASSWORD")
 USER_EMAIL = os.getenv("INSTRUQT_EMAIL")
@@ -19,28 +18,21 @@ if not all([EMAIL, PASSWORD, USER_EMAIL, USER_NAME]):
     sys.exit(1)
 
 # === Step 1: Authenticate ===
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+client = CSPClient(BASE_URL, EMAIL, PASSWORD)
+jwt = client.login()
+headers = client.auth_headers()
 print("✅ Logged in and obtained JWT", flush=True)
 
 # === Step 2: Switch Account ===
 with open(SANDBOX_ID_FILE, "r") as f:
     sandbox_id = f.read().strip()
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_payload = {"id": f"identity/accounts/{sandbox_id}"}
-switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
+jwt = client.switch_account(sandbox_id)
+headers = client.auth_headers()
 print(f"🔁 Switched to sandbox account {sandbox_id}", flush=True)
-time.sleep(3)
 
 # === Step 3: Get Groups ===
 group_url = f"{BASE_URL}/v2/groups"
-group_resp = requests.get(group_url, headers=headers)
+group_resp = client.session.get(group_url, headers=headers)
 group_resp.raise_for_status()
 groups = group_resp.json().get("results", [])
 
@@ -63,18 +55,17 @@ user_payload = {
 }
 user_url = f"{BASE_URL}/v2/users"
 
-max_retries = 5
-for attempt in range(max_retries):
-    try:
-        print(f"📤 Creating user '{USER_NAME}'... (attempt {attempt+1})", flush=True)
-        user_resp = requests.post(user_url, headers=headers, json=user_payload)
-        user_resp.raise_for_status()
-        user_data = user_resp.json()
-        break
-    except requests.RequestException as e:
-        print(f"⚠️ Attempt {attempt+1} failed: {e}", flush=True)
-        time.sleep((2**attempt) + random.random())
-else:
+# Retries follow the "create_user" policy (decorrelated jitter, see retry_policy.py)
+def create_user_attempt():
+    print(f"📤 Creating user '{USER_NAME}'...", flush=True)
+    user_resp = client.session.post(user_url, headers=headers, json=user_payload)
+    user_resp.raise_for_status()
+    return user_resp.json()
+
+try:
+    user_data = get_policy("create_user").call(create_user_attempt, label="Create user")
+except RetryError as e:
+    print(f"⚠️ {e.last}", flush=True)
     print("❌ User creation failed after retries", flush=True)
     sys.exit(1)
 
@@ -0,0 +1,177 @@
+"""
+Asyncio CSP client for high fan-out operations (bulk deletes, tenant cleanup).
+
+Mirrors the InfobloxSession / CSPClient API — login, switch_account,
+get/post/delete and a paginated list — on top of httpx.AsyncClient. A
+semaphore bounds the number of in-flight requests so hundreds of calls can
+be queued while only a few (HTTP/2-multiplexed when `h2` is installed)
+connections are held open to CSP. Requests share the host-wide rate limiter
+with the synchronous scripts (see rate_limiter.py) and are recorded in the
+per-endpoint HTTP metrics (see http_metrics.py).
+
+Usage:
+  async with AsyncCSPClient(api_token=TOKEN, concurrency=32) as client:
+      results = await asyncio.gather(*(client.delete(p) for p in paths))
+
+Requires: pip install httpx   (optional: pip install h2 for HTTP/2)
+
+Environment Variables:
+  CSP_CONCURRENCY - Default max in-flight requests (default: 32)
+"""
+
+import os
+import time
+import asyncio
+import httpx
+from csp_client import DEFAULT_BASE_URL
+from token_cache import TokenCache, cache_disabled
+from rate_limiter import get_limiter
+from http_metrics import get_metrics, trace_request
+
+DEFAULT_CONCURRENCY = int(os.environ.get("CSP_CONCURRENCY", "32"))
+DEFAULT_MAX_CONNECTIONS = 8
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class AsyncCSPClient:
+    """
+    Async counterpart of CSPClient. Authenticates either with an API token
+    ("Token <key>", as used by Infoblox_Token scripts) or with email/password
+    sign-in plus account switch (JWT, shared with the on-disk TokenCache).
+    """
+
+    def __init__(self, base_url=None, email=None, password=None, api_token=None,
+                 concurrency=DEFAULT_CONCURRENCY, max_connections=DEFAULT_MAX_CONNECTIONS,
+                 timeout=30.0, token_cache=None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.email = email or os.getenv("INFOBLOX_EMAIL")
+        self.password = password or os.getenv("INFOBLOX_PASSWORD")
+        self.api_token = api_token
+        if token_cache is None and not cache_disabled():
+            token_cache = TokenCache()
+        self.token_cache = token_cache
+        self.jwt = None
+        self.account_id = None
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.http = httpx.AsyncClient(
+            http2=_http2_available(),
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.http.aclose()
+
+    # ---------- auth ----------
+    async def login(self, force=False):
+        if not force and self.token_cache:
+            cached = self.token_cache.get(self.email, base_url=self.base_url)
+            if cached:
+                self.jwt, self.account_id = cached, None
+                return self.jwt
+        r = await self._send("POST", f"{self.base_url}/v2/session/users/sign_in",
+                             json={"email": self.email, "password": self.password})
+        r.raise_for_status()
+        self.jwt = r.json().get("jwt")
+        if not self.jwt:
+            raise RuntimeError("Login succeeded but no JWT returned.")
+        self.account_id = None
+        if self.token_cache:
+            self.token_cache.put(self.email, None, self.jwt, base_url=self.base_url)
+        return self.jwt
+
+    async def switch_account(self, account_id, force=False):
+        if not force and self.token_cache:
+            cached = self.token_cache.get(self.email, account_id, base_url=self.base_url)
+            if cached:
+                self.jwt, self.account_id = cached, account_id
+                return self.jwt
+        if self.jwt is None or self.account_id is not None:
+            await self.login()
+        r = await self._send("POST", f"{self.base_url}/v2/session/account_switch",
+                             headers={"Authorization": f"Bearer {self.jwt}"},
+                             json={"id": f"identity/accounts/{account_id}"})
+        r.raise_for_status()
+        self.jwt = r.json().get("jwt")
+        if not self.jwt:
+            raise RuntimeError("Account switch succeeded but no JWT returned.")
+        self.account_id = account_id
+        if self.token_cache:
+            self.token_cache.put(self.email, account_id, self.jwt, base_url=self.base_url)
+        return self.jwt
+
+    def auth_headers(self):
+        if self.api_token:
+            return {"Content-Type": "application/json", "Authorization": f"Token {self.api_token}"}
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
+
+    # ---------- requests ----------
+    async def request(self, method, path, **kwargs):
+        headers = {**self.auth_headers(), **kwargs.pop("headers", {})}
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        return await self._send(method, url, headers=headers, **kwargs)
+
+    async def _send(self, method, url, **kwargs):
+        limiter = get_limiter()
+        metrics = get_metrics()
+        async with self.semaphore:
+            bucket = limiter.bucket_for(method, url) if limiter else None
+            if limiter:
+                await limiter.acquire_async(bucket)
+            start = time.monotonic()
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except Exception:
+                trace_request(method, url, "error", time.monotonic() - start)
+                if metrics:
+                    metrics.record(method, url, "error", time.monotonic() - start)
+                raise
+            trace_request(method, url, response.status_code, time.monotonic() - start)
+            if metrics:
+                metrics.record(method, url, response.status_code, time.monotonic() - start,
+                               len(response.request.content or b""), len(response.content))
+            if limiter:
+                limiter.observe(bucket, response)
+            return response
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
+
+    async def paginate(self, path, params=None, page_size=100, results_key="results"):
+        """
+        Async generator over every item of a `_limit/_offset` paginated
+        collection. Stops on a short page; raw-list responses are yielded as-is.
+        """
+        offset = 0
+        while True:
+            page_params = {**(params or {}), "_limit": page_size, "_offset": offset}
+            r = await self.get(path, params=page_params)
+            r.raise_for_status()
+            data = r.json()
+            items = data.get(results_key, []) if isinstance(data, dict) else data
+            for item in items or []:
+                yield item
+            if not isinstance(data, dict) or len(items or []) < page_size:
+                return
+            offset += page_size
@@ -0,0 +1,296 @@
+"""
+Shared, pooled HTTP client for the Infoblox CSP lifecycle scripts.
+
+Every script used to call module-level requests.post/get/delete, which opens
+a fresh TCP+TLS connection to csp.infoblox.com per call. This module owns one
+process-wide requests.Session with a tuned HTTPAdapter (keep-alive, pool size,
+default timeouts) and a small CSPClient that wraps sign-in / account switch.
+Every request through the pooled session is metered by the host-wide
+rate limiter (see rate_limiter.py), and its timeouts are clamped to any
+enclosing retry deadline (see retry_policy.py). Per-call latency, status and
+bytes are recorded and exported at exit (see http_metrics.py).
+
+Usage:
+  from csp_client import CSPClient, get_session
+
+  client = CSPClient(email=..., password=...)
+  client.login()
+  client.switch_account(sandbox_id)
+  r = client.get("/v2/groups")
+
+Sign-in and account-switch tokens are reused from the on-disk TokenCache
+(see token_cache.py) until they approach expiry. A freshly issued switch
+token is probed via /v2/current_account until CSP honours it (see
+account_readiness.py) instead of sleeping a fixed 2-3s.
+
+Environment Variables:
+  CSP_BASE_URL       - CSP endpoint (default: https://csp.infoblox.com; point at
+                       mock_csp_server.py for offline runs)
+  CSP_POOL_MAXSIZE   - Max keep-alive connections per host (default: 32)
+  CSP_POOL_STATS     - Set to 0 to silence the connection reuse summary at exit
+  CSP_METRICS_DIR    - Where per-endpoint HTTP metrics are exported ("off" to disable)
+"""
+
+import os
+import time
+import atexit
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from token_cache import TokenCache, cache_disabled
+from account_readiness import wait_for_account
+from rate_limiter import get_limiter
+from retry_policy import clamp_timeout
+from http_metrics import get_metrics, trace_request
+
+DEFAULT_BASE_URL = os.environ.get("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/")
+DEFAULT_TIMEOUT = (5, 30)  # connect=5s, read=30s
+POOL_CONNECTIONS = 4       # distinct hosts kept warm (CSP, broker, ...)
+POOL_MAXSIZE = int(os.environ.get("CSP_POOL_MAXSIZE", "32"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class _ConnectCounter:
+    """Counts real TCP connects made by the pooled session."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def incr(self):
+        with self._lock:
+            self.value += 1
+
+
+_connects = _ConnectCounter()
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _connects.incr()
+        return super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        _connects.incr()
+        return super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+class PooledAdapter(HTTPAdapter):
+    """HTTPAdapter with a default timeout, a request counter and connect accounting."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._count_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        # Inside a retry_policy deadline, never wait on a socket past the budget
+        kwargs["timeout"] = clamp_timeout(kwargs["timeout"])
+        with self._count_lock:
+            self.requests_sent += 1
+        limiter = get_limiter()
+        bucket = limiter.bucket_for(request.method, request.url) if limiter else None
+        if limiter:
+            limiter.acquire(bucket)
+        metrics = get_metrics()
+        start = time.monotonic()
+        try:
+            response = super().send(request, **kwargs)
+            if metrics and not kwargs.get("stream"):
+                response.content  # noqa: B018 - read the body inside the timed window
+        except Exception:
+            elapsed = time.monotonic() - start
+            trace_request(request.method, request.url, "error", elapsed)
+            if metrics:
+                metrics.record(request.method, request.url, "error", elapsed, _body_size(request.body))
+            raise
+        elapsed = time.monotonic() - start
+        trace_request(request.method, request.url, response.status_code, elapsed)
+        if metrics:
+            metrics.record(request.method, request.url, response.status_code, elapsed,
+                           _body_size(request.body), _response_size(response, kwargs.get("stream")))
+        if limiter:
+            limiter.observe(bucket, response)
+        return response
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+def _response_size(response, stream):
+    if not stream:
+        return len(response.content or b"")
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else 0
+
+
+def build_session(pool_maxsize=POOL_MAXSIZE, timeout=DEFAULT_TIMEOUT):
+    """Create a requests.Session with a keep-alive pool mounted for http/https."""
+    session = requests.Session()
+    adapter = PooledAdapter(
+        timeout=timeout,
+        pool_connections=POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize,
+        pool_block=False,
+        max_retries=0,  # retries are handled explicitly by the callers
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+                if os.environ.get("CSP_POOL_STATS", "1") != "0":
+                    atexit.register(report_connection_stats)
+    return _session
+
+
+def connection_stats(session=None):
+    """Return {'requests', 'connections', 'reused'} for the pooled session(s)."""
+    session = session or _session
+    if session is None:
+        return {"requests": 0, "connections": 0, "reused": 0}
+    adapters = {id(a): a for a in session.adapters.values() if isinstance(a, PooledAdapter)}
+    sent = sum(a.requests_sent for a in adapters.values())
+    opened = _connects.value
+    return {"requests": sent, "connections": opened, "reused": max(0, sent - opened)}
+
+
+def report_connection_stats(session=None):
+    stats = connection_stats(session)
+    if stats["requests"]:
+        print(f"🔌 HTTP pool: {stats['requests']} request(s) over {stats['connections']} "
+              f"connection(s), {stats['reused']} reused", flush=True)
+
+
+class CSPClient:
+    """
+    Thin CSP session wrapper: sign-in, account switch and authenticated calls,
+    all over the shared pooled session.
+    """
+
+    def __init__(self, base_url=None, email=None, password=None, session=None, token_cache=None):
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.email = email or os.getenv("INFOBLOX_EMAIL")
+        self.password = password or os.getenv("INFOBLOX_PASSWORD")
+        self.session = session or get_session()
+        if token_cache is None and not cache_disabled():
+            token_cache = TokenCache()
+        self.token_cache = token_cache
+        self.jwt = None
+        self.account_id = None
+        self.from_cache = False  # True when the current JWT was reused, not freshly issued
+        self.last_switch_delay = None  # observed claim propagation after the last fresh switch
+
+    # ---------- auth ----------
+    def login(self, force=False):
+        if not force and self.token_cache:
+            cached = self.token_cache.get(self.email, base_url=self.base_url)
+            if cached:
+                self.jwt, self.account_id, self.from_cache = cached, None, True
+                return self.jwt
+
+        r = self.session.post(
+            f"{self.base_url}/v2/session/users/sign_in",
+            json={"email": self.email, "password": self.password},
+        )
+        r.raise_for_status()
+        self.jwt = r.json().get("jwt")
+        if not self.jwt:
+            raise RuntimeError("Login succeeded but no JWT returned.")
+        self.account_id, self.from_cache = None, False
+        if self.token_cache:
+            self.token_cache.put(self.email, None, self.jwt, base_url=self.base_url)
+        return self.jwt
+
+    def switch_account(self, account_id, force=False, wait_ready=True):
+        if not force and self.token_cache:
+            cached = self.token_cache.get(self.email, account_id, base_url=self.base_url)
+            if cached:
+                self.jwt, self.account_id, self.from_cache = cached, account_id, True
+                return self.jwt
+
+        if self.jwt is None or self.account_id is not None:
+            self.login()
+        r = self._post_switch(account_id)
+        if r.status_code == 401 and self.from_cache:
+            # Cached admin token was revoked server-side: sign in for real and retry once
+            self.token_cache.invalidate(self.email, base_url=self.base_url)
+            self.login(force=True)
+            r = self._post_switch(account_id)
+        r.raise_for_status()
+        self.jwt = r.json().get("jwt")
+        if not self.jwt:
+            raise RuntimeError("Account switch succeeded but no JWT returned.")
+        self.account_id, self.from_cache = account_id, False
+        if wait_ready:
+            self.last_switch_delay = wait_for_account(
+                self.session, self.base_url, self.auth_headers(), account_id)
+        if self.token_cache:
+            self.token_cache.put(self.email, account_id, self.jwt, base_url=self.base_url)
+        return self.jwt
+
+    def _post_switch(self, account_id):
+        return self.session.post(
+            f"{self.base_url}/v2/session/account_switch",
+            headers=self.auth_headers(),
+            json={"id": f"identity/accounts/{account_id}"},
+        )
+
+    def invalidate(self):
+        """Drop the cached token for the current account (e.g. after a 401)."""
+        if self.token_cache:
+            self.token_cache.invalidate(self.email, self.account_id, base_url=self.base_url)
+        self.from_cache = False
+
+    def auth_headers(self):
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
+
+    # ---------- requests ----------
+    def request(self, method, path, **kwargs):
+        headers = {**self.auth_headers(), **kwargs.pop("headers", {})}
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        return self.session.request(method, url, headers=headers, **kwargs)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
@@ -0,0 +1,130 @@
+"""
+Server-side filtering and field projection for CSP list calls.
+
+Lookups used to download whole collections and filter in Python (or glue
+f'name=="{name}"' together by hand, which breaks on quotes). These helpers
+build CSP _filter expressions and _fields projections with proper quoting,
+so the tenant only sends back the matching objects and the fields we read.
+
+Usage:
+  from csp_query import eq, contains, any_of, and_, query
+
+  params = query(and_(eq("type", "view"), contains("name", "abc-1.2")),
+                 projection=("id", "name"))
+  # {"_filter": '(type=="view" and name~"abc-1[.]2")', "_fields": "id,name"}
+
+  query(any_of("name", ["user", "act_admin"]), projection=("id", "name"))
+  # {"_filter": '(name=="user" or name=="act_admin")', "_fields": "id,name"}
+
+Operators: eq (==), ne (!=), matches (~, regex), contains (~, literal text),
+any_of (in, as an or-group), and_, or_, not_. Values: str, int, float,
+bool and None (null).
+
+String literals are double-quoted with \\ and \" escaped. contains() turns
+regex metacharacters into one-character classes ([.], [*], [$]) rather than
+backslash escapes, so the pattern means the same whether or not the filter
+parser unescapes backslashes in string literals; only [ ] ^ \\ need a
+backslash (re.escape would also backslash "-", common in participant ids).
+"""
+
+import re
+
+_FIELD = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*$")
+
+
+def field(name):
+    """Validate a field name; only identifiers (with dotted paths) can appear unquoted."""
+    if not isinstance(name, str) or not _FIELD.match(name):
+        raise ValueError(f"invalid CSP filter field: {name!r}")
+    return name
+
+
+def literal(value):
+    """A CSP filter literal: strings double-quoted with \\ and \" escaped."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+
+def eq(name, value):
+    return f"{field(name)}=={literal(value)}"
+
+
+def ne(name, value):
+    return f"{field(name)}!={literal(value)}"
+
+
+def matches(name, pattern):
+    """Regular-expression match (CSP ~)."""
+    return f"{field(name)}~{literal(pattern)}"
+
+
+_REGEX_META = set(".*+?(){}|$")
+
+
+def regex_escape(text):
+    """Text as a regex matching itself, with metacharacters as [x] classes ([ ] ^ \\ backslashed)."""
+    out = []
+    for ch in str(text):
+        if ch in _REGEX_META:
+            out.append(f"[{ch}]")
+        elif ch in "[]^\\":
+            out.append("\\" + ch)
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def contains(name, text):
+    """Substring match: ~ with the text regex-escaped."""
+    return matches(name, regex_escape(text))
+
+
+def any_of(name, values):
+    """name equal to one of values (an "in" written as an or-group)."""
+    values = list(values)
+    if not values:
+        raise ValueError("any_of() needs at least one value")
+    return or_(*(eq(name, v) for v in values))
+
+
+def _join(op, exprs):
+    exprs = [e for e in exprs if e]
+    if not exprs:
+        return ""
+    if len(exprs) == 1:
+        return exprs[0]
+    return "(" + f" {op} ".join(exprs) + ")"
+
+
+def and_(*exprs):
+    return _join("and", exprs)
+
+
+def or_(*exprs):
+    return _join("or", exprs)
+
+
+def not_(expr):
+    return f"not ({expr})" if expr else ""
+
+
+def fields(*names):
+    """A _fields projection from field names (nested names allowed: a.b)."""
+    if len(names) == 1 and not isinstance(names[0], str):
+        names = tuple(names[0])
+    return ",".join(field(n) for n in names)
+
+
+def query(filter=None, projection=None, **params):
+    """Request params with _filter / _fields set when given; extra params pass through."""
+    if filter:
+        params["_filter"] = filter
+    if projection:
+        params["_fields"] = projection if isinstance(projection, str) else fields(*projection)
+    return params
@@ -1,5 +1,9 @@
 import os
-import requests
+import time
+import asyncio
+import httpx
+from csp_async import AsyncCSPClient, DEFAULT_CONCURRENCY
+from retry_policy import get_policy, RetryError
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
@@ -11,26 +15,46 @@ if not TOKEN:
 if not os.path.exists(INPUT_FILE):
     raise FileNotFoundError(f"❌ View ID file '{INPUT_FILE}' not found. Run extract script first.")
 
-headers = {
-    "Authorization": f"Token {TOKEN}",
-    "Content-Type": "application/json"
-}
-
 # === Read view IDs from file
 with open(INPUT_FILE, "r") as f:
     view_ids = [line.strip() for line in f if line.strip()]
 
-print(f"🧹 Deleting {len(view_ids)} DNS view(s)...")
 
-for view_id in view_ids:
-    view_uuid = view_id.split("/")[-1]  # Extract only the UUID
-    url = f"https://csp.infoblox.com/api/ddi/v1/dns/view/{view_uuid}"
-    print(f"❌ Deleting DNS view: {view_id}")
+# 429/5xx and transport errors are retried per the "csp_delete" policy (see retry_policy.py)
+policy = get_policy("csp_delete", retry_exceptions=(httpx.TransportError,))
 
-    response = requests.delete(url, headers=headers)
-    if response.status_code == 204:
-        print("✅ Deleted successfully.")
+
+async def delete_view(client, view_id):
+    view_uuid = view_id.split("/")[-1]  # Extract only the UUID
+    url = f"/api/ddi/v1/dns/view/{view_uuid}"
+    try:
+        response = await policy.call_async(lambda: client.delete(url), label=f"Delete DNS view {view_id}")
+    except RetryError as e:
+        if not hasattr(e.last, "status_code"):
+            raise  # transport errors until the policy gave up
+        response = e.last  # still 429/5xx: reported as a failure below
+    if response.status_code in (200, 204):
+        print(f"✅ Deleted DNS view: {view_id}")
     elif response.status_code == 404:
-        print("⚠️ Not found or already deleted.")
+        print(f"⚠️ Not found or already deleted: {view_id}")
     else:
-        print(f"❌ Failed: {response.status_code} - {response.text}")
+        print(f"❌ Failed {view_id}: {response.status_code} - {response.text}")
+    return response.status_code
+
+
+async def main():
+    async with AsyncCSPClient(api_token=TOKEN, concurrency=DEFAULT_CONCURRENCY) as client:
+        # One failed DELETE (connection reset, timeout) must not drop the other results
+        return await asyncio.gather(*(delete_view(client, v) for v in view_ids), return_exceptions=True)
+
+
+print(f"🧹 Deleting {len(view_ids)} DNS view(s) (up to {DEFAULT_CONCURRENCY} in flight)...")
+start = time.monotonic()
+results = asyncio.run(main())
+for item_id, r in zip(view_ids, results):
+    if isinstance(r, RetryError):
+        print(str(r))
+    elif isinstance(r, Exception):
+        print(f"❌ Failed {item_id}: {type(r).__name__}: {r}")
+ok = sum(1 for r in results if r in (200, 204, 404))
+print(f"🏁 {ok}/{len(view_ids)} view(s) gone, {len(view_ids) - ok} failed in {time.monotonic() - start:.1f}s")
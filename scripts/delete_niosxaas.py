@@ -1,8 +1,9 @@
 import os
 import re
 import yaml
-import requests
-import time
+from csp_client import CSPClient
+from pager import iter_items
+from csp_query import eq, query
 
 def load_config_with_env(file_path):
     with open(file_path, "r") as f:
@@ -16,19 +17,17 @@ def load_config_with_env(file_path):
 class InfobloxVPNCleaner:
     def __init__(self, config_file):
         self.config = load_config_with_env(config_file)
-        self.base_url = self.config["base_url"]
+        self.base_url = os.environ.get("CSP_BASE_URL", self.config["base_url"]).rstrip("/")
         self.email = self.config["email"]
         self.password = self.config["password"]
         self.sandbox_id_file = self.config["sandbox_id_file"]
+        self.client = CSPClient(self.base_url, self.email, self.password)
+        self.session = self.client.session
         self.jwt = None
         self.headers = {}
 
     def authenticate(self):
-        url = f"{self.base_url}/v2/session/users/sign_in"
-        payload = {"email": self.email, "password": self.password}
-        r = requests.post(url, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.login()
         self.headers = {
             "Authorization": f"Bearer {self.jwt}",
             "Content-Type": "application/json"
@@ -38,23 +37,15 @@ class InfobloxVPNCleaner:
     def switch_account(self):
         with open(self.sandbox_id_file, "r") as f:
             sandbox_id = f.read().strip()
-        url = f"{self.base_url}/v2/session/account_switch"
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        r = requests.post(url, headers=self.headers, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.switch_account(sandbox_id)
         self.headers["Authorization"] = f"Bearer {self.jwt}"
         print(f"🔁 Switched to sandbox account {sandbox_id}")
-        time.sleep(2)
 
     def get_service_id_by_name(self, target_name):
         url = f"{self.base_url}/api/universalinfra/v1/universalservices"
-        r = requests.get(url, headers=self.headers)
-        r.raise_for_status()
-        services = r.json().get("results", [])
-
-        print(f"📦 Retrieved {len(services)} services:")
-        for svc in services:
+        print("📦 Retrieved services:")
+        params = query(eq("name", target_name), projection=("id", "name"))  # filtered server-side
+        for svc in iter_items(self.session, url, headers=self.headers, params=params):
             svc_id = svc.get("id")
             svc_name = svc.get("name")
             print(f"  - 🔹 ID: {svc_id}, Name: {svc_name}")
@@ -69,7 +60,7 @@ class InfobloxVPNCleaner:
         # Normalize ID if it's a full path like "infra/universal_service/XYZ"
         service_uuid = full_id.split("/")[-1]
         url = f"{self.base_url}/api/universalinfra/v1/universalservices/{service_uuid}"
-        r = requests.delete(url, headers=self.headers)
+        r = self.session.delete(url, headers=self.headers)
         if r.status_code == 200:
             print(f"🗑️ Successfully deleted service with ID: {service_uuid}")
         else:
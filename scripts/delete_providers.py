@@ -1,5 +1,9 @@
 import os
-import requests
+import time
+import asyncio
+import httpx
+from csp_async import AsyncCSPClient, DEFAULT_CONCURRENCY
+from retry_policy import get_policy, RetryError
 
 TOKEN = os.environ.get("Infoblox_Token")
 INPUT_FILE = "provider_ids.txt"
@@ -9,23 +13,44 @@ if not TOKEN:
 if not os.path.exists(INPUT_FILE):
     raise FileNotFoundError(f"❌ Input file '{INPUT_FILE}' not found.")
 
-headers = {
-    "Authorization": f"Token {TOKEN}",
-    "Content-Type": "application/json"
-}
-
 with open(INPUT_FILE, "r") as f:
     provider_ids = [line.strip() for line in f if line.strip()]
 
-print(f"🧹 Deleting {len(provider_ids)} provider(s)...")
 
-for provider_id in provider_ids:
-    url = f"https://csp.infoblox.com/api/cloud_discovery/v2/providers/{provider_id}"
-    print(f"❌ Deleting provider: {provider_id}")
-    response = requests.delete(url, headers=headers)
-    if response.status_code == 204:
-        print("✅ Deleted successfully.")
+# 429/5xx and transport errors are retried per the "csp_delete" policy (see retry_policy.py)
+policy = get_policy("csp_delete", retry_exceptions=(httpx.TransportError,))
+
+
+async def delete_provider(client, provider_id):
+    url = f"/api/cloud_discovery/v2/providers/{provider_id}"
+    try:
+        response = await policy.call_async(lambda: client.delete(url), label=f"Delete provider {provider_id}")
+    except RetryError as e:
+        if not hasattr(e.last, "status_code"):
+            raise  # transport errors until the policy gave up
+        response = e.last  # still 429/5xx: reported as a failure below
+    if response.status_code in (200, 204):
+        print(f"✅ Deleted provider: {provider_id}")
     elif response.status_code == 404:
-        print("⚠️ Not found.")
+        print(f"⚠️ Not found: {provider_id}")
     else:
-        print(f"❌ Failed: {response.status_code} - {response.text}")
+        print(f"❌ Failed {provider_id}: {response.status_code} - {response.text}")
+    return response.status_code
+
+
+async def main():
+    async with AsyncCSPClient(api_token=TOKEN, concurrency=DEFAULT_CONCURRENCY) as client:
+        # One failed DELETE (connection reset, timeout) must not drop the other results
+        return await asyncio.gather(*(delete_provider(client, p) for p in provider_ids), return_exceptions=True)
+
+
+print(f"🧹 Deleting {len(provider_ids)} provider(s) (up to {DEFAULT_CONCURRENCY} in flight)...")
+start = time.monotonic()
+results = asyncio.run(main())
+for item_id, r in zip(provider_ids, results):
+    if isinstance(r, RetryError):
+        print(str(r))
+    elif isinstance(r, Exception):
+        print(f"❌ Failed {item_id}: {type(r).__name__}: {r}")
+ok = sum(1 for r in results if r in (200, 204, 404))
+print(f"🏁 {ok}/{len(provider_ids)} provider(s) gone, {len(provider_ids) - ok} failed in {time.monotonic() - start:.1f}s")
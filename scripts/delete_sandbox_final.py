@@ -2,10 +2,9 @@ import os
 import sys
 import time
 import random
-import requests
 from sandbox_api import SandboxAccountAPI
 
-BASE_URL = "https://csp.infoblox.com/v2"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/") + "/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 
@@ -29,7 +28,7 @@ max_retries = 5
 for attempt in range(max_retries):
     try:
         print(f"🔗 DELETE {endpoint} (attempt {attempt+1})", flush=True)
-        resp = requests.delete(endpoint, headers=api._headers())
+        resp = api.session.delete(endpoint, headers=api._headers())
         if resp.status_code in [200, 204]:
             print(f"✅ Sandbox {sandbox_id} deleted.", flush=True)
             try:
@@ -5,6 +5,7 @@ import random
 import requests
 import uuid
 from sandbox_api import SandboxAccountAPI
+from admission import admit
 
 # ----------------------------------
 # Configuration
@@ -13,8 +14,8 @@ BASE_URL = "https://csp.infoblox.com/v2"
 TOKEN = os.environ.get("Infoblox_Token")
 SANDBOX_ID_FILE = "sandbox_id.txt"
 
-# Startup jitter (avoid host collisions)
-time.sleep(random.uniform(1, 10))
+# Admission slot (replaces a flat 1-10s random startup jitter)
+admit("csp:write", os.environ.get("INSTRUQT_PARTICIPANT_ID"), spread=10)
 
 # --- Read sandbox ID ---
 try:
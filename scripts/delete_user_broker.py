@@ -3,10 +3,10 @@ import os
 import sys
 import time
 import random
-import requests
+from csp_client import CSPClient
 
 # === Constants & File References ===
-BASE_URL = "https://csp.infoblox.com"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/")
 EMAIL = os.getenv("INFOBLOX_EMAIL")
 PASSWORD = os.getenv("INFOBLOX_PASSWORD")
 EXTERNAL_ID_FILE = "external_id.txt"
@@ -28,21 +28,14 @@ if not external_id or not user_id:
     sys.exit("❌ external_id.txt or user_id.txt is empty.")
 
 # === Step 1: Authenticate ===
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_payload = {"email": EMAIL, "password": PASSWORD}
-auth_resp = requests.post(auth_url, json=auth_payload)
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+client = CSPClient(BASE_URL, EMAIL, PASSWORD)
+jwt = client.login()
+headers = client.auth_headers()
 print("✅ Authenticated successfully.", flush=True)
 
 # === Step 2: Switch to sandbox account (external_id) ===
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_payload = {"id": f"identity/accounts/{external_id}"}
-switch_resp = requests.post(switch_url, headers=headers, json=switch_payload)
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
+jwt = client.switch_account(external_id)
+headers = client.auth_headers()
 print(f"🔁 Switched to account (external_id): {external_id}", flush=True)
 
 # === Step 3: Delete user with retries ===
@@ -52,7 +45,7 @@ max_retries = 5
 for attempt in range(max_retries):
     try:
         print(f"🧹 DELETE {endpoint} (attempt {attempt + 1})", flush=True)
-        resp = requests.delete(endpoint, headers=headers)
+        resp = client.session.delete(endpoint, headers=headers)
 
         if resp.status_code == 204:
             print(f"✅ User {user_id} deleted successfully.", flush=True)
@@ -1,6 +1,7 @@
-import os, sys, time, random, requests
+import os, sys, time, random
+from csp_client import CSPClient
 
-BASE_URL = "https://csp.infoblox.com"
+BASE_URL = os.getenv("CSP_BASE_URL", "https://csp.infoblox.com").rstrip("/")
 EMAIL = os.getenv("INFOBLOX_EMAIL")
 PASSWORD = os.getenv("INFOBLOX_PASSWORD")
 SANDBOX_ID_FILE = "sandbox_id.txt"
@@ -17,19 +18,14 @@ if not sandbox_id or not user_id:
     sys.exit("❌ Missing sandbox_id or user_id in file(s).")
 
 # --- Step 1: Login ---
-auth_url = f"{BASE_URL}/v2/session/users/sign_in"
-auth_resp = requests.post(auth_url, json={"email": EMAIL, "password": PASSWORD})
-auth_resp.raise_for_status()
-jwt = auth_resp.json()["jwt"]
-headers = {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
+client = CSPClient(BASE_URL, EMAIL, PASSWORD)
+jwt = client.login()
+headers = client.auth_headers()
 print("✅ Authenticated.", flush=True)
 
 # --- Step 2: Switch account ---
-switch_url = f"{BASE_URL}/v2/session/account_switch"
-switch_resp = requests.post(switch_url, headers=headers, json={"id": f"identity/accounts/{sandbox_id}"})
-switch_resp.raise_for_status()
-jwt = switch_resp.json()["jwt"]
-headers["Authorization"] = f"Bearer {jwt}"
+jwt = client.switch_account(sandbox_id)
+headers = client.auth_headers()
 print(f"🔁 Switched to sandbox account {sandbox_id}", flush=True)
 
 # --- Step 3: Delete user with retries ---
@@ -39,7 +35,7 @@ max_retries = 5
 for attempt in range(max_retries):
     try:
         print(f"🔗 DELETE {endpoint} (attempt {attempt+1})", flush=True)
-        resp = requests.delete(endpoint, headers=headers)
+        resp = client.session.delete(endpoint, headers=headers)
 
         if resp.status_code == 204:
             print(f"✅ User {user_id} deleted.", flush=True)
@@ -1,42 +1,41 @@
 import os
 import json
 import requests
-import time
-import random
+from csp_client import CSPClient
+from retry_policy import get_policy, deadline, Retry, RetryError
+from token_refresher import TokenRefresher
 
 class InfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
-        self.email = os.getenv("INFOBLOX_EMAIL")
-        self.password = os.getenv("INFOBLOX_PASSWORD")
+        self.client = CSPClient()
+        self.base_url = self.client.base_url
+        self.email = self.client.email
+        self.password = self.client.password
         self.jwt = None
-        self.session = requests.Session()
+        self.session = self.client.session
+        self.refresher = None
         self.headers = {"Content-Type": "application/json"}
         self.account_id = os.getenv("INSTRUQT_AWS_ACCOUNT_INFOBLOX_DEMO_ACCOUNT_ID")
 
-    def login(self):
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(
-            f"{self.base_url}/v2/session/users/sign_in",
-            headers=self.headers, json=payload
-        )
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+    def login(self, force=False):
+        self.jwt = self.client.login(force=force)
         self._save_to_file("jwt.txt", self.jwt)
         print("✅ Logged in and saved JWT to jwt.txt")
 
-    def switch_account(self):
+    def switch_account(self, force=False):
         sandbox_id = self._read_file("sandbox_id.txt")
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        response = self.session.post(
-            f"{self.base_url}/v2/session/account_switch",
-            headers=self._auth_headers(), json=payload
-        )
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = self.client.switch_account(sandbox_id, force=force)
         self._save_to_file("jwt.txt", self.jwt)
         print(f"✅ Switched to sandbox {sandbox_id} and updated JWT")
 
+    def start_token_refresher(self):
+        """Keep the switched JWT fresh from a background thread (exp-driven or on 401/403)."""
+        if self.refresher is None:
+            self.refresher = TokenRefresher(
+                self.client, self.client.account_id,
+                on_refresh=lambda jwt: self._save_to_file("jwt.txt", jwt),
+            ).start()
+
     def get_current_account(self):
         response = self.session.get(
             f"{self.base_url}/v2/current_account",
@@ -76,128 +75,85 @@ class InfobloxSession:
             response.raise_for_status()
             print("🔐 AWS key created successfully.")
 
-    # --------- Hardened waiters with backoff + jitter + periodic session refresh ---------
+    # --------- Hardened waiters (retry_policy: decorrelated jitter + deadline) ---------
+
+    def _propagation_get(self, policy, url):
+        """One waiter probe: 401/403 nudge the background token refresher; transient codes retry."""
+        r = self.session.get(url, headers=self._auth_headers())
+        if r.status_code in (401, 403):
+            self._signal_auth_failure()
+        if policy.retryable(r):
+            return r
+        r.raise_for_status()
+        return r.json()
 
     def fetch_cloud_credential_id(self, timeout=240, initial_interval=5, max_interval=20):
         """
         Poll /api/iam/v1/cloud_credential until an AWS credential is visible.
-        - Treats 403/503 as propagation/transient.
-        - Exponential backoff with jitter.
-        - Refreshes session (login + account switch) every few attempts.
+        - Treats 401/403/503 as propagation/transient ("propagation" policy).
+        - 401/403 nudge the background token refresher; no inline re-login.
         """
         url = f"{self.base_url}/api/iam/v1/cloud_credential"
         print(f"⏳ Waiting (up to {timeout}s) for AWS Cloud Credential to appear...")
-        start = time.monotonic()
-        interval = initial_interval
-        attempts = 0
-
-        while True:
-            elapsed = time.monotonic() - start
-            if elapsed > timeout:
-                raise RuntimeError(f"❌ Timed out after {timeout}s waiting for AWS Cloud Credential to appear.")
+        policy = get_policy("propagation", deadline=timeout, base=initial_interval, cap=max_interval)
+
+        def attempt():
+            data = self._propagation_get(policy, url)
+            if isinstance(data, requests.Response):
+                return data
+            creds = data.get("results", []) if isinstance(data, dict) else []
+            for cred in creds:
+                if cred.get("credential_type") == "Amazon Web Services":
+                    return cred.get("id")
+            return Retry("credential not visible yet")
 
-            try:
-                r = self.session.get(url, headers=self._auth_headers())
-                if r.status_code == 429:
-                    ra = r.headers.get("Retry-After")
-                    sleep_s = int(ra) if (ra and ra.isdigit()) else min(max_interval, max(5, interval))
-                    print(f"⏸️  429 Too Many Requests. Sleeping {sleep_s}s (Retry-After).")
-                    time.sleep(sleep_s)
-                    continue
-
-                if r.status_code in (403, 503):
-                    print(f"🚦 {r.status_code} transient ({r.reason}); retrying...")
-                else:
-                    r.raise_for_status()
-                    data = r.json()
-                    creds = data.get("results", []) if isinstance(data, dict) else []
-                    for cred in creds:
-                        if cred.get("credential_type") == "Amazon Web Services":
-                            credential_id = cred.get("id")
-                            self._save_to_file("cloud_credential_id.txt", credential_id)
-                            print(f"✅ AWS Cloud Credential ID found and saved: {credential_id}")
-                            return credential_id
-
-            except requests.RequestException as e:
-                print(f"⚠️ Fetch error: {e}; continuing...")
-
-            attempts += 1
-            if attempts % 3 == 0:
-                try:
-                    print("🔄 Refreshing session (login + account switch)...")
-                    self.login()
-                    self.switch_account()
-                except Exception as e:
-                    print(f"⚠️ Session refresh failed: {e}")
-
-            sleep_s = min(max_interval, interval) + random.uniform(0, 0.3 * interval)
-            print(f"🕐 Still waiting... elapsed={int(elapsed)}s; next check in ~{sleep_s:.1f}s")
-            time.sleep(sleep_s)
-            interval = min(max_interval, max(initial_interval, interval * 1.7))
+        try:
+            credential_id = policy.call(attempt, label="AWS Cloud Credential")
+        except RetryError:
+            raise RuntimeError(f"❌ Timed out after {timeout}s waiting for AWS Cloud Credential to appear.")
+        self._save_to_file("cloud_credential_id.txt", credential_id)
+        print(f"✅ AWS Cloud Credential ID found and saved: {credential_id}")
+        return credential_id
 
     def fetch_dns_view_id(self, timeout=240, initial_interval=5, max_interval=20):
         """
         Poll /api/ddi/v1/dns/view until at least one DNS View is visible.
-        - Treats 403/503 as propagation/transient.
-        - Exponential backoff with jitter.
-        - Refreshes session (login + account switch) every few attempts.
+        - Treats 401/403/503 as propagation/transient ("propagation" policy).
+        - 401/403 nudge the background token refresher; no inline re-login.
         """
         url = f"{self.base_url}/api/ddi/v1/dns/view"
         print(f"⏳ Waiting (up to {timeout}s) for DNS View to become accessible...")
-        start = time.monotonic()
-        interval = initial_interval
-        attempts = 0
+        policy = get_policy("propagation", deadline=timeout, base=initial_interval, cap=max_interval)
 
-        while True:
-            elapsed = time.monotonic() - start
-            if elapsed > timeout:
-                raise RuntimeError("❌ Timed out waiting for DNS View to be available")
+        def attempt():
+            data = self._propagation_get(policy, url)
+            if isinstance(data, requests.Response):
+                return data
+            views = data.get("results", []) if isinstance(data, dict) else []
+            return views[0].get("id") if views else Retry("no DNS View yet")
 
-            try:
-                r = self.session.get(url, headers=self._auth_headers())
-                if r.status_code == 429:
-                    ra = r.headers.get("Retry-After")
-                    sleep_s = int(ra) if (ra and ra.isdigit()) else min(max_interval, max(5, interval))
-                    print(f"⏸️  429 Too Many Requests. Sleeping {sleep_s}s (Retry-After).")
-                    time.sleep(sleep_s)
-                    continue
-
-                if r.status_code in (403, 503):
-                    print(f"🚦 {r.status_code} transient ({r.reason}); retrying...")
-                else:
-                    r.raise_for_status()
-                    data = r.json()
-                    views = data.get("results", []) if isinstance(data, dict) else []
-                    if views:
-                        dns_view_id = views[0].get("id")
-                        self._save_to_file("dns_view_id.txt", dns_view_id)
-                        print(f"✅ DNS View ID saved: {dns_view_id}")
-                        return dns_view_id
-
-            except requests.RequestException as e:
-                print(f"⚠️ Fetch error: {e}; continuing...")
-
-            attempts += 1
-            if attempts % 3 == 0:
-                try:
-                    print("🔄 Refreshing session (login + account switch)...")
-                    self.login()
-                    self.switch_account()
-                except Exception as e:
-                    print(f"⚠️ Session refresh failed: {e}")
-
-            sleep_s = min(max_interval, interval) + random.uniform(0, 0.3 * interval)
-            print(f"🕐 Still waiting... elapsed={int(elapsed)}s; next check in ~{sleep_s:.1f}s")
-            time.sleep(sleep_s)
-            interval = min(max_interval, max(initial_interval, interval * 1.7))
+        try:
+            dns_view_id = policy.call(attempt, label="DNS View")
+        except RetryError:
+            raise RuntimeError("❌ Timed out waiting for DNS View to be available")
+        self._save_to_file("dns_view_id.txt", dns_view_id)
+        print(f"✅ DNS View ID saved: {dns_view_id}")
+        return dns_view_id
 
     # ------------------ new: session refresh helper ------------------
 
+    def _signal_auth_failure(self):
+        """Non-blocking when the background refresher runs; inline refresh otherwise."""
+        if self.refresher:
+            self.refresher.signal_auth_failure()
+        else:
+            self._refresh_session()
+
     def _refresh_session(self):
-        """Re-login and re-switch to sandbox to refresh JWT/claims."""
+        """Re-login and re-switch to sandbox to refresh JWT/claims (bypasses the token cache)."""
         try:
-            self.login()
-            self.switch_account()
+            self.login(force=True)
+            self.switch_account(force=True)
         except Exception as e:
             print(f"⚠️ Session refresh failed: {e}")
 
@@ -221,60 +177,47 @@ class InfobloxSession:
     def wait_cloud_discovery_ready(self, timeout=600):
         """Poll GET /api/cloud_discovery/v2/providers until it returns 200."""
         url = f"{self.base_url}/api/cloud_discovery/v2/providers"
-        start, interval = time.monotonic(), 3
-        while True:
-            if time.monotonic() - start > timeout:
-                raise RuntimeError("❌ Cloud Discovery API never became readable (GET /providers)")
-            r = self.session.get(url, headers=self._auth_headers(), timeout=30)
-            if r.status_code < 400:
-                print("✅ Cloud Discovery API is readable (GET /providers)")
-                return
-            if r.status_code not in (403, 429, 502, 503, 504):
-                r.raise_for_status()
-            ra = int(r.headers.get("Retry-After", "0") or 0)
-            sleep_s = min(30, (ra or interval))
-            time.sleep(sleep_s)
-            interval = min(30, max(3, interval * 1.7))
+        policy = get_policy("discovery_ready", deadline=timeout)
+        try:
+            r = policy.call(lambda: self.session.get(url, headers=self._auth_headers(), timeout=30),
+                            label="GET /providers")
+        except RetryError:
+            raise RuntimeError("❌ Cloud Discovery API never became readable (GET /providers)")
+        r.raise_for_status()
+        print("✅ Cloud Discovery API is readable (GET /providers)")
 
     def submit_discovery_job(self, payload_file, timeout=900):
         with open(payload_file, "r") as f:
             payload = json.load(f)
 
         url = f"{self.base_url}/api/cloud_discovery/v2/providers"
+        policy = get_policy("discovery_submit")
 
-        # Pre-flight readiness
-        self.wait_cloud_discovery_ready()
-
-        start, interval = time.monotonic(), 3
-        while True:
+        def attempt():
             r = self.session.post(url, headers=self._auth_headers(), json=payload, timeout=30)
-            if r.status_code < 400:
-                print("🚀 Cloud Discovery Job submitted:")
-                print(json.dumps(r.json(), indent=2))
-                return
-
-            rid = r.headers.get("X-Request-ID")
-            print(f"⚠️ POST /providers -> {r.status_code} (req-id: {rid}) body: {r.text[:500]}")
-
+            if r.status_code >= 400:
+                rid = r.headers.get("X-Request-ID")
+                print(f"⚠️ POST /providers -> {r.status_code} (req-id: {rid}) body: {r.text[:500]}")
             # Refresh JWT when control-plane entitlements attach a beat late
             if r.status_code in (401, 403):
-                print("🔄 Refreshing JWT (login + account switch) and retrying…")
-                self._refresh_session()
-
-            # Retry only on transient classes
-            if r.status_code not in (401, 403, 409, 429, 502, 503, 504):
-                r.raise_for_status()
+                print("🔄 Requesting JWT refresh (login + account switch) and retrying…")
+                self._signal_auth_failure()
+            return r
 
-            if time.monotonic() - start > timeout:
+        # One budget covers both the pre-flight readiness wait and the submit retries
+        with deadline(timeout):
+            self.wait_cloud_discovery_ready()
+            try:
+                r = policy.call(attempt, label="POST /providers")
+            except RetryError:
                 raise RuntimeError("❌ Timed out submitting Cloud Discovery job")
-
-            ra = int(r.headers.get("Retry-After", "0") or 0)
-            sleep_s = min(60, (ra or interval))
-            time.sleep(sleep_s)
-            interval = min(60, max(3, interval * 1.7))
+        r.raise_for_status()
+        print("🚀 Cloud Discovery Job submitted:")
+        print(json.dumps(r.json(), indent=2))
 
     def _auth_headers(self):
-        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.jwt}"}
+        # Read the client's token on every call so background refreshes apply immediately
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {self.client.jwt}"}
 
     def _save_to_file(self, filename, content):
         with open(filename, "w") as f:
@@ -289,6 +232,7 @@ if __name__ == "__main__":
     session = InfobloxSession()
     session.login()
     session.switch_account()
+    session.start_token_refresher()
     session.get_current_account()
     session.create_aws_key()
     cloud_credential_id = session.fetch_cloud_credential_id()
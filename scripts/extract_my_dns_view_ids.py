@@ -1,20 +1,22 @@
 import os
-import json
 import requests
+from csp_client import DEFAULT_BASE_URL
+from pager import iter_items
+from csp_query import and_, contains, eq, query
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
 PARTICIPANT_ID = os.environ.get("INSTRUQT_PARTICIPANT_ID")
 OUTPUT_FILE = "dns_view_ids.txt"
 
-API_URL = "https://csp.infoblox.com/api/ddi/v1/dns/zone_child"
-PARAMS = {
-    "_filter": 'flat=="false"',
-    "_order_by": "name asc",
-    "_is_total_size_needed": "true",
-    "_limit": "101",
-    "_offset": "0"
-}
+API_URL = f"{DEFAULT_BASE_URL}/api/ddi/v1/dns/zone_child"  # CSP_BASE_URL overrides the host
+# Filtered server-side: only this participant's views, only the fields we read
+PARAMS = query(
+    and_(eq("flat", "false"), eq("type", "view"), contains("name", PARTICIPANT_ID or "")),
+    projection=("id", "name", "type"),
+    _order_by="name asc",
+    _is_total_size_needed="true",
+)
 
 # === Validation ===
 if not TOKEN:
@@ -29,20 +31,22 @@ headers = {
 
 print(f"📡 Querying DNS views for participant ID: {PARTICIPANT_ID}...")
 
-response = requests.get(API_URL, headers=headers, params=PARAMS)
+# Every page (the old single _limit=101 request silently dropped the rest).
+# The server already filters on the name; the check here is a guard because the
+# IDs are fed to delete_dns_views.py: it keeps the match case-sensitive and
+# literal even if the server's ~ matches case-insensitively or unescapes differently.
+total = 0
+matching = []
 try:
-    data = response.json()
-except Exception:
-    data = {"raw": response.text}
-
-zones = data.get("results", [])
-print(f"🔍 Found {len(zones)} total DNS views.")
-
-# === Filter and write matching views
-matching = [
-    (z["name"], z["id"]) for z in zones
-    if PARTICIPANT_ID in z.get("name", "") and z.get("type") == "view"
-]
+    for z in iter_items(url=API_URL, headers=headers, params=PARAMS):
+        total += 1
+        if PARTICIPANT_ID in z.get("name", "") and z.get("type") == "view":
+            matching.append((z["name"], z["id"]))
+except (requests.HTTPError, ValueError) as e:
+    # Cleanup / deallocation run this: an unreadable listing means "nothing to delete"
+    print(f"⚠️ Could not list DNS views ({e}); treating as none found.")
+    total, matching = 0, []
+print(f"🔍 Found {total} candidate DNS view(s).")
 
 with open(OUTPUT_FILE, "w") as f:
     for name, view_id in matching:
@@ -1,6 +1,6 @@
 import os
-import json
-import requests
+from pager import iter_items
+from csp_query import eq, query
 
 # === Config ===
 TOKEN = os.environ.get("Infoblox_Token")
@@ -22,23 +22,19 @@ headers = {
     "Content-Type": "application/json"
 }
 
-print("📡 Listing all cloud credentials...")
-
-response = requests.get(url, headers=headers)
-try:
-    data = response.json()
-except Exception:
-    data = {"raw": response.text}
-
-print(f"📦 Status Code: {response.status_code}")
-print("📥 Cloud Credential List:")
-print(json.dumps(data, indent=2))
-
-credentials = data.get("results", [])
-print(f"🔍 Found {len(credentials)} credential(s) total.")
-
-# === Filter by dynamic name ===
-filtered = [c for c in credentials if c.get("name") == TARGET_NAME]
+print("📡 Looking up the cloud credential...")
+
+# Filtered server-side; the first credential with the target name wins
+total = 0
+filtered = []
+params = query(eq("name", TARGET_NAME), projection=("id", "name"))
+for c in iter_items(url=url, headers=headers, params=params):
+    total += 1
+    print(f"   - {c.get('name')} ({c.get('id')})")
+    if c.get("name") == TARGET_NAME:
+        filtered.append(c)
+        break
+print(f"🔍 Scanned {total} credential(s).")
 
 if filtered:
     cred_id = filtered[0]["id"]
@@ -2,8 +2,7 @@ import os
 import re
 import yaml
 import json
-import requests
-import time
+from csp_client import CSPClient
 
 def load_config_with_env(file_path):
     with open(file_path, "r") as f:
@@ -17,18 +16,17 @@ def load_config_with_env(file_path):
 class InfobloxCNAMEFetcher:
     def __init__(self, config_file):
         self.config = load_config_with_env(config_file)
-        self.base_url = self.config["base_url"]
+        self.base_url = os.environ.get("CSP_BASE_URL", self.config["base_url"]).rstrip("/")
         self.email = self.config["email"]
         self.password = self.config["password"]
         self.sandbox_id_file = self.config["sandbox_id_file"]
+        self.client = CSPClient(self.base_url, self.email, self.password)
+        self.session = self.client.session
         self.jwt = None
         self.headers = {}
 
     def authenticate(self):
-        url = f"{self.base_url}/v2/session/users/sign_in"
-        r = requests.post(url, json={"email": self.email, "password": self.password})
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.login()
         self.headers = {
             "Authorization": f"Bearer {self.jwt}",
             "Content-Type": "application/json"
@@ -38,17 +36,13 @@ class InfobloxCNAMEFetcher:
     def switch_account(self):
         with open(self.sandbox_id_file, "r") as f:
             sandbox_id = f.read().strip()
-        url = f"{self.base_url}/v2/session/account_switch"
-        r = requests.post(url, headers=self.headers, json={"id": f"identity/accounts/{sandbox_id}"})
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.switch_account(sandbox_id)
         self.headers["Authorization"] = f"Bearer {self.jwt}"
         print(f"🔁 Switched to sandbox account {sandbox_id}")
-        time.sleep(3)
 
     def fetch_cnames(self, output_file="cnames.txt"):
         url = f"{self.base_url}/api/universalinfra/v1/endpoints/"
-        r = requests.get(url, headers=self.headers)
+        r = self.session.get(url, headers=self.headers)
         r.raise_for_status()
         data = r.json()
 
@@ -0,0 +1,258 @@
+"""
+Hedged requests for idempotent calls with a long tail.
+
+A single slow broker instance used to stall /allocate for the full 30s read
+timeout before the retry policy even got a chance. For idempotent calls a
+second ("hedge") request is fired once the first has been outstanding longer
+than the observed p95 latency, and whichever answers first wins; the loser
+is left to finish in the background and its answer is ignored.
+
+Only the primary request's latency goes into the window, whether it won or
+finished later after losing to the hedge; hedge latencies are left out, since
+they start late and would pull the p95 (and so the next hedge) earlier and
+earlier. Latencies and hedge outcomes are kept in a small JSON file shared by
+every script on the host (same flock + atomic-replace scheme as
+token_cache.py), so on an operator host (bulk_allocate.py,
+broker_load_test.py) the p95 comes from earlier calls rather than from the
+one request this process makes.
+
+A student VM makes one /allocate call and never collects MIN_SAMPLES of its
+own. Export the operator's window with "hedging.py export" and ship it with
+the track as HEDGE_SEED: its samples fill in until the local window is big
+enough. Without a seed, single-shot callers hedge after the fixed
+HEDGE_DEFAULT_DELAY. Run the module to see how often hedging fires and what
+it saves.
+
+Usage:
+  from hedging import LatencyWindow, hedged_call
+
+  window = LatencyWindow("broker_allocate")
+  resp = hedged_call(send_once, window, label="Allocation")
+
+  python3 hedging.py                       # hedge stats per call name
+  python3 hedging.py export hedge_seed.json  # latency samples to ship as HEDGE_SEED
+
+Environment Variables:
+  HEDGE_STATE_FILE     - Shared state (default: ~/.cache/infoblox/hedge_stats.json)
+  HEDGE_SEED           - Exported latency samples used while the local window
+                         has fewer than MIN_SAMPLES (e.g. shipped with the track)
+  HEDGE_DEFAULT_DELAY  - Hedge delay while neither the window nor the seed has
+                         enough samples for a p95 (default: 5)
+  HEDGE_MIN_DELAY      - Never hedge sooner than this many seconds (default: 0.5)
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import queue
+import threading
+import argparse
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_STATE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "hedge_stats.json")
+WINDOW_SIZE = 200   # latency samples kept per call name
+MIN_SAMPLES = 20    # below this the p95 is noise; use HEDGE_DEFAULT_DELAY
+HEDGE_QUANTILE = 0.95
+
+
+class LatencyWindow:
+    """Rolling latency samples plus hedge counters for one call name, shared on disk."""
+
+    def __init__(self, name, path=None):
+        self.name = name
+        self.path = path or os.environ.get("HEDGE_STATE_FILE", DEFAULT_STATE_FILE)
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _store(self, data):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def _update(self, fn):
+        try:
+            with self._locked():
+                data = self._load()
+                entry = data.setdefault(self.name, {"samples": [], "counters": {}})
+                fn(entry)
+                self._store(data)
+        except OSError as e:  # stats are best effort, never fail the call
+            print(f"⚠️ Could not update hedge stats: {e}", flush=True)
+
+    def entry(self):
+        with self._locked():
+            return self._load().get(self.name, {"samples": [], "counters": {}})
+
+    def record(self, seconds):
+        def add(entry):
+            entry["samples"] = (entry["samples"] + [round(seconds, 4)])[-WINDOW_SIZE:]
+        self._update(add)
+
+    def count(self, **increments):
+        def add(entry):
+            for key, n in increments.items():
+                entry["counters"][key] = round(entry["counters"].get(key, 0) + n, 4)
+        self._update(add)
+
+    def seed_samples(self):
+        """Samples for this call name from the HEDGE_SEED file, or []."""
+        path = os.environ.get("HEDGE_SEED")
+        if not path:
+            return []
+        try:
+            with open(path) as f:
+                samples = json.load(f).get(self.name, {}).get("samples", [])
+        except (OSError, ValueError, AttributeError):
+            return []
+        return [float(s) for s in samples if isinstance(s, (int, float))]
+
+    def quantile(self, q=HEDGE_QUANTILE):
+        """
+        Nearest-rank quantile of the window, topped up from HEDGE_SEED while the
+        window is short; None with fewer than MIN_SAMPLES in total.
+        """
+        samples = self.entry()["samples"]
+        if len(samples) < MIN_SAMPLES:
+            samples = samples + self.seed_samples()[-(WINDOW_SIZE - len(samples)):]
+        samples = sorted(samples)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_delay(self):
+        p95 = self.quantile()
+        if p95 is None:
+            p95 = float(os.environ.get("HEDGE_DEFAULT_DELAY", 5))
+        return max(float(os.environ.get("HEDGE_MIN_DELAY", 0.5)), p95)
+
+
+def _start(fn, results, tag):
+    """Run fn in a daemon thread (a slow loser must not hold up interpreter exit)."""
+    ctx = contextvars.copy_context()  # keep the retry_policy deadline for timeout clamping
+    start = time.monotonic()
+
+    def run():
+        try:
+            results.put((tag, ctx.run(fn), None, time.monotonic() - start))
+        except Exception as e:
+            results.put((tag, None, e, time.monotonic() - start))
+    threading.Thread(target=run, name=f"hedge-{tag}", daemon=True).start()
+
+
+def hedged_call(fn, window, label="request", delay=None):
+    """
+    Call fn(); if it has not returned after `delay` (default: the window's
+    p95), call it again concurrently and return whichever result arrives
+    first. fn must be idempotent. An exception only wins if both attempts fail.
+    """
+    delay = window.hedge_delay() if delay is None else delay
+    results = queue.Queue()
+    start = time.monotonic()
+    _start(fn, results, "primary")
+    try:
+        tag, value, error, seconds = results.get(timeout=delay)
+        window.count(calls=1)
+    except queue.Empty:
+        print(f"🪝 {label}: no answer after {delay:.1f}s, sending a hedge request", flush=True)
+        _start(fn, results, "hedge")
+        tag, value, error, seconds = results.get()
+        pending = 1
+        if error is not None:  # one attempt failed: take the other one's answer
+            tag, value, error, seconds = results.get()
+            pending = 0
+        elapsed = time.monotonic() - start
+        window.count(calls=1, fired=1, won=int(tag == "hedge"))
+        if tag == "hedge":
+            print(f"✅ {label}: hedge answered first after {elapsed:.1f}s", flush=True)
+            if pending:
+                _watch_primary(results, window, elapsed)
+    if error is not None:
+        raise error
+    if tag == "primary":
+        window.record(seconds)
+    return value
+
+
+def _watch_primary(results, window, elapsed):
+    """Once the abandoned primary finishes, record its latency and what the hedge saved."""
+    def run():
+        tag, _, error, seconds = results.get()
+        if error is None:
+            window.record(seconds)
+        window.count(saved_samples=1, saved_seconds=max(0.0, seconds - elapsed))
+    threading.Thread(target=run, name="hedge-watch", daemon=True).start()
+
+
+def report(path=None):
+    try:
+        with open(path or os.environ.get("HEDGE_STATE_FILE", DEFAULT_STATE_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    if not data:
+        print("ℹ️ No hedged calls recorded yet")
+        return
+    for name, entry in sorted(data.items()):
+        window = LatencyWindow(name, path)
+        c = entry.get("counters", {})
+        calls, fired, won = c.get("calls", 0), c.get("fired", 0), c.get("won", 0)
+        p95 = window.quantile()
+        print(f"🪝 {name}: {calls} call(s), hedged {fired} ({100 * fired / max(1, calls):.1f}%), "
+              f"hedge won {won}; p95 {f'{p95:.2f}s' if p95 is not None else 'n/a'} "
+              f"over {len(entry.get('samples', []))} sample(s)")
+        if c.get("saved_samples"):
+            print(f"   saved {c['saved_seconds']:.1f}s total, {c['saved_seconds'] / c['saved_samples']:.2f}s "
+                  f"avg over {c['saved_samples']} abandoned primary request(s) that later finished")
+
+
+def export(dest, path=None):
+    """Write each call name's latency samples (no counters) to dest, for HEDGE_SEED."""
+    try:
+        with open(path or os.environ.get("HEDGE_STATE_FILE", DEFAULT_STATE_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    seed = {name: {"samples": entry.get("samples", [])} for name, entry in data.items()
+            if len(entry.get("samples", [])) >= MIN_SAMPLES}
+    with open(dest, "w") as f:
+        json.dump(seed, f)
+    names = ", ".join(f"{name} ({len(entry['samples'])})" for name, entry in seed.items())
+    print(f"📦 Exported {names or 'nothing'} to {dest}")
+    return seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hedge statistics")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("report", help="Hedge stats per call name (default)")
+    exp = sub.add_parser("export", help="Write latency samples to ship as HEDGE_SEED")
+    exp.add_argument("dest")
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.dest)
+    else:
+        report()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
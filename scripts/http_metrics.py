@@ -0,0 +1,233 @@
+"""
+Per-request latency / status instrumentation for the CSP and broker HTTP layer.
+
+Every call made through the pooled session (csp_client.PooledAdapter, used by
+InfobloxSession, InfobloxVPNDeployer, SandboxAccountAPI, the broker scripts,
+...) and through AsyncCSPClient is recorded with its method, templated
+endpoint path (ids collapsed to {id}), status, bytes and latency. At process
+exit the histograms are written as a Prometheus textfile and a JSON summary,
+so we can see which endpoints dominate lab setup time.
+
+Usage:
+  # Automatic: any script using csp_client / csp_async exports on exit.
+
+  # Per-run request list (status + latency of every attempt), see lab_telemetry.py:
+  seen, token = start_trace(); ...; stop_trace(token)
+
+  # Rank endpoints by total time across all exported runs:
+  python3 http_metrics.py [metrics_dir]
+
+Environment Variables:
+  CSP_METRICS_DIR  - Output directory for <script>.prom (latest run, for the node_exporter
+                     textfile collector) and <script>.<UTC start>.<pid>.json (one per run)
+                     (default: ~/.cache/infoblox/metrics, "off" to disable)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import atexit
+import threading
+import contextvars
+from urllib.parse import urlparse
+
+DEFAULT_METRICS_DIR = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "metrics")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Path segments that are object ids: numbers, UUIDs, long hex, or long tokens containing a digit
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}|[0-9a-f]{16,}|(?=.*\d)[A-Za-z0-9_-]{20,})$",
+    re.IGNORECASE,
+)
+
+_metrics = None
+_metrics_lock = threading.Lock()
+_trace = contextvars.ContextVar("http_trace", default=None)
+
+
+def metrics_dir():
+    path = os.environ.get("CSP_METRICS_DIR", DEFAULT_METRICS_DIR)
+    return None if path.lower() == "off" else path
+
+
+def template_path(url):
+    """'https://csp.infoblox.com/v2/users/12345?x=1' -> '/v2/users/{id}'."""
+    path = urlparse(url).path or "/"
+    parts = ["{id}" if _ID_SEGMENT.match(p) else p for p in path.split("/")]
+    return "/".join(parts)
+
+
+class _Series:
+    __slots__ = ("count", "seconds", "request_bytes", "response_bytes", "buckets", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.max = 0.0
+
+
+class HTTPMetrics:
+    def __init__(self):
+        self.series = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status, seconds, request_bytes=0, response_bytes=0):
+        key = (urlparse(url).netloc, method.upper(), template_path(url), str(status))
+        with self._lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = _Series()
+            s.count += 1
+            s.seconds += seconds
+            s.request_bytes += request_bytes or 0
+            s.response_bytes += response_bytes or 0
+            s.max = max(s.max, seconds)
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if seconds <= le:
+                    s.buckets[i] += 1
+
+    # ---------- export ----------
+    def summary(self):
+        with self._lock:
+            rows = [{"host": host, "method": method, "endpoint": endpoint, "status": status,
+                     "count": s.count, "seconds": round(s.seconds, 4),
+                     "avg": round(s.seconds / s.count, 4), "max": round(s.max, 4),
+                     "request_bytes": s.request_bytes, "response_bytes": s.response_bytes}
+                    for (host, method, endpoint, status), s in self.series.items()]
+        rows.sort(key=lambda r: r["seconds"], reverse=True)
+        return {"script": _script_name(), "pid": os.getpid(), "started": round(self.started, 3),
+                "wall_seconds": round(time.time() - self.started, 3), "endpoints": rows}
+
+    def prometheus(self):
+        lines = [
+            "# HELP csp_http_request_duration_seconds CSP/broker HTTP request latency",
+            "# TYPE csp_http_request_duration_seconds histogram",
+        ]
+        totals = []
+        with self._lock:
+            for (host, method, endpoint, status), s in sorted(self.series.items()):
+                labels = (f'script="{_script_name()}",host="{host}",method="{method}",'
+                          f'endpoint="{endpoint}",status="{status}"')
+                for le, n in zip(LATENCY_BUCKETS, s.buckets):
+                    lines.append(f'csp_http_request_duration_seconds_bucket{{{labels},le="{le}"}} {n}')
+                lines.append(f'csp_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+                lines.append(f"csp_http_request_duration_seconds_sum{{{labels}}} {s.seconds:.6f}")
+                lines.append(f"csp_http_request_duration_seconds_count{{{labels}}} {s.count}")
+                totals.append((labels, s.request_bytes, s.response_bytes))
+        lines.append("# HELP csp_http_request_bytes_total Request body bytes sent")
+        lines.append("# TYPE csp_http_request_bytes_total counter")
+        lines += [f"csp_http_request_bytes_total{{{labels}}} {sent}" for labels, sent, _ in totals]
+        lines.append("# HELP csp_http_response_bytes_total Response body bytes received")
+        lines.append("# TYPE csp_http_response_bytes_total counter")
+        lines += [f"csp_http_response_bytes_total{{{labels}}} {got}" for labels, _, got in totals]
+        return "\n".join(lines) + "\n"
+
+    def export(self, directory=None):
+        """
+        Write <script>.prom (one per script, replaced each run, as the node_exporter
+        textfile collector expects) and <script>.<UTC start>.<pid>.json (one per
+        run, so report() sees every run). Returns the two paths.
+        """
+        directory = directory or metrics_dir()
+        if not directory or not self.series:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        name = _script_name()
+        started = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(self.started))
+        outputs = ((os.path.join(directory, f"{name}.prom"), self.prometheus()),
+                   (os.path.join(directory, f"{name}.{started}.{os.getpid()}.json"),
+                    json.dumps(self.summary(), indent=2)))
+        for path, content in outputs:
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                f.write(content)
+            os.replace(tmp, path)  # textfile collectors must never see partial files
+        return [path for path, _ in outputs]
+
+
+# ---------- per-run request trace (used by lab_telemetry.py) ----------
+def start_trace():
+    """Collect every request made in this context into a list; returns (list, token)."""
+    seen = []
+    return seen, _trace.set(seen)
+
+
+def stop_trace(token):
+    try:
+        _trace.reset(token)
+    except ValueError:
+        pass  # token from another context (e.g. stopped from an atexit hook)
+
+
+def trace_request(method, url, status, seconds):
+    seen = _trace.get()
+    if seen is not None:
+        seen.append({"method": method.upper(), "endpoint": template_path(url), "status": status,
+                     "seconds": round(seconds, 4), "at": round(time.time(), 3)})
+
+
+def _script_name():
+    name = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name) or "python"
+
+
+def _export_at_exit():
+    try:
+        paths = _metrics.export()
+        if paths:
+            print(f"📈 HTTP metrics written to {' / '.join(paths)}", flush=True)
+    except OSError as e:
+        print(f"⚠️ Could not write HTTP metrics: {e}", flush=True)
+
+
+def get_metrics():
+    """Process-wide HTTPMetrics (exported at exit), or None when CSP_METRICS_DIR=off."""
+    global _metrics
+    if metrics_dir() is None:
+        return None
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = HTTPMetrics()
+                atexit.register(_export_at_exit)
+    return _metrics
+
+
+def report(directory=None):
+    """Aggregate every exported run (<script>.<start>.<pid>.json) and rank endpoints by total time."""
+    directory = directory or metrics_dir() or DEFAULT_METRICS_DIR
+    totals = {}
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+    except OSError:
+        names = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                rows = json.load(f).get("endpoints", [])
+        except (OSError, ValueError):
+            continue
+        for r in rows:
+            t = totals.setdefault((r["method"], r["endpoint"]), {"count": 0, "seconds": 0.0, "errors": 0})
+            t["count"] += r["count"]
+            t["seconds"] += r["seconds"]
+            if not str(r["status"]).startswith(("2", "3")):
+                t["errors"] += r["count"]
+    if not totals:
+        print(f"ℹ️ No HTTP metrics found in {directory}")
+        return
+    grand = sum(t["seconds"] for t in totals.values()) or 1.0
+    print(f"📊 Endpoints by total time ({len(names)} run(s) in {directory}):")
+    for (method, endpoint), t in sorted(totals.items(), key=lambda kv: kv[1]["seconds"], reverse=True):
+        print(f"   {t['seconds']:8.2f}s {100 * t['seconds'] / grand:5.1f}%  n={t['count']:<5} "
+              f"err={t['errors']:<4} avg={t['seconds'] / t['count']:.3f}s  {method} {endpoint}")
+
+
+if __name__ == "__main__":
+    report(sys.argv[1] if len(sys.argv) > 1 else None)
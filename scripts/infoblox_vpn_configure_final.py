@@ -1,10 +1,20 @@
 import os
 import re
 import yaml
-import time
 import uuid
 import requests
 from copy import deepcopy
+from csp_client import CSPClient, get_session
+from retry_policy import get_policy, RetryError
+from lookup_cache import get_cache
+
+CREDENTIAL_ENDPOINTS = (
+    "/api/universalinfra/v1/credentials",
+    "/api/universalinfra/v1/credential",
+    "/api/universalinfra/v1/universal_services?include=credentials",
+    "/api/atcinfra/v1/credentials",
+)
+ENDPOINT_ABSENT = (404, 405, 501)  # the tenant doesn't serve this listing; anything else >= 400 is transient
 
 
 def load_config_with_env(file_path):
@@ -21,65 +31,55 @@ def load_config_with_env(file_path):
 
 def post_with_conflict_retry(url, headers, json_payload,
                              max_attempts=12, base_sleep=5, max_sleep=60):
-    attempt = 1
-    while True:
-        r = requests.post(url, headers=headers, json=json_payload)
-        if r.status_code not in (409, 429):
-            return r
-        retry_after = r.headers.get("Retry-After")
-        if retry_after:
-            try:
-                sleep_s = int(retry_after)
-            except ValueError:
-                sleep_s = base_sleep
-        else:
-            sleep_s = min(max_sleep, base_sleep * (2 ** (attempt - 1)))
-        print(f"⏳ Op in progress (HTTP {r.status_code}). Retry {attempt}/{max_attempts} in {sleep_s}s...")
-        time.sleep(sleep_s)
-        attempt += 1
-        if attempt > max_attempts:
-            return r
+    """POST, retrying 409 (operation in progress) / 429 under the "conflict" policy."""
+    policy = get_policy("conflict", max_attempts=max_attempts, base=base_sleep, cap=max_sleep)
+    try:
+        return policy.call(lambda: get_session().post(url, headers=headers, json=json_payload),
+                           label="Op in progress")
+    except RetryError as e:
+        if isinstance(e.last, requests.Response):
+            return e.last
+        raise
 
 
 class InfobloxVPNDeployer:
     def __init__(self, config_file):
         self.config = load_config_with_env(config_file)
-        self.base_url = self.config["base_url"].rstrip("/")
+        self.base_url = os.environ.get("CSP_BASE_URL", self.config["base_url"]).rstrip("/")
         self.email = self.config["email"]
         self.password = self.config["password"]
         self.sandbox_id_file = self.config["sandbox_id_file"]
+        self.client = CSPClient(self.base_url, self.email, self.password)
+        self.session = self.client.session
         self.jwt = None
         self.headers = {"Content-Type": "application/json"}
+        self.lookups = get_cache()
 
     # ---------- Session ----------
     def authenticate(self):
-        url = f"{self.base_url}/v2/session/users/sign_in"
-        payload = {"email": self.email, "password": self.password}
-        r = requests.post(url, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.login()
         self.headers["Authorization"] = f"Bearer {self.jwt}"
         print("✅ Authenticated.")
 
     def switch_account(self):
         with open(self.sandbox_id_file, "r") as f:
             sandbox_id = f.read().strip()
-        url = f"{self.base_url}/v2/session/account_switch"
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        r = requests.post(url, headers=self.headers, json=payload)
-        r.raise_for_status()
-        self.jwt = r.json()["jwt"]
+        self.jwt = self.client.switch_account(sandbox_id)
         self.headers["Authorization"] = f"Bearer {self.jwt}"
         print(f"🔁 Switched to sandbox account {sandbox_id}")
-        time.sleep(3)
 
     # ---------- Lookups ----------
     def get_security_policy_id(self, policy_name=None):
         url = f"{self.base_url}/api/atcfw/v1/security_policies"
         params = {"_fields": "id,name,is_default"}
-        r = requests.get(url, headers=self.headers, params=params)
-        r.raise_for_status()
-        items = r.json().get("results", [])
+        if self.lookups:
+            data = self.lookups.get_json(self.session, url, self.client.account_id, headers=self.headers,
+                                         params=params, key="security_policies")
+        else:
+            r = self.session.get(url, headers=self.headers, params=params)
+            r.raise_for_status()
+            data = r.json()
+        items = data.get("results", [])
         if policy_name:
             for it in items:
                 if it.get("name") == policy_name:
@@ -92,7 +92,7 @@ class InfobloxVPNDeployer:
     # ---- Robust credential discovery ----
     def try_get(self, path, params=None):
         url = f"{self.base_url}{path}"
-        r = requests.get(url, headers=self.headers, params=params or {})
+        r = self.session.get(url, headers=self.headers, params=params or {})
         if r.status_code >= 400:
             return None
         return r.json()
@@ -100,34 +100,53 @@ class InfobloxVPNDeployer:
     def list_credentials(self):
         """
         Return {name: {id, ...}} if discoverable, else None.
+        The listing itself changes whenever a credential is created or deleted
+        (here or by another script), so only the probe outcome is cached per
+        account: which endpoint serves credentials, or "" when every endpoint
+        answered 404/405/501. A transient 401/429/5xx leaves the cache alone.
         """
-        candidates = [
-            ("/api/universalinfra/v1/credentials", None),
-            ("/api/universalinfra/v1/credential", None),
-            ("/api/universalinfra/v1/universal_services?include=credentials", None),
-            ("/api/atcinfra/v1/credentials", None),
-        ]
-        for path, params in candidates:
-            data = self.try_get(path, params)
-            if not data:
+        account = self.client.account_id
+        endpoint = self.lookups.get(account, "credentials_endpoint", base_url=self.base_url) if self.lookups else None
+        if endpoint == "":
+            return None  # no credential listing in this tenant
+        paths = [endpoint] if endpoint else CREDENTIAL_ENDPOINTS
+        transient = False
+        for path in paths:
+            r = self.session.get(f"{self.base_url}{path}", headers=self.headers)
+            if r.status_code in ENDPOINT_ABSENT:
+                continue
+            if r.status_code >= 400:
+                transient = True
                 continue
-            results = []
-            if isinstance(data, dict):
-                if isinstance(data.get("results"), list):
-                    results = data["results"]
-                elif isinstance(data.get("items"), list):
-                    results = data["items"]
-                elif "name" in data or "id" in data:
-                    results = [data]
-            out = {}
-            for c in results:
-                nm = c.get("name"); cid = c.get("id")
-                if nm and cid:
-                    out[nm] = c
+            out = self._credentials_by_name(r.json() if r.text else None)
             if out:
+                if self.lookups and path != endpoint:
+                    self.lookups.put(account, "credentials_endpoint", path, base_url=self.base_url)
                 return out
+        if endpoint:
+            # The cached endpoint came back empty or failing: probe them all next time
+            self.lookups.invalidate(account, "credentials_endpoint", base_url=self.base_url)
+        elif self.lookups and not transient:
+            self.lookups.put(account, "credentials_endpoint", "", base_url=self.base_url)
         return None  # listing unavailable
 
+    @staticmethod
+    def _credentials_by_name(data):
+        results = []
+        if isinstance(data, dict):
+            if isinstance(data.get("results"), list):
+                results = data["results"]
+            elif isinstance(data.get("items"), list):
+                results = data["items"]
+            elif "name" in data or "id" in data:
+                results = [data]
+        out = {}
+        for c in results:
+            nm = c.get("name"); cid = c.get("id")
+            if nm and cid:
+                out[nm] = c
+        return out
+
     # ---------- Payload helpers ----------
     @staticmethod
     def _iter_objs(section: dict):
@@ -293,13 +312,13 @@ class InfobloxVPNDeployer:
             create_payload = self.uniquify_credential_names(create_payload)
 
         # --- CREATE ---
-        r = requests.post(url_cfg, headers=self.headers, json=create_payload)
+        r = self.session.post(url_cfg, headers=self.headers, json=create_payload)
 
         # If backend still says duplicate-name, uniquify and retry once (keeps creates)
         if r.status_code == 400 and "duplicate key name" in r.text.lower():
             print("⚠️  Duplicate-name on CREATE. Retrying once with uniquified credential names...")
             retry_payload = self.uniquify_credential_names(create_payload)
-            r = requests.post(url_cfg, headers=self.headers, json=retry_payload)
+            r = self.session.post(url_cfg, headers=self.headers, json=retry_payload)
 
         try:
             r.raise_for_status()
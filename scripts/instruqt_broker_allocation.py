@@ -11,6 +11,12 @@ Usage in Instruqt:
    - BROKER_API_TOKEN (required)
    - INSTRUQT_PARTICIPANT_ID (provided by Instruqt)
    - INSTRUQT_TRACK_SLUG (provided by Instruqt - lab identifier)
+   - ALLOCATION_WAIT_TIMEOUT (optional - seconds to wait for a free sandbox
+     when the pool is exhausted; default 0 fails fast)
+   - BROKER_HEDGE (optional - 1 sends a hedge request when /allocate is
+     slower than its observed p95)
+   - PREALLOCATED_BUNDLE_DIR (optional - bundles from bulk_allocate.py; this
+     participant's pre-allocated sandbox is used instead of /allocate)
 
 2. Run this script in your Instruqt track setup
 3. Script will allocate a sandbox and save IDs to files
@@ -19,8 +25,10 @@ Usage in Instruqt:
 import os
 import sys
 import time
-import random
-import requests
+from broker_client import BrokerClient, allocation_wait_timeout, load_preallocated_bundle
+from retry_policy import RetryError
+from lab_telemetry import start_run
+from admission import admit
 
 # ----------------------------------
 # Configuration
@@ -40,13 +48,26 @@ INSTRUQT_TRACK_ID = os.environ.get("INSTRUQT_TRACK_SLUG", "unknown-lab")
 # Default to "lab" if not specified
 SANDBOX_NAME_PREFIX = os.environ.get("SANDBOX_NAME_PREFIX", "lab")
 
+# Optional: keep waiting (capped backoff) for a sandbox to free up when the pool
+# is exhausted, instead of failing the track on the first 409
+ALLOCATION_WAIT_TIMEOUT = allocation_wait_timeout()
+
+# One JSONL telemetry record per run (attempts, latencies, outcome), see lab_telemetry.py
+run = start_run("allocate", INSTRUQT_SANDBOX_ID, INSTRUQT_TRACK_ID, attempt_endpoint="/allocate")
+
 # Output files
 SANDBOX_ID_FILE = "sandbox_id.txt"
 EXTERNAL_ID_FILE = "external_id.txt"
 SANDBOX_NAME_FILE = "sandbox_name.txt"
 
-# Startup jitter (avoid collision when multiple students start simultaneously)
-time.sleep(random.uniform(1, 5))
+# Pre-allocated by bulk_allocate.py? Then there is nothing to ask the broker for.
+allocation_response = load_preallocated_bundle(INSTRUQT_SANDBOX_ID)
+
+# Admission slot instead of a flat random jitter (not needed for a pre-allocated
+# sandbox): immediate when uncontended, spread by participant hash / host slot
+# when many students start at once
+if not allocation_response:
+    admit("broker", INSTRUQT_SANDBOX_ID)
 
 # ----------------------------------
 # Validation
@@ -67,77 +88,49 @@ if SANDBOX_NAME_PREFIX:
 # ----------------------------------
 # Allocate Sandbox from Broker
 # ----------------------------------
-allocate_url = f"{BROKER_API_URL}/allocate"
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "Content-Type": "application/json",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-    "X-Instruqt-Track-ID": INSTRUQT_TRACK_ID,
-}
-
-# Add optional name prefix filter (server-side filtering)
-if SANDBOX_NAME_PREFIX:
-    headers["X-Sandbox-Name-Prefix"] = SANDBOX_NAME_PREFIX
-
-max_retries = 5
-retryable_statuses = {500, 502, 503, 504}
-
-allocation_response = None
-for attempt in range(max_retries):
-    try:
-        print(f"🔄 Allocation attempt {attempt + 1}/{max_retries}...", flush=True)
-
-        resp = requests.post(
-            allocate_url,
-            headers=headers,
-            timeout=(5, 30),  # connect=5s, read=30s
-        )
-
-        # Success (201 = new allocation, 200 = idempotent retry)
-        if resp.status_code in (200, 201):
-            allocation_response = resp.json()
-            status_emoji = "✅" if resp.status_code == 201 else "🔄"
-            print(f"{status_emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
-            break
-
-        # Pool exhausted - no sandboxes available
-        elif resp.status_code == 409:
-            print("❌ Pool exhausted: No sandboxes available", flush=True)
-            print("   Contact your instructor to provision more sandboxes", flush=True)
-            sys.exit(1)
-
-        # Rate limited by WAF
-        elif resp.status_code == 403:
-            print("⚠️ Rate limited by WAF, waiting before retry...", flush=True)
-            time.sleep(10)  # Wait longer for WAF cooldown
-            continue
-
-        # Retryable server errors
-        elif resp.status_code in retryable_statuses:
-            print(f"⚠️ Server error {resp.status_code}, retrying...", flush=True)
-            sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-            time.sleep(sleep_time)
-            continue
-
-        # Non-retryable error
-        else:
-            print(f"❌ Allocation failed with HTTP {resp.status_code}", flush=True)
-            print(f"   Response: {resp.text}", flush=True)
-            sys.exit(1)
-
-    except requests.exceptions.Timeout:
-        print(f"⚠️ Request timeout, retrying...", flush=True)
-        sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-        time.sleep(sleep_time)
-
-    except Exception as e:
-        print(f"⚠️ Unexpected error: {e}", flush=True)
-        sleep_time = min(2 ** attempt + random.uniform(0, 1), 30)
-        time.sleep(sleep_time)
+# Name prefix filter is applied server-side (X-Sandbox-Name-Prefix)
+broker = BrokerClient(
+    base_url=BROKER_API_URL,
+    token=BROKER_API_TOKEN,
+    participant_id=INSTRUQT_SANDBOX_ID,
+    track_id=INSTRUQT_TRACK_ID,
+    name_prefix=SANDBOX_NAME_PREFIX,
+)
 
+if allocation_response:
+    print(f"⚡ Using pre-allocated sandbox from {os.environ.get('PREALLOCATED_BUNDLE_DIR')}", flush=True)
+    run.update(preallocated=True)
 else:
-    print("❌ Sandbox allocation failed after all retries", flush=True)
-    sys.exit(1)
+    # Retries (WAF 403, 5xx, timeouts) follow the "broker_allocate" policy in retry_policy.py;
+    # the shared rate limiter holds calls through a WAF cooldown.
+    print("🔄 Requesting sandbox allocation...", flush=True)
+    try:
+        resp = broker.allocate(wait_timeout=ALLOCATION_WAIT_TIMEOUT)
+    except RetryError as e:
+        run.fail("retries_exhausted")
+        print(f"{e}", flush=True)
+        print("❌ Sandbox allocation failed after all retries", flush=True)
+        sys.exit(1)
+
+    # Pool exhausted - no sandboxes available
+    if resp.status_code == 409:
+        waited = f" after waiting {ALLOCATION_WAIT_TIMEOUT:.0f}s" if ALLOCATION_WAIT_TIMEOUT else ""
+        run.fail("pool_exhausted", waited_seconds=ALLOCATION_WAIT_TIMEOUT)
+        print(f"❌ Pool exhausted: No sandboxes available{waited}", flush=True)
+        print("   Contact your instructor to provision more sandboxes", flush=True)
+        sys.exit(1)
+
+    # Non-retryable error
+    if resp.status_code not in (200, 201):
+        run.fail(f"http_{resp.status_code}")
+        print(f"❌ Allocation failed with HTTP {resp.status_code}", flush=True)
+        print(f"   Response: {resp.text}", flush=True)
+        sys.exit(1)
+
+    # Success (201 = new allocation, 200 = idempotent retry)
+    allocation_response = resp.json()
+    status_emoji = "✅" if resp.status_code == 201 else "🔄"
+    print(f"{status_emoji} Sandbox allocated (HTTP {resp.status_code})", flush=True)
 
 # ----------------------------------
 # Extract IDs from Response
@@ -200,6 +193,8 @@ print(f"\n   Or for Instruqt (persists across steps):", flush=True)
 print(f"   set-var STUDENT_TENANT {sandbox_name}", flush=True)
 print(f"   set-var CSP_ACCOUNT_ID {external_id}", flush=True)
 
+run.succeed(sandbox_id=sandbox_id, sandbox_name=sandbox_name, expires_at=expires_at)
+
 # ----------------------------------
 # Summary
 # ----------------------------------
@@ -16,7 +16,8 @@ Usage in Instruqt:
 
 import os
 import sys
-import requests
+from broker_client import BrokerClient
+from lab_telemetry import start_run
 
 # ----------------------------------
 # Configuration
@@ -59,26 +60,26 @@ print(f"🧹 Marking sandbox {sandbox_id} for deletion...", flush=True)
 # ----------------------------------
 # Mark Sandbox for Deletion
 # ----------------------------------
-delete_url = f"{BROKER_API_URL}/sandboxes/{sandbox_id}/mark-for-deletion"
-headers = {
-    "Authorization": f"Bearer {BROKER_API_TOKEN}",
-    "X-Instruqt-Sandbox-ID": INSTRUQT_SANDBOX_ID,
-}
+run = start_run("deallocate", INSTRUQT_SANDBOX_ID, attempt_endpoint="/mark-for-deletion",
+                sandbox_id=sandbox_id)
+broker = BrokerClient(
+    base_url=BROKER_API_URL,
+    token=BROKER_API_TOKEN,
+    participant_id=INSTRUQT_SANDBOX_ID,
+)
 
 try:
-    resp = requests.post(
-        delete_url,
-        headers=headers,
-        timeout=(5, 15),
-    )
+    resp = broker.mark_for_deletion(sandbox_id)
 
     if resp.status_code == 200:
         result = resp.json()
+        run.succeed()
         print(f"✅ Sandbox marked for deletion", flush=True)
         print(f"   Status: {result.get('status')}", flush=True)
         print(f"   Cleanup: Background job will delete from CSP within ~5 minutes", flush=True)
 
     elif resp.status_code == 404:
+        run.succeed(reason="not_found")
         print(f"⚠️ Sandbox {sandbox_id} not found (may have already been cleaned up)", flush=True)
 
     elif resp.status_code == 403:
@@ -0,0 +1,107 @@
+"""
+Structured timing telemetry for allocation, deallocation and user provisioning.
+
+Each run appends one JSON line: participant, track slug, outcome, the number
+of attempts against the run's main endpoint, every HTTP request made with its
+status and latency (traced through csp_client / csp_async, see
+http_metrics.start_trace), total wall time and, for allocations, the sandbox
+expires_at. telemetry_report.py aggregates many of these files into
+percentile tables per track and per hour.
+
+Usage:
+  # Module-level script: written at exit, outcome "failed" unless succeed() ran
+  run = start_run("allocate", participant_id, track_slug, attempt_endpoint="/allocate")
+  ...
+  run.succeed(expires_at=allocation["expires_at"])
+
+  # Per item in a bulk tool:
+  with TelemetryRun("deallocate", participant_id, attempt_endpoint="/mark-for-deletion") as run:
+      ...
+
+Environment Variables:
+  LAB_TELEMETRY_FILE - JSONL output (default: ~/.cache/infoblox/lab_telemetry.jsonl, "off" to disable)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import atexit
+from http_metrics import start_trace, stop_trace
+
+DEFAULT_TELEMETRY_FILE = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "lab_telemetry.jsonl")
+
+
+def telemetry_file():
+    path = os.environ.get("LAB_TELEMETRY_FILE", DEFAULT_TELEMETRY_FILE)
+    return None if path.lower() == "off" else path
+
+
+class TelemetryRun:
+    def __init__(self, kind, participant_id=None, track_slug=None, attempt_endpoint=None, **fields):
+        self.record = {
+            "kind": kind,
+            "participant_id": participant_id,
+            "track_slug": track_slug or os.environ.get("INSTRUQT_TRACK_SLUG"),
+            "script": os.path.basename(sys.argv[0] or "python"),
+            "host": socket.gethostname(),
+            "started": round(time.time(), 3),
+            "outcome": "failed",
+            **fields,
+        }
+        self.attempt_endpoint = attempt_endpoint
+        self.start = time.monotonic()
+        self.requests, self._token = start_trace()
+        self.closed = False
+
+    def update(self, **fields):
+        self.record.update(fields)
+
+    def succeed(self, **fields):
+        self.record.update(fields, outcome="ok")
+
+    def fail(self, reason, **fields):
+        self.record.update(fields, outcome="failed", reason=reason)
+
+    def close(self):
+        """Append the record once (later calls are no-ops)."""
+        if self.closed:
+            return
+        self.closed = True
+        stop_trace(self._token)
+        attempts = [r for r in self.requests
+                    if not self.attempt_endpoint or r["endpoint"].endswith(self.attempt_endpoint)]
+        self.record.update(attempts=len(attempts), wall_seconds=round(time.monotonic() - self.start, 3),
+                           requests=list(self.requests))
+        path = telemetry_file()
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            line = (json.dumps(self.record, separators=(",", ":")) + "\n").encode()
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, line)  # single O_APPEND write: parallel scripts never interleave lines
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"⚠️ Could not write telemetry: {e}", flush=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is SystemExit and exc.code in (0, None):
+            self.record["outcome"] = "ok"
+        elif exc_type is not None and "reason" not in self.record:
+            self.record["reason"] = f"{exc_type.__name__}: {exc}"
+        self.close()
+        return False
+
+
+def start_run(kind, participant_id=None, track_slug=None, attempt_endpoint=None, **fields):
+    """TelemetryRun for a module-level script, written when the process exits."""
+    run = TelemetryRun(kind, participant_id, track_slug, attempt_endpoint, **fields)
+    atexit.register(run.close)
+    return run
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-account on-disk cache for slow-changing CSP lookups.
+
+Every lifecycle script in a sandbox used to re-fetch the same objects: the
+"user" / "act_admin" group ids, the default security policy, which of four
+credential endpoints the tenant serves. These are cached per CSP base URL and account id
+with a TTL (as in token_cache.py, so a mock_csp_server run never serves its
+ids to a production account). Listings that other scripts change (credentials, users) are not
+cached; only facts about the tenant are. An expired entry that came with an ETag is revalidated with
+If-None-Match, so an unchanged object costs a 304 instead of a full listing.
+Scripts that change one of these objects invalidate its entry, and the whole
+account can be dropped explicitly (e.g. after the sandbox is recycled).
+
+Usage:
+  from lookup_cache import get_cache
+
+  cache = get_cache()                       # None when disabled
+  data = cache.get_json(session, url, account_id, headers=headers,   # base URL taken from url
+                        params={"_fields": "id,name"}, key="security_policies")
+  groups = cache.cached(account_id, "groups", load_groups, base_url=base_url)
+  cache.invalidate(account_id, "groups", base_url=base_url)
+
+  python3 lookup_cache.py show
+  python3 lookup_cache.py invalidate <account id> [--base-url URL]     # or --all
+
+Environment Variables:
+  CSP_LOOKUP_CACHE          - Cache file (default: ~/.cache/infoblox/csp_lookups.json)
+  CSP_LOOKUP_TTL            - Seconds an entry is used without revalidation (default: 3600)
+  CSP_LOOKUP_CACHE_DISABLE  - Set to 1 to always fetch
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import argparse
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from token_cache import normalize_base_url
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "csp_lookups.json")
+DEFAULT_TTL = 3600
+_MISS = object()
+
+
+def cache_disabled():
+    return os.environ.get("CSP_LOOKUP_CACHE_DISABLE", "0") == "1"
+
+
+class LookupCache:
+    """
+    JSON file of {"<base url>|<account id>|<key>": {"value": ..., "etag": ..., "expires": ...}}.
+    Same locking as TokenCache: a .lock file flock around read-modify-write,
+    atomic 0600 replace of the data file.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = path or os.environ.get("CSP_LOOKUP_CACHE", DEFAULT_CACHE_FILE)
+        self.ttl = float(ttl if ttl is not None else os.environ.get("CSP_LOOKUP_TTL", DEFAULT_TTL))
+
+    @staticmethod
+    def _key(account_id, key, base_url=None):
+        return f"{normalize_base_url(base_url)}|{account_id or '-'}|{key}"
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _store(self, data):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    # ---------- entries ----------
+    def entry(self, account_id, key, base_url=None):
+        """The raw entry (fresh or expired), or None."""
+        with self._locked():
+            return self._load().get(self._key(account_id, key, base_url))
+
+    def get(self, account_id, key, default=None, base_url=None):
+        """The cached value while within its TTL, else default."""
+        entry = self.entry(account_id, key, base_url)
+        if not entry or entry.get("expires", 0) <= time.time():
+            return default
+        return entry.get("value")
+
+    def put(self, account_id, key, value, etag=None, ttl=None, base_url=None):
+        now = time.time()
+        # Expired entries with an ETag stay around a while for revalidation
+        keep = now - 24 * 3600
+        with self._locked():
+            data = {k: v for k, v in self._load().items() if v.get("expires", 0) > keep}
+            data[self._key(account_id, key, base_url)] = {
+                "value": value, "etag": etag, "stored": int(now),
+                "expires": now + (self.ttl if ttl is None else ttl),
+            }
+            self._store(data)
+
+    def invalidate(self, account_id=None, key=None, base_url=None):
+        """
+        Drop the entries matching every argument given: one entry, every entry of
+        an account (key=None), or everything (all None). base_url=None matches
+        any CSP.
+        """
+        base = normalize_base_url(base_url) if base_url else None
+        with self._locked():
+            data = self._load()
+            dropped = []
+            for k in data:
+                k_base, k_account, k_key = (k.split("|", 2) + ["", ""])[:3]
+                if ((base is None or k_base == base) and (account_id is None or k_account == account_id)
+                        and (key is None or k_key == key)):
+                    dropped.append(k)
+            for k in dropped:
+                del data[k]
+            if dropped:
+                self._store(data)
+        return len(dropped)
+
+    # ---------- lookups ----------
+    def cached(self, account_id, key, loader, ttl=None, base_url=None):
+        """loader() once per TTL per account; None results are cached too. A loader that raises caches nothing."""
+        value = self.get(account_id, key, _MISS, base_url=base_url)
+        if value is _MISS:
+            value = loader()
+            self.put(account_id, key, value, ttl=ttl, base_url=base_url)
+        return value
+
+    def get_json(self, session, url, account_id, headers=None, params=None, key=None, ttl=None,
+                 base_url=None):
+        """
+        GET url as JSON through the cache. Within the TTL no request is made;
+        after it, a stored ETag is sent as If-None-Match and a 304 renews the entry.
+        The entry is keyed by base_url (default: url's scheme://host).
+        Raises requests.HTTPError like response.raise_for_status().
+        """
+        key = key or url.rsplit("/", 1)[-1]
+        if base_url is None:
+            parsed = urlparse(url)
+            base_url = f"{parsed.scheme}://{parsed.netloc}"
+        entry = self.entry(account_id, key, base_url)
+        if entry and entry.get("expires", 0) > time.time():
+            return entry["value"]
+
+        headers = dict(headers or {})
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        r = session.get(url, headers=headers, params=params or {})
+        if r.status_code == 304 and entry:
+            self.put(account_id, key, entry["value"], etag=entry["etag"], ttl=ttl, base_url=base_url)
+            return entry["value"]
+        r.raise_for_status()
+        value = r.json()
+        self.put(account_id, key, value, etag=r.headers.get("ETag"), ttl=ttl, base_url=base_url)
+        return value
+
+
+def get_cache():
+    """The shared LookupCache, or None when CSP_LOOKUP_CACHE_DISABLE=1."""
+    return None if cache_disabled() else LookupCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the CSP lookup cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("show", help="List cached entries")
+    inv = sub.add_parser("invalidate", help="Drop cached entries")
+    inv.add_argument("account_id", nargs="?")
+    inv.add_argument("--key", help="Only this lookup (e.g. groups, security_policies, credentials_endpoint)")
+    inv.add_argument("--base-url", help="Only entries for this CSP (default: any)")
+    inv.add_argument("--all", action="store_true")
+    args = parser.parse_args()
+
+    cache = LookupCache()
+    if args.command == "show":
+        with cache._locked():
+            data = cache._load()
+        now = time.time()
+        for k, entry in sorted(data.items()):
+            state = f"{entry['expires'] - now:.0f}s left" if entry.get("expires", 0) > now else "expired"
+            print(f"   {k:<60} {state}{'  etag' if entry.get('etag') else ''}", flush=True)
+        print(f"📦 {len(data)} entr{'y' if len(data) == 1 else 'ies'} in {cache.path}", flush=True)
+        return
+    if not args.account_id and not args.all:
+        parser.error("give an account id or --all")
+    n = cache.invalidate(None if args.all else args.account_id, args.key, base_url=args.base_url)
+    print(f"🗑️ Dropped {n} cached lookup(s)", flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
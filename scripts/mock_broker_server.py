@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Offline Sandbox Broker stand-in for benchmarking and load-testing allocation.
+
+Serves POST /v1/allocate and POST /v1/sandboxes/{id}/mark-for-deletion from
+an in-memory, finite pool of pre-created sandboxes with the real broker's
+semantics:
+  - allocation is idempotent per X-Instruqt-Sandbox-ID (201 first, 200 on repeat)
+  - X-Sandbox-Name-Prefix only hands out sandboxes whose name has that prefix
+  - 409 once no matching sandbox is free
+  - WAF-style 403 throttling, random (--waf-rate) and/or rate based (--waf-rps)
+  - deleted sandboxes optionally come back into the pool (--recycle-delay)
+
+Usage:
+  python3 mock_broker_server.py --port 8081 --pool-size 50
+  python3 mock_broker_server.py --pool-size 200 --prefixes lab,lab-adventure --waf-rps 20
+  export BROKER_API_URL=http://127.0.0.1:8081/v1 BROKER_API_TOKEN=mock
+
+  curl http://127.0.0.1:8081/v1/_mock/stats      # pool state and status counts
+
+Options:
+  --pool-size N      Sandboxes available for allocation (default: 100)
+  --prefixes LIST    Name prefixes assigned round-robin to the pool (default: lab)
+  --latency S        Base latency per request (default: 0.05)
+  --jitter S         Uniform extra latency (default: 0.05)
+  --waf-rate F       Fraction of requests answered with a WAF 403 (default: 0)
+  --waf-rps R        Answer WAF 403 above R requests/s across all clients (default: off)
+  --waf-burst N      Burst allowance for --waf-rps (default: 2 x R)
+  --slow-rate F      Fraction of requests that hit a "slow instance" (default: 0)
+  --slow-latency S   Extra latency of a slow-instance request (default: 10)
+  --recycle-delay S  Seconds until a deleted sandbox is free again (default: never)
+  --ttl S            Allocation lifetime reported as expires_at (default: 14400)
+"""
+
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class MockBroker:
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        prefixes = [p.strip() for p in args.prefixes.split(",") if p.strip()] or ["lab"]
+        self.free = [self._sandbox(i, prefixes[i % len(prefixes)]) for i in range(args.pool_size)]
+        self.allocations = {}  # participant id -> sandbox
+        self.deleted = {}      # sandbox id -> (sandbox, time it is free again)
+        self.stats = Counter()
+        self.peak_allocated = 0
+        self.waf_tokens = float(args.waf_burst or 2 * args.waf_rps)
+        self.waf_ts = time.monotonic()
+
+    @staticmethod
+    def _sandbox(i, prefix="lab"):
+        return {"sandbox_id": str(2000000 + i), "name": f"{prefix}-mock-{i:04d}",
+                "external_id": f"identity/accounts/{uuid.uuid4()}",
+                "sfdc_account_id": f"001MOCK{i:011d}"}
+
+    def waf_blocked(self):
+        """Token bucket over all clients, like a WAF rate rule keyed on the lab NAT IP."""
+        if not self.args.waf_rps:
+            return False
+        burst = self.args.waf_burst or 2 * self.args.waf_rps
+        with self.lock:
+            now = time.monotonic()
+            self.waf_tokens = min(burst, self.waf_tokens + (now - self.waf_ts) * self.args.waf_rps)
+            self.waf_ts = now
+            if self.waf_tokens >= 1:
+                self.waf_tokens -= 1
+                return False
+            return True
+
+    def _recycle(self, now):
+        for sandbox_id, (sandbox, ready_at) in list(self.deleted.items()):
+            if ready_at <= now:
+                del self.deleted[sandbox_id]
+                self.free.append({**sandbox, "external_id": f"identity/accounts/{uuid.uuid4()}"})
+                self.stats["recycled"] += 1
+
+    def allocate(self, participant, prefix=None):
+        with self.lock:
+            if participant in self.allocations:
+                return 200, self.allocations[participant]
+            self._recycle(time.time())
+            index = next((i for i, s in enumerate(self.free)
+                          if not prefix or s["name"].startswith(prefix)), None)
+            if index is None:
+                return 409, {"error": "pool exhausted", "prefix": prefix}
+            now = int(time.time())
+            sandbox = {**self.free.pop(index), "allocated_at": now, "expires_at": now + self.args.ttl}
+            self.allocations[participant] = sandbox
+            self.peak_allocated = max(self.peak_allocated, len(self.allocations))
+            return 201, sandbox
+
+    def mark_for_deletion(self, sandbox_id):
+        with self.lock:
+            for participant, sandbox in list(self.allocations.items()):
+                if sandbox["sandbox_id"] == sandbox_id:
+                    del self.allocations[participant]
+                    delay = self.args.recycle_delay
+                    clean = {k: v for k, v in sandbox.items() if k not in ("allocated_at", "expires_at")}
+                    self.deleted[sandbox_id] = (clean, time.time() + delay if delay >= 0 else float("inf"))
+                    return 200, {"sandbox_id": sandbox_id, "status": "pending_deletion"}
+            if sandbox_id in self.deleted:
+                return 200, {"sandbox_id": sandbox_id, "status": "pending_deletion"}
+            return 404, {"error": "sandbox not found"}
+
+    def snapshot(self):
+        with self.lock:
+            return {"free": len(self.free), "allocated": len(self.allocations),
+                    "pending_deletion": len(self.deleted), "peak_allocated": self.peak_allocated,
+                    "responses": dict(self.stats)}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    broker = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body, count=True):
+        data = json.dumps(body).encode()
+        if count:
+            with self.broker.lock:
+                self.broker.stats[str(status)] += 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.split("?")[0].rstrip("/").endswith("/_mock/stats"):
+            return self._reply(200, self.broker.snapshot(), count=False)
+        return self._reply(404, {"error": f"no route for GET {self.path}"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        args = self.broker.args
+        delay = args.latency + random.uniform(0, args.jitter)
+        if args.slow_rate and random.random() < args.slow_rate:
+            delay += args.slow_latency
+        time.sleep(delay)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._reply(401, {"error": "missing token"})
+        if (args.waf_rate and random.random() < args.waf_rate) or self.broker.waf_blocked():
+            return self._reply(403, {"error": "request blocked by WAF"})
+
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/allocate"):
+            participant = self.headers.get("X-Instruqt-Sandbox-ID")
+            if not participant:
+                return self._reply(400, {"error": "X-Instruqt-Sandbox-ID required"})
+            return self._reply(*self.broker.allocate(participant, self.headers.get("X-Sandbox-Name-Prefix")))
+        if path.endswith("/mark-for-deletion"):
+            return self._reply(*self.broker.mark_for_deletion(path.split("/")[-2]))
+        return self._reply(404, {"error": f"no route for POST {path}"})
+
+
+class BrokerHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # allocation storms open hundreds of connections at once
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Sandbox Broker stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--pool-size", type=int, default=100)
+    parser.add_argument("--prefixes", default="lab")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--waf-rate", type=float, default=0.0)
+    parser.add_argument("--waf-rps", type=float, default=0.0)
+    parser.add_argument("--waf-burst", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=10.0)
+    parser.add_argument("--recycle-delay", type=float, default=-1)
+    parser.add_argument("--ttl", type=int, default=14400)
+    return parser.parse_args(argv)
+
+
+def serve(args):
+    Handler.broker = MockBroker(args)
+    return BrokerHTTPServer((args.host, args.port), Handler)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(args)
+    print(f"🧪 Mock broker listening on http://{args.host}:{args.port}/v1 "
+          f"(pool={args.pool_size}, prefixes={args.prefixes}, latency={args.latency}s±{args.jitter})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock broker stopped", flush=True)
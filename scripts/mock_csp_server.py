@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Offline CSP API stand-in for benchmarking / regression-testing the lifecycle scripts.
+
+Implements, in memory, the endpoints the scripts in this repo call:
+  /v2/session/users/sign_in, /v2/session/account_switch, /v2/current_account,
+  /v2/groups, /v2/users (+ /password), /api/iam/v1/cloud_credential,
+  /api/iam/v2/keys, /api/ddi/v1/dns/view, /api/ddi/v1/dns/zone_child,
+  /api/cloud_discovery/v2/providers, /api/universalinfra/v1/{endpoints,
+  accesslocations,universalservices,universal_services,credentials},
+  /api/universalinfra/v1/consolidated/configure, /api/atcfw/v1/security_policies
+  and /v2/sandbox/accounts.
+
+Realism knobs:
+  - latency:   fixed + jittered per request, with per-path overrides
+  - errors:    a random fraction of requests answers 403/409/429/503
+               (429/503 carry Retry-After)
+  - consistency: a freshly switched JWT is rejected (401) for --switch-delay
+               seconds; new objects (and a new account's default DNS view /
+               the cloud credential derived from an AWS key) only show up in
+               list responses after --consistency-delay seconds
+  - queries:   collection listings honour _filter (==, !=, ~, !~, and, or,
+               not), _fields, _limit / _offset (and total_size)
+  - caching:   collection listings carry an ETag and answer a matching
+               If-None-Match with 304
+
+Usage:
+  python3 mock_csp_server.py --port 8080 --latency 0.05 --error-rate 0.02
+  export CSP_BASE_URL=http://127.0.0.1:8080      # scripts now target the mock
+  export BROKER_API_URL=...                      # (broker is not mocked here)
+
+  curl http://127.0.0.1:8080/_mock/stats          # per-endpoint request counts
+
+Options:
+  --latency S            Base latency per request (default: 0.03)
+  --jitter S             Uniform extra latency (default: 0.02)
+  --slow GLOB=S          Extra latency for matching paths, repeatable
+                         (e.g. --slow "/v2/session/*=0.4")
+  --error-rate F         Fraction of requests answered with an injected error (default: 0)
+  --error-codes LIST     Codes to inject (default: 403,409,429,503)
+  --retry-after S        Retry-After for injected 429/503 (default: 1)
+  --switch-delay S       Seconds before a switched JWT is honoured (default: 0.5)
+  --consistency-delay S  Seconds before new objects appear in lists (default: 2)
+  --token-ttl S          JWT lifetime (default: 3600)
+  --purge-delay S        Seconds (±50%) a deleted discovery provider stays listed,
+                         answering the DELETE with 202 (default: 0 = gone at once)
+  --seed N               Random seed for reproducible error injection
+"""
+
+import re
+import json
+import time
+import uuid
+import base64
+import random
+import fnmatch
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Collections served with generic list / create / get / delete semantics
+COLLECTIONS = (
+    "/v2/groups",
+    "/v2/users",
+    "/v2/sandbox/accounts",
+    "/api/iam/v2/keys",
+    "/api/iam/v1/cloud_credential",
+    "/api/ddi/v1/dns/view",
+    "/api/ddi/v1/dns/zone_child",
+    "/api/cloud_discovery/v2/providers",
+    "/api/universalinfra/v1/endpoints",
+    "/api/universalinfra/v1/accesslocations",
+    "/api/universalinfra/v1/universalservices",
+    "/api/universalinfra/v1/universal_services",
+    "/api/universalinfra/v1/credentials",
+    "/api/atcfw/v1/security_policies",
+)
+UNSCOPED = ("/v2/session/", "/v2/sandbox/", "/_mock/")
+_FILTER_TOKEN = re.compile(r'\s*(\(|\)|==|!=|!~|~|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[\w.\-]+)')
+
+
+def _filter_match(expr, obj):
+    """Evaluate a CSP _filter (==, !=, ~, !~, and, or, not, parentheses) against one object."""
+    tokens = _FILTER_TOKEN.findall(expr)
+    pos = 0
+
+    def take():
+        nonlocal pos
+        pos += 1
+        return tokens[pos - 1] if pos <= len(tokens) else ""
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else ""
+
+    def value(tok):
+        if tok[:1] in "\"'":
+            return re.sub(r"\\(.)", r"\1", tok[1:-1])
+        return {"true": "True", "false": "False", "null": "None"}.get(tok, tok)
+
+    def factor():
+        tok = take()
+        if tok == "not":
+            return not factor()
+        if tok == "(":
+            result = disjunction()
+            take()  # ")"
+            return result
+        name, op, rhs = tok, take(), value(take())
+        current = obj
+        for part in name.split("."):
+            current = current.get(part) if isinstance(current, dict) else None
+        actual = str(current)
+        if op == "==":
+            return actual == rhs
+        if op == "!=":
+            return actual != rhs
+        found = re.search(rhs, actual) is not None
+        return found if op == "~" else not found
+
+    def conjunction():
+        result = factor()
+        while peek() == "and":
+            take()
+            result = factor() and result
+        return result
+
+    def disjunction():
+        result = conjunction()
+        while peek() == "or":
+            take()
+            result = conjunction() or result
+        return result
+
+    return disjunction()
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+
+
+def make_jwt(claims):
+    return f"{_b64({'alg': 'none', 'typ': 'JWT'})}.{_b64(claims)}.mock"
+
+
+def read_jwt(token):
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+
+
+class MockCSP:
+    """In-memory CSP state; every account has its own set of collections."""
+
+    def __init__(self, args):
+        self.args = args
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self.stats = Counter()
+        self.root = self.account("root")
+
+    # ---------- state ----------
+    def account(self, account_id):
+        acct = self.accounts.get(account_id)
+        if acct is None:
+            now = time.time()
+            acct = self.accounts[account_id] = {c: {} for c in COLLECTIONS}
+            self._add(acct, "/v2/groups", {"name": "user"}, now)
+            self._add(acct, "/v2/groups", {"name": "act_admin"}, now)
+            self._add(acct, "/api/atcfw/v1/security_policies",
+                      {"name": "Default Global Policy", "is_default": True}, now)
+            # A new account's default DNS view shows up after the consistency delay
+            self._add(acct, "/api/ddi/v1/dns/view", {"name": "default"},
+                      now + self.args.consistency_delay)
+        return acct
+
+    def _add(self, acct, collection, obj, visible_at):
+        prefix = {"/v2/users": "identity/users/", "/v2/groups": "identity/groups/"}.get(collection, "")
+        obj = {**obj, "id": obj.get("id") or f"{prefix}{uuid.uuid4()}",
+               "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        acct[collection][obj["id"].split("/")[-1]] = (visible_at, obj)
+        return obj
+
+    @staticmethod
+    def visible(acct, collection):
+        now = time.time()
+        return [obj for visible_at, obj in acct[collection].values() if visible_at <= now]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    csp = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ---------- plumbing ----------
+    def _reply(self, status, body=None, headers=None):
+        data = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Request-ID", str(uuid.uuid4()))
+        for k, v in (headers or {}).items():
+            self.send_header(k, str(v))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw) if raw else {}
+        except ValueError:
+            return {}
+
+    def _simulate(self, path):
+        args = self.csp.args
+        delay = args.latency + random.uniform(0, args.jitter)
+        for pattern, extra in args.slow:
+            if fnmatch.fnmatch(path, pattern):
+                delay += extra
+        time.sleep(delay)
+        if args.error_rate and not path.startswith("/_mock/") and random.random() < args.error_rate:
+            code = random.choice(args.error_codes)
+            headers = {"Retry-After": args.retry_after} if code in (429, 503) else {}
+            self._reply(code, {"error": [{"message": f"injected {code}"}]}, headers)
+            return True
+        return False
+
+    def _caller_account(self):
+        """Account of the bearer token; None (-> 401) while a switched JWT is still propagating."""
+        auth = self.headers.get("Authorization", "")
+        if auth.lower().startswith("token "):
+            return "root"  # API-key auth acts on the parent account
+        claims = read_jwt(auth[7:]) if auth.startswith("Bearer ") else None
+        if not claims or claims.get("exp", 0) < time.time():
+            return None
+        if claims.get("account_id") and time.time() < claims.get("iat", 0) + self.csp.args.switch_delay:
+            return None
+        return claims.get("account_id") or "root"
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        query = parse_qs(url.query)
+        self.csp.stats[f"{method} {path}"] += 1
+        body = self._body()  # always drain the request so keep-alive stays in sync
+        if self._simulate(path):
+            return
+
+        if path == "/_mock/stats":
+            return self._reply(200, {"requests": dict(self.csp.stats), "accounts": len(self.csp.accounts)})
+        if path == "/v2/session/users/sign_in" and method == "POST":
+            return self._issue(body.get("email"), None)
+        if path == "/v2/session/account_switch" and method == "POST":
+            claims = read_jwt(self.headers.get("Authorization", "")[7:]) or {}
+            target = str(body.get("id", "")).split("/")[-1]
+            if not claims or not target:
+                return self._reply(401, {"error": [{"message": "unauthorized"}]})
+            return self._issue(claims.get("sub"), target)
+
+        account_id = self._caller_account()
+        if account_id is None and not path.startswith(UNSCOPED):
+            return self._reply(401, {"error": [{"message": "token not valid (yet)"}]})
+        with self.csp.lock:
+            acct = self.csp.account(account_id or "root")
+            if path == "/v2/current_account":
+                return self._reply(200, {"result": {"id": f"identity/accounts/{account_id}"}})
+            if path == "/api/universalinfra/v1/consolidated/configure" and method == "POST":
+                return self._configure(acct, body)
+            if re.fullmatch(r"/v2/users/[^/]+/password", path) and method == "POST":
+                return self._reply(200, {"result": {}})
+            return self._collection(acct, method, path, query, body)
+
+    def _issue(self, email, account_id):
+        now = time.time()
+        claims = {"sub": email or "user@example.com", "iat": now, "exp": int(now) + self.csp.args.token_ttl,
+                  "jti": uuid.uuid4().hex}
+        if account_id:
+            claims["account_id"] = account_id
+            with self.csp.lock:
+                self.csp.account(account_id)
+        self._reply(200, {"jwt": make_jwt(claims)})
+
+    def _configure(self, acct, body):
+        """Consolidated configure: upsert the universal service, its endpoints and access locations."""
+        usvc = body.get("universal_service") or {}
+        services = acct["/api/universalinfra/v1/universalservices"]
+        if usvc.get("operation") == "UPDATE" and usvc.get("id") in services:
+            services[usvc["id"]][1].update(capabilities=usvc.get("capabilities", []))
+            usvc_id = usvc["id"]
+        else:
+            # Visible immediately: the script reads it back by id right away
+            obj = self.csp._add(acct, "/api/universalinfra/v1/universalservices",
+                                {"name": usvc.get("name", "svc"), "capabilities": usvc.get("capabilities", [])},
+                                time.time())
+            usvc_id = obj["id"]
+            acct["/api/universalinfra/v1/universal_services"][usvc_id] = services[usvc_id]
+
+        for section, collection in (("endpoints", "/api/universalinfra/v1/endpoints"),
+                                    ("access_locations", "/api/universalinfra/v1/accesslocations")):
+            ops = body.get(section) or {}
+            for item in ops.get("create") or []:
+                self.csp._add(acct, collection, self._realize(item, usvc_id), time.time())
+            for item in ops.get("update") or []:
+                entry = acct[collection].get(str(item.get("id", "")).split("/")[-1])
+                if entry:
+                    entry[1].update({k: v for k, v in item.items() if k != "id"})
+        return self._reply(200, {"universal_service": {"id": usvc_id}})
+
+    @staticmethod
+    def _realize(item, usvc_id):
+        """Fill the server-assigned fields a created endpoint / access location carries."""
+        obj = {k: v for k, v in item.items() if not str(v).startswith("ref_")}
+        obj.update(universal_service_id=usvc_id, id=f"infra/{uuid.uuid4()}")
+        if "tunnel_configs" in obj:
+            for tunnel in obj["tunnel_configs"]:
+                tunnel.setdefault("id", str(uuid.uuid4()))
+                for physical in tunnel.get("physical_tunnels", []):
+                    physical["credential_id"] = str(uuid.uuid4())
+                    for bgp in physical.get("bgp_configs", []):
+                        bgp.setdefault("id", str(uuid.uuid4()))
+                        bgp.setdefault("cloud_cidr", "169.254.21.0/30")
+        else:
+            for key, default in (("size", "S"), ("service_location", "AWS eu-central-1"),
+                                 ("service_ip", "203.0.113.10"), ("neighbour_ips", ["169.254.21.1"]),
+                                 ("preferred_provider", "AWS"), ("routing_type", "dynamic"),
+                                 ("routing_config", {"bgp_config": {"asn": 64512}})):
+                obj.setdefault(key, default)
+        return obj
+
+    def _collection(self, acct, method, path, query, body):
+        collection = next((c for c in sorted(COLLECTIONS, key=len, reverse=True)
+                           if path == c or path.startswith(c + "/")), None)
+        if collection is None:
+            return self._reply(404, {"error": [{"message": f"no route for {method} {path}"}]})
+        item_id = path[len(collection) + 1:] or None
+        items = acct[collection]
+        delay = self.csp.args.consistency_delay
+
+        if item_id is None and method == "GET":
+            results = MockCSP.visible(acct, collection)
+            for expr in query.get("_filter", []):
+                results = [r for r in results if _filter_match(expr, r)]
+            for projection in query.get("_fields", []):
+                keep = projection.split(",")
+                results = [{k: v for k, v in r.items() if k in keep} for r in results]
+            total = len(results)
+            if query.get("_limit"):
+                offset = int(query.get("_offset", ["0"])[0])
+                results = results[offset:offset + int(query["_limit"][0])]
+            body = {"results": results}
+            if query.get("_is_total_size_needed", [""])[0] == "true":
+                body["total_size"] = total
+            if collection == "/api/universalinfra/v1/endpoints" and results:
+                body["result"] = results[0]  # update_uddi_tunnel reads the endpoint listing as "result"
+            etag = '"%s"' % hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag:
+                return self._reply(304, headers={"ETag": etag})
+            return self._reply(200, body, {"ETag": etag})
+        if item_id is None and method == "POST":
+            if collection == "/v2/users" and any(o.get("email") == body.get("email") for _, o in items.values()):
+                return self._reply(409, {"error": [{"message": "user already exists"}]})
+            if collection == "/api/iam/v2/keys" and any(o.get("name") == body.get("name") for _, o in items.values()):
+                return self._reply(409, {"error": [{"message": "key already exists"}]})
+            obj = self.csp._add(acct, collection, body, time.time() + delay)
+            if collection == "/v2/sandbox/accounts":
+                external = str(uuid.uuid4())
+                obj["id"] = f"identity/accounts/{obj['id']}"
+                obj["admin_user"] = {**(body.get("admin_user") or {}), "account_id": f"identity/accounts/{external}"}
+                self.csp.account(external)
+            if collection == "/api/iam/v2/keys" and body.get("source_id") == "aws":
+                self.csp._add(acct, "/api/iam/v1/cloud_credential",
+                              {"name": body.get("name"), "credential_type": "Amazon Web Services"},
+                              time.time() + delay)
+            return self._reply(201 if collection.startswith("/v2") else 200, {"result": obj})
+
+        entry = items.get(item_id)
+        if entry is None:
+            return self._reply(404, {"error": [{"message": "not found"}]})
+        if method == "GET":
+            return self._reply(200, {"result": entry[1]})
+        if method in ("PUT", "PATCH"):
+            entry[1].update(body)
+            return self._reply(200, {"result": entry[1]})
+        if method == "DELETE":
+            if collection == "/api/cloud_discovery/v2/providers" and self.csp.args.purge_delay:
+                # IPAM / asset data purge: the provider stays listed for a while after the 202
+                delay = self.csp.args.purge_delay * random.uniform(0.5, 1.5)
+                threading.Timer(delay, items.pop, (item_id, None)).start()
+                return self._reply(202, {})
+            del items[item_id]
+            return self._reply(204 if collection == "/v2/sandbox/accounts" else 200)
+        return self._reply(405, {"error": [{"message": "method not allowed"}]})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    def do_PATCH(self):
+        self._route("PATCH")
+
+    def do_DELETE(self):
+        self._route("DELETE")
+
+
+def _slow(value):
+    pattern, _, seconds = value.rpartition("=")
+    return pattern, float(seconds)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline CSP API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--slow", type=_slow, action="append", default=[])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-codes", default="403,409,429,503",
+                        type=lambda v: [int(c) for c in v.split(",") if c])
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--switch-delay", type=float, default=0.5)
+    parser.add_argument("--consistency-delay", type=float, default=2.0)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--purge-delay", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    return parser.parse_args(argv)
+
+
+def serve(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    Handler.csp = MockCSP(args)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = serve(args)
+    print(f"🧪 Mock CSP listening on http://{args.host}:{args.port} "
+          f"(latency={args.latency}s±{args.jitter}, errors={args.error_rate:.0%}, "
+          f"switch_delay={args.switch_delay}s, consistency_delay={args.consistency_delay}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Mock CSP stopped", flush=True)
@@ -0,0 +1,113 @@
+"""
+Streaming pager for CSP list endpoints.
+
+List calls used to read the first page only (or hard-code _limit=101 and
+silently truncate). iter_items() walks every page of an endpoint and yields
+the objects one by one:
+
+  - offset pagination (_limit / _offset, the DDI / IAM / infra APIs): stops
+    on a short page, on total_size, or when the endpoint ignores _offset
+  - token pagination: when a response carries next_page_token / page_token /
+    next, the token is sent back (token_param) instead of an offset
+  - bare list responses are a single page
+
+While the caller works through one page the next one is already being
+fetched on a background thread, so at most two pages are in memory and the
+round trip overlaps with the caller's work. Breaking out of the loop early
+stops the prefetch.
+
+Usage:
+  from pager import iter_items, list_all
+
+  for zone in iter_items(session, f"{base}/api/ddi/v1/dns/zone_child", headers=headers,
+                         params={"_filter": 'flat=="false"'}):
+      ...
+  providers = list_all(session, url, headers=headers, limit=None, token_param="page_token")
+
+Environment Variables:
+  CSP_PAGE_SIZE  - Default _limit per page (default: 1000)
+"""
+
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from csp_client import get_session
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("CSP_PAGE_SIZE", 1000))
+TOKEN_KEYS = ("next_page_token", "page_token", "next")
+MAX_PAGES = 10000  # runaway guard for endpoints that keep returning a token
+
+
+def _page_items(data):
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        items = data.get("results", data.get("items", []))
+        return items if isinstance(items, list) else []
+    return []
+
+
+def _next_params(data, items, params, limit, token_param):
+    """Params for the following page, or None when this was the last one."""
+    token = next((data.get(k) for k in TOKEN_KEYS if isinstance(data, dict) and data.get(k)), None)
+    if token:
+        if token == params.get(token_param):
+            return None  # same token again: the endpoint isn't paging
+        return {**{k: v for k, v in params.items() if k != "_offset"}, token_param: token}
+    if not limit or not items or len(items) != limit:
+        return None  # no paging requested, empty, short, or endpoint ignored _limit
+    offset = int(params.get("_offset", 0)) + len(items)
+    total = data.get("total_size") if isinstance(data, dict) else None
+    if isinstance(total, int) and offset >= total:
+        return None
+    return {**params, "_offset": offset}
+
+
+def iter_pages(session=None, url=None, headers=None, params=None, limit=DEFAULT_PAGE_SIZE,
+               token_param="_page_token", prefetch=True):
+    """Yield the item list of every page; the next page is fetched while the caller handles this one."""
+    session = session or get_session()
+    params = dict(params or {})
+    if limit:
+        params.setdefault("_limit", limit)
+        params.setdefault("_offset", 0)
+
+    def fetch(page_params):
+        r = session.get(url, headers=headers, params=page_params)
+        r.raise_for_status()
+        return r.json()
+
+    pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        data, first_id = fetch(params), None
+        for _ in range(MAX_PAGES):
+            items = _page_items(data)
+            if items and isinstance(items[0], dict):
+                if first_id is not None and items[0].get("id") == first_id:
+                    return  # endpoint ignored _offset and served the first page again
+                first_id = first_id if first_id is not None else items[0].get("id")
+            params = _next_params(data, items, params, limit, token_param)
+            future = None
+            if params is not None and pool:
+                # copy the context: keeps the retry_policy deadline and http trace on the prefetch thread
+                future = pool.submit(contextvars.copy_context().run, fetch, params)
+            yield items
+            if params is None:
+                return
+            data = future.result() if future else fetch(params)
+    finally:
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_items(session=None, url=None, headers=None, params=None, limit=DEFAULT_PAGE_SIZE,
+               token_param="_page_token", prefetch=True):
+    """Yield every object of a list endpoint, across all pages."""
+    for items in iter_pages(session, url, headers, params, limit, token_param, prefetch):
+        yield from items
+
+
+def list_all(session=None, url=None, headers=None, params=None, limit=DEFAULT_PAGE_SIZE,
+             token_param="_page_token"):
+    """Every object of a list endpoint as one list (use iter_items() for large tenants)."""
+    return list(iter_items(session, url, headers, params, limit, token_param))
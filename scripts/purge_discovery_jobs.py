@@ -1,44 +1,40 @@
 import os
+import sys
 import json
+import time
+import asyncio
 import argparse
-import requests
+import threading
 from typing import Iterable, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from csp_client import CSPClient
+from pager import list_all
+from retry_policy import get_policy, Retry, RetryError, retry_after_seconds
+from token_cache import jwt_expiry
+import requests
+
+TOKEN_REFRESH_MARGIN = 120  # re-switch when the JWT has less than this left while polling
 
 class InfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
-        self.email = os.getenv("INFOBLOX_EMAIL")
-        self.password = os.getenv("INFOBLOX_PASSWORD")
+        self.client = CSPClient()
+        self.base_url = self.client.base_url
+        self.email = self.client.email
+        self.password = self.client.password
         if not self.email or not self.password:
             raise RuntimeError("Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD env vars.")
         self.jwt = None
-        self.session = requests.Session()
+        self.session = self.client.session
 
     # ---------- auth ----------
     def login(self):
-        r = self.session.post(
-            f"{self.base_url}/v2/session/users/sign_in",
-            headers={"Content-Type": "application/json"},
-            json={"email": self.email, "password": self.password},
-        )
-        r.raise_for_status()
-        self.jwt = r.json().get("jwt")
-        if not self.jwt:
-            raise RuntimeError("Login succeeded but no JWT returned.")
+        self.jwt = self.client.login()
         print("✅ Logged in.")
 
     def switch_account(self, sandbox_id_file: str = "sandbox_id.txt"):
         with open(sandbox_id_file, "r") as f:
             sandbox_id = f.read().strip()
-        r = self.session.post(
-            f"{self.base_url}/v2/session/account_switch",
-            headers=self._auth_headers(),
-            json={"id": f"identity/accounts/{sandbox_id}"},
-        )
-        r.raise_for_status()
-        self.jwt = r.json().get("jwt")
-        if not self.jwt:
-            raise RuntimeError("Account switch succeeded but no JWT returned.")
+        self.jwt = self.client.switch_account(sandbox_id)
         print(f"✅ Switched to sandbox {sandbox_id}.")
 
     def _auth_headers(self):
@@ -46,63 +42,195 @@ class InfobloxSession:
 
     # ---------- discovery providers ----------
     def list_providers(self) -> List[dict]:
-        """
-        GET /api/cloud_discovery/v2/providers
-        Handles both {"results":[...]} and raw list responses.
-        Adds naive pagination support if API returns 'next' or 'page_token'.
-        """
-        url = f"{self.base_url}/api/cloud_discovery/v2/providers"
-        providers: List[dict] = []
-        params = {}
-
-        while True:
-            r = self.session.get(url, headers=self._auth_headers(), params=params)
-            r.raise_for_status()
-            data = r.json()
-
-            if isinstance(data, dict):
-                items = data.get("results", data.get("items", []))
-                providers.extend(items if isinstance(items, list) else [])
-                # common pagination keys; keep it defensive
-                next_token = data.get("next") or data.get("next_page_token")
-                if next_token:
-                    params["page_token"] = next_token
-                    continue
-            elif isinstance(data, list):
-                providers.extend(data)
-            break
-
-        return providers
+        return list_providers(self.session, self.base_url, self._auth_headers())
 
     def delete_provider(self, provider_id: str,
                         delete_ipam: bool = True,
                         delete_asset: bool = True) -> Tuple[int, str]:
-        """
-        DELETE /providers/{id}?deletion_objects=ipam_data&deletion_objects=asset_data
-        Returns (status_code, message).
-        """
-        if not delete_ipam and not delete_asset:
-            return (0, "Skipped (no deletion objects selected)")
-
-        params = []
-        if delete_ipam:
-            params.append(("deletion_objects", "ipam_data"))
-        if delete_asset:
-            params.append(("deletion_objects", "asset_data"))
-
-        url = f"{self.base_url}/api/cloud_discovery/v2/providers/{provider_id}"
-        r = self.session.delete(url, headers=self._auth_headers(), params=params)
-
-        if r.status_code in (200, 202, 204):
-            return (r.status_code, "Deleted")
-        if r.status_code == 404:
-            return (r.status_code, "Not found (already deleted?)")
+        return delete_provider(self.session, self.base_url, self._auth_headers(),
+                               provider_id, delete_ipam, delete_asset)
+
+def list_providers(session, base_url: str, headers: dict) -> List[dict]:
+    """
+    GET /api/cloud_discovery/v2/providers
+    Handles both {"results":[...]} and raw list responses.
+    Follows next / next_page_token pagination (pager.py).
+    """
+    url = f"{base_url}/api/cloud_discovery/v2/providers"
+    return list_all(session, url, headers=headers, limit=None, token_param="page_token")
+
+def delete_provider(session, base_url: str, headers: dict, provider_id: str,
+                    delete_ipam: bool = True, delete_asset: bool = True) -> Tuple[int, str]:
+    """
+    DELETE /providers/{id}?deletion_objects=ipam_data&deletion_objects=asset_data
+    Returns (status_code, message).
+    """
+    if not delete_ipam and not delete_asset:
+        return (0, "Skipped (no deletion objects selected)")
+
+    url = f"{base_url}/api/cloud_discovery/v2/providers/{provider_id}"
+    r = session.delete(url, headers=headers, params=deletion_params(delete_ipam, delete_asset))
+    return deletion_result(r)
+
+def deletion_params(delete_ipam: bool, delete_asset: bool) -> List[Tuple[str, str]]:
+    params = []
+    if delete_ipam:
+        params.append(("deletion_objects", "ipam_data"))
+    if delete_asset:
+        params.append(("deletion_objects", "asset_data"))
+    return params
+
+def deletion_result(r) -> Tuple[int, str]:
+    """Map a provider DELETE response (requests or httpx) to (status_code, message)."""
+    if r.status_code in (200, 202, 204):
+        return (r.status_code, "Deleted")
+    if r.status_code == 404:
+        return (r.status_code, "Not found (already deleted?)")
+
+    try:
+        detail = r.json()
+    except Exception:
+        detail = r.text
+    return (r.status_code, f"Failed: {detail}")
+
+def provider_name(p: dict) -> Optional[str]:
+    return p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
+
+async def delete_providers_concurrently(targets: List[dict], sandbox_id: Optional[str],
+                                        parallel: int, delete_ipam: bool,
+                                        delete_asset: bool) -> List[Tuple[int, str]]:
+    """Fan provider DELETEs out over the async client, at most `parallel` in flight."""
+    from csp_async import AsyncCSPClient
+
+    async with AsyncCSPClient(concurrency=parallel) as client:
+        if sandbox_id:
+            await client.switch_account(sandbox_id)
+        else:
+            await client.login()
+
+        async def delete_one(p):
+            r = await client.delete(f"/api/cloud_discovery/v2/providers/{p.get('id')}",
+                                    params=deletion_params(delete_ipam, delete_asset))
+            code, msg = deletion_result(r)
+            print(f"id={p.get('id')} name={provider_name(p)} -> {msg} (HTTP {code})", flush=True)
+            return code, msg
+
+        # One failed DELETE (connection reset, timeout) must not drop the other results
+        results = await asyncio.gather(*(delete_one(p) for p in targets), return_exceptions=True)
+    for p, r in zip(targets, results):
+        if isinstance(r, Exception):
+            print(f"id={p.get('id')} name={provider_name(p)} -> {r} (HTTP 0)", flush=True)
+    return [(0, str(r)) if isinstance(r, Exception) else r for r in results]
+
+class PurgeTable:
+    """Per-provider purge state, redrawn in place on a terminal and printed on change otherwise."""
+
+    def __init__(self, targets, start, live=True):
+        self.start = start
+        self.live = live
+        self.rows = {p.get("id"): {"name": provider_name(p) or "", "http": "-", "state": "pending",
+                                   "seconds": None} for p in targets}
+        self.drawn = 0
+        self.tty = sys.stdout.isatty()
 
+    def deleted(self, pid, code):
+        row = self.rows[pid]
+        row["http"] = code
+        if code == 404:
+            row["state"], row["seconds"] = "gone", time.monotonic() - self.start
+        elif code in (200, 202, 204):
+            row["state"] = "purging"
+        else:
+            row["state"] = "failed"
+
+    def pending(self):
+        return [pid for pid, row in self.rows.items() if row["state"] == "purging"]
+
+    def gone(self, pid):
+        self.rows[pid].update(state="gone", seconds=time.monotonic() - self.start)
+
+    def counts(self):
+        counts = {}
+        for row in self.rows.values():
+            counts[row["state"]] = counts.get(row["state"], 0) + 1
+        return counts
+
+    def draw(self):
+        if not self.live:
+            return
+        icons = {"gone": "✅", "purging": "⏳", "failed": "❌", "pending": "·"}
+        lines = [f"   {'provider':<38} {'name':<28} {'http':>5}  state"]
+        for pid, row in self.rows.items():
+            took = f" {row['seconds']:.1f}s" if row["seconds"] is not None else ""
+            lines.append(f"   {str(pid)[-38:]:<38} {row['name'][:28]:<28} {row['http']:>5}  "
+                         f"{icons[row['state']]} {row['state']}{took}")
+        counts = self.counts()
+        lines.append(f"   {counts.get('gone', 0)}/{len(self.rows)} gone, {counts.get('purging', 0)} purging, "
+                     f"{counts.get('failed', 0)} failed — {time.monotonic() - self.start:.1f}s")
+        if self.tty and self.drawn:
+            sys.stdout.write(f"\x1b[{self.drawn}F\x1b[J")
+        print("\n".join(lines), flush=True)
+        self.drawn = len(lines)
+
+
+def refresh_token(s, force=False):
+    """
+    Re-switch into the account (or sign in again) when the JWT is close to
+    expiry: a cached token may have only CSP_TOKEN_MIN_TTL left, and the
+    purge wait can run longer than that.
+    """
+    client = s.client
+    exp = jwt_expiry(client.jwt or "")
+    if not force and (exp is None or exp - time.time() > TOKEN_REFRESH_MARGIN):
+        return
+    if client.account_id:
+        client.switch_account(client.account_id, force=True, wait_ready=False)
+    else:
+        client.login(force=True)
+    s.jwt = client.jwt
+
+
+def wait_until_purged(s, table, policy=None):
+    """
+    Poll list_providers until every deleted provider is gone: one listing per
+    round covers all of them. The interval backs off while nothing changes and
+    drops back to the policy base as soon as a provider disappears.
+    Transient listing errors (the policy's retry_on, honouring Retry-After)
+    and an expired token are retried instead of ending the wait.
+    Returns True when the tenant is clean, False on the policy deadline.
+    """
+    policy = policy or get_policy("discovery_purge")
+
+    def attempt():
         try:
-            detail = r.json()
-        except Exception:
-            detail = r.text
-        return (r.status_code, f"Failed: {detail}")
+            refresh_token(s)
+            present = {p.get("id") for p in s.list_providers()}
+        except requests.HTTPError as e:
+            code = e.response.status_code if e.response is not None else None
+            if code == 401:
+                refresh_token(s, force=True)
+                return Retry("token expired")
+            if code in policy.retry_on:
+                return Retry(f"HTTP {code}", after=retry_after_seconds(e.response))
+            raise
+        progressed = False
+        for pid in table.pending():
+            if pid not in present:
+                table.gone(pid)
+                progressed = True
+        if progressed or table.tty:
+            table.draw()
+        if not table.pending():
+            return True
+        return Retry("providers still purging", after=policy.base if progressed else None)
+
+    if not table.pending():
+        return True
+    try:
+        return policy.call(attempt, label="Discovery purge")
+    except RetryError:
+        return False
+
 
 def filter_providers(providers: Iterable[dict],
                      name_exact: Optional[str],
@@ -120,6 +248,133 @@ def filter_providers(providers: Iterable[dict],
             out.append(p)  # no filter => include all
     return out
 
+# ---------- fleet mode ----------
+class AccountProviders:
+    """list_providers / delete_provider for one account over a switched AccountSessionPool client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.base_url = client.base_url
+        self.session = client.session
+
+    def _auth_headers(self):
+        return self.client.auth_headers()
+
+    def list_providers(self) -> List[dict]:
+        return list_providers(self.session, self.base_url, self._auth_headers())
+
+    def delete_provider(self, provider_id: str, delete_ipam: bool = True,
+                        delete_asset: bool = True) -> Tuple[int, str]:
+        return delete_provider(self.session, self.base_url, self._auth_headers(),
+                               provider_id, delete_ipam, delete_asset)
+
+
+def read_account_ids(path: str) -> List[str]:
+    """Account ids, one per line (blank lines and # comments ignored), de-duplicated in order."""
+    with open(path) as f:
+        ids = [line.split("#")[0].strip().split("/")[-1] for line in f]
+    return list(dict.fromkeys(i for i in ids if i))
+
+
+def fleet_accounts(args) -> List[str]:
+    if args.accounts:
+        return read_account_ids(args.accounts)
+    from sandbox_api import SandboxAccountAPI, sandbox_account_external_id
+    token = os.environ.get("Infoblox_Token")
+    if not token:
+        raise SystemExit("❌ --all-sandboxes needs the 'Infoblox_Token' API key for SandboxAccountAPI")
+    api = SandboxAccountAPI(f"{CSPClient().base_url}/v2", token)
+    accounts = api.list_sandbox_accounts(args.sandbox_prefix)
+    return list(dict.fromkeys(i for i in map(sandbox_account_external_id, accounts) if i))
+
+
+def purge_account(account_id: str, client, args, inflight) -> dict:
+    """Filter and delete one account's providers, then wait for the purge; one report row."""
+    s = AccountProviders(client)
+    start = time.monotonic()
+    providers = s.list_providers()
+    targets = filter_providers(providers, args.name, args.contains)
+    row = {"account_id": account_id, "providers": len(providers), "matched": len(targets)}
+    if args.list or args.dry_run or not targets:
+        row.update(status="listed" if args.list else "dry-run" if args.dry_run else "clean",
+                   names=[provider_name(p) for p in targets])
+        return row
+
+    def delete(p):
+        with inflight:  # global cap across all accounts
+            return s.delete_provider(p.get("id"), delete_ipam=not args.keep_ipam,
+                                     delete_asset=not args.keep_asset)
+
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:  # per-account cap
+        results = list(pool.map(delete, targets))
+    table = PurgeTable(targets, start, live=False)
+    for p, (code, _) in zip(targets, results):
+        table.deleted(p.get("id"), code)
+    clean = True if args.no_wait else wait_until_purged(s, table)
+    counts = table.counts()
+    row.update(gone=counts.get("gone", 0), purging=counts.get("purging", 0), failed=counts.get("failed", 0),
+               seconds=round(time.monotonic() - start, 1),
+               status="failed" if counts.get("failed") else "accepted" if args.no_wait
+               else "clean" if clean else "timeout")
+    return row
+
+
+def run_fleet(args):
+    from session_pool import AccountSessionPool
+
+    account_ids = fleet_accounts(args)
+    if not account_ids:
+        print("ℹ️ No accounts to purge.")
+        return
+    print(f"🚢 Fleet purge over {len(account_ids)} account(s): {args.accounts_parallel} account(s) at once, "
+          f"{args.parallel} DELETE(s) per account, {args.max_inflight} in flight overall", flush=True)
+    inflight = threading.BoundedSemaphore(max(1, args.max_inflight))
+    done = []
+    lock = threading.Lock()
+
+    def one(account_id, client):
+        row = purge_account(account_id, client, args, inflight)
+        with lock:
+            done.append(account_id)
+            icon = {"clean": "✅", "listed": "📋", "dry-run": "📋", "accepted": "📨"}.get(row["status"], "❌")
+            print(f"   {icon} [{len(done)}/{len(account_ids)}] {account_id}: {row['matched']} matched"
+                  + (f", {row['gone']} gone in {row['seconds']:.1f}s" if "gone" in row else "")
+                  + (f" ({row['status']})" if icon == "❌" else ""), flush=True)
+            for name in row.get("names", []) if row["status"] in ("listed", "dry-run") else []:
+                print(f"      - {name}", flush=True)
+        return row
+
+    start = time.monotonic()
+    pool = AccountSessionPool(max_accounts=max(args.accounts_parallel * 2, 16))
+    results = pool.map(one, account_ids, max_workers=max(1, args.accounts_parallel))
+    rows = [r if not isinstance(r, Exception) else
+            {"account_id": a, "status": "error", "error": f"{type(r).__name__}: {r}"}
+            for a, r in results.items()]
+    wall = time.monotonic() - start
+
+    print(f"\n📊 Fleet purge report ({wall:.1f}s)")
+    print(f"   {'account':<38}{'providers':>10}{'matched':>9}{'gone':>6}{'failed':>8}{'secs':>8}  status")
+    totals = {}
+    for r in rows:
+        totals[r["status"]] = totals.get(r["status"], 0) + 1
+        secs = f"{r['seconds']:.1f}" if "seconds" in r else "-"
+        print(f"   {r['account_id'][-38:]:<38}{r.get('providers', '-'):>10}{r.get('matched', '-'):>9}"
+              f"{r.get('gone', '-'):>6}{r.get('failed', '-'):>8}{secs:>8}  {r['status']}"
+              + (f" ({r['error']})" if r.get("error") else ""))
+    matched = sum(r.get("matched", 0) for r in rows)
+    gone = sum(r.get("gone", 0) for r in rows)
+    print(f"🏁 {len(rows)} account(s), {matched} provider(s) matched, {gone} purged in {wall:.1f}s: "
+          + ", ".join(f"{n} {status}" for status, n in sorted(totals.items())))
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                       "wall_seconds": round(wall, 1), "accounts": rows}, f, indent=2)
+        print(f"💾 Report saved to {args.report}")
+    if any(r["status"] in ("failed", "timeout", "error") for r in rows):
+        sys.exit(1)
+
+
 def main():
     ap = argparse.ArgumentParser(description="List and delete Cloud Discovery providers (jobs).")
     ap.add_argument("--no-switch", action="store_true",
@@ -134,8 +389,30 @@ def main():
                     help="Do NOT delete Asset data.")
     ap.add_argument("--dry-run", action="store_true",
                     help="Show what would be deleted without deleting.")
+    ap.add_argument("--parallel", type=int, default=1, metavar="N",
+                    help="Delete up to N providers concurrently (async client).")
+    ap.add_argument("--no-wait", action="store_true",
+                    help="Return once the DELETEs are accepted instead of waiting for the purge to finish.")
+    fleet = ap.add_argument_group("fleet mode (many sandbox accounts, one admin login)")
+    fleet.add_argument("--accounts", metavar="FILE",
+                       help="Purge every account id listed in FILE (one per line); --parallel is per account.")
+    fleet.add_argument("--all-sandboxes", action="store_true",
+                       help="Purge every sandbox account (SandboxAccountAPI, needs Infoblox_Token).")
+    fleet.add_argument("--sandbox-prefix", help="With --all-sandboxes: only sandbox names starting with this.")
+    fleet.add_argument("--accounts-parallel", type=int, default=8, metavar="N",
+                       help="Accounts purged concurrently (default: 8).")
+    fleet.add_argument("--max-inflight", type=int, default=32, metavar="N",
+                       help="Global cap on concurrent DELETEs across all accounts (default: 32).")
+    fleet.add_argument("--report", metavar="FILE", help="Write the consolidated report as JSON.")
     args = ap.parse_args()
 
+    if args.accounts or args.all_sandboxes:
+        if args.keep_ipam and args.keep_asset:
+            print("Skipped (no deletion objects selected)")
+            return
+        run_fleet(args)
+        return
+
     s = InfobloxSession()
     s.login()
     if not args.no_switch:
@@ -158,19 +435,48 @@ def main():
         return
 
     print(f"\n🎯 Candidates to delete: {len(targets)}")
-    for p in targets:
-        pid = p.get("id")
-        pname = p.get("name") or p.get("display_name") or p.get("config", {}).get("name")
-        if args.dry_run:
-            print(f"DRY-RUN: would delete id={pid} name={pname}")
-            continue
-
-        code, msg = s.delete_provider(
-            provider_id=pid,
-            delete_ipam=not args.keep_ipam,
-            delete_asset=not args.keep_asset
-        )
-        print(f"id={pid} name={pname} -> {msg} (HTTP {code})")
+    if args.dry_run:
+        for p in targets:
+            print(f"DRY-RUN: would delete id={p.get('id')} name={provider_name(p)}")
+        return
+    if args.keep_ipam and args.keep_asset:
+        print("Skipped (no deletion objects selected)")
+        return
+
+    start = time.monotonic()
+    if args.parallel > 1:
+        sandbox_id = None if args.no_switch else s.client.account_id
+        results = asyncio.run(delete_providers_concurrently(
+            targets, sandbox_id, args.parallel,
+            delete_ipam=not args.keep_ipam, delete_asset=not args.keep_asset))
+    else:
+        results = []
+        for p in targets:
+            code, msg = s.delete_provider(
+                provider_id=p.get("id"),
+                delete_ipam=not args.keep_ipam,
+                delete_asset=not args.keep_asset
+            )
+            print(f"id={p.get('id')} name={provider_name(p)} -> {msg} (HTTP {code})")
+            results.append((code, msg))
+    print(f"📨 {len(targets)} DELETE(s) sent in {time.monotonic() - start:.1f}s")
+    if args.no_wait:
+        return
+
+    # 202 only means "accepted": IPAM / asset data deletion continues server-side
+    table = PurgeTable(targets, start)
+    for p, (code, _) in zip(targets, results):
+        table.deleted(p.get("id"), code)
+    print("\n🧹 Waiting for the providers to disappear...")
+    table.draw()
+    clean = wait_until_purged(s, table)
+    counts = table.counts()
+    print(f"🏁 {counts.get('gone', 0)}/{len(targets)} provider(s) purged in {time.monotonic() - start:.1f}s")
+    if not clean:
+        print(f"❌ {counts.get('purging', 0)} provider(s) still purging at the deadline "
+              f"(RETRY_DISCOVERY_PURGE_DEADLINE)")
+    if not clean or counts.get("failed"):
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,220 @@
+"""
+Host-wide, cross-process token-bucket rate limiter for CSP and broker calls.
+
+Each lab VM / operator host runs many scripts in parallel; on their own they
+used random startup jitter and flat 10s WAF sleeps, and still tripped 403/429
+storms. Every request made through the pooled session (csp_client) or the
+async client now takes a token from a per-endpoint bucket whose state lives
+in a small JSON file guarded by flock, so all processes on the host share one
+budget. A 429/503 Retry-After (or a broker WAF 403) blocks the bucket for
+every process until the server's deadline has passed.
+
+Buckets (rate per second / burst):
+  csp:auth   - /v2/session/* sign-in and account switch (2/5)
+  csp:read   - other CSP GETs (10/20)
+  csp:write  - other CSP POST/PUT/PATCH/DELETE (10/32: the burst lets one
+               CSP_CONCURRENCY=32 async DELETE fan-out start at once)
+  broker     - sandbox broker API (1/3)
+
+A wait for tokens never outlasts the enclosing retry_policy deadline; when
+the deadline is up, acquire() raises DeadlineExceeded instead of sleeping on.
+State files are 0600 in a 0700 directory per user.
+
+Environment Variables:
+  RATE_LIMIT_DIR      - State directory (default: /tmp/infoblox-ratelimit-<uid>)
+  RATE_LIMIT_BUDGETS  - Overrides, e.g. "broker=0.5/2,csp:read=20/40"
+  RATE_LIMIT_DISABLE  - Set to 1 to bypass limiting entirely
+  BROKER_API_URL      - Requests to this host are accounted to the broker bucket
+"""
+
+import os
+import json
+import time
+import fcntl
+import asyncio
+import threading
+from urllib.parse import urlparse
+from retry_policy import DeadlineExceeded, remaining, retry_after_seconds
+
+DEFAULT_STATE_DIR = f"/tmp/infoblox-ratelimit-{os.getuid()}"
+DEFAULT_BUDGETS = {
+    "csp:auth": (2.0, 5),
+    "csp:read": (10.0, 20),
+    "csp:write": (10.0, 32),
+    "broker": (1.0, 3),
+}
+WAF_PENALTY_SECONDS = 10  # broker WAF 403s carry no Retry-After
+MAX_PENALTY_SECONDS = 300
+THROTTLE_MEMORY_SECONDS = 60  # load() stays raised this long after a penalty, decaying
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def parse_budgets(spec):
+    """Parse 'name=rate/burst,...' into {name: (rate, burst)}."""
+    budgets = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, value = part.split("=", 1)
+        rate, _, burst = value.partition("/")
+        try:
+            budgets[name.strip()] = (float(rate), int(burst or max(1, float(rate))))
+        except ValueError:
+            print(f"⚠️ Ignoring bad RATE_LIMIT_BUDGETS entry: {part!r}", flush=True)
+    return budgets
+
+
+class RateLimiter:
+    def __init__(self, state_dir=None, budgets=None):
+        self.state_dir = state_dir or os.environ.get("RATE_LIMIT_DIR", DEFAULT_STATE_DIR)
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {}),
+                        **parse_budgets(os.environ.get("RATE_LIMIT_BUDGETS"))}
+        broker_url = os.environ.get("BROKER_API_URL", "https://api-sandbox-broker.highvelocitynetworking.com/v1")
+        self.broker_host = urlparse(broker_url).netloc
+        ensure_state_dir(self.state_dir)
+
+    # ---------- classification ----------
+    def bucket_for(self, method, url):
+        parsed = urlparse(url)
+        if parsed.netloc == self.broker_host or "broker" in parsed.netloc:
+            return "broker"
+        if parsed.path.startswith("/v2/session/"):
+            return "csp:auth"
+        return "csp:read" if method.upper() in ("GET", "HEAD") else "csp:write"
+
+    # ---------- shared state ----------
+    def _path(self, bucket):
+        return os.path.join(self.state_dir, bucket.replace(":", "_") + ".json")
+
+    def _update(self, bucket, fn):
+        """Run fn(state, now) under an exclusive flock on the bucket file; returns fn's result."""
+        rate, burst = self.budgets.get(bucket, DEFAULT_BUDGETS["csp:read"])
+        fd = os.open(self._path(bucket), os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, "r+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                tokens = float(state.get("tokens", burst))
+                tokens = min(burst, tokens + (now - float(state.get("ts", now))) * rate)
+                state.update(tokens=tokens, ts=now)
+                result = fn(state, now, rate)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()  # must hit the file before the lock is released
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _try_take(self, bucket, n=1):
+        """Take n tokens if possible; otherwise return seconds to wait."""
+        def take(state, now, rate):
+            blocked = float(state.get("blocked_until", 0)) - now
+            if blocked > 0:
+                return blocked
+            if state["tokens"] >= n:
+                state["tokens"] -= n
+                return 0.0
+            return (n - state["tokens"]) / rate
+        return self._update(bucket, take)
+
+    # ---------- public API ----------
+    def acquire(self, bucket, n=1):
+        """Block until n tokens are available in bucket (or the deadline); returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self._try_take(bucket, n)
+            if wait <= 0:
+                return waited
+            wait = _deadline_wait(wait, bucket)
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, bucket, n=1):
+        """acquire() for coroutines: the flock runs on a worker thread, not the event loop."""
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_take, bucket, n)
+            if wait <= 0:
+                return waited
+            wait = _deadline_wait(wait, bucket)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def load(self, bucket):
+        """
+        0.0 (idle, full burst available) .. 1.0 (drained or blocked by a server
+        penalty). A penalty keeps the load raised for THROTTLE_MEMORY_SECONDS
+        after it expires, fading linearly, so scripts starting just after a
+        403 / 429 storm still spread out.
+        """
+        rate, burst = self.budgets.get(bucket, DEFAULT_BUDGETS["csp:read"])
+
+        def peek(state, now, rate):
+            if float(state.get("blocked_until", 0)) > now:
+                return 1.0
+            since = now - float(state.get("blocked_until", 0))
+            throttled = max(0.0, 1.0 - since / THROTTLE_MEMORY_SECONDS) if state.get("blocked_until") else 0.0
+            return max(throttled, min(1.0, 1.0 - state["tokens"] / burst))
+        return self._update(bucket, peek)
+
+    def penalize(self, bucket, seconds):
+        """Block bucket for every process on this host for `seconds`."""
+        seconds = min(MAX_PENALTY_SECONDS, max(0.0, float(seconds)))
+
+        def block(state, now, rate):
+            state["blocked_until"] = max(float(state.get("blocked_until", 0)), now + seconds)
+            state["tokens"] = 0.0
+        self._update(bucket, block)
+
+    def observe(self, bucket, response):
+        """Feed a response back: Retry-After / WAF throttling penalize the bucket."""
+        status = response.status_code
+        if status in (429, 503):
+            seconds = retry_after_seconds(response)
+            if seconds is None and status == 429:
+                seconds = 1.0 / self.budgets.get(bucket, (1.0, 1))[0]
+            if seconds:
+                self.penalize(bucket, seconds)
+        elif status == 403 and bucket == "broker":
+            self.penalize(bucket, retry_after_seconds(response) or WAF_PENALTY_SECONDS)
+
+
+def ensure_state_dir(path):
+    """Create a private state directory; refuse one that another user owns."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f"rate-limit state directory {path} belongs to another user")
+    return path
+
+
+def _deadline_wait(wait, bucket):
+    """Cap a token wait at the retry_policy deadline; raise once it has passed."""
+    left = remaining()
+    if left is None:
+        return wait
+    if left <= 0:
+        raise DeadlineExceeded(f"❌ Rate limit ({bucket}): deadline exceeded while waiting for a token")
+    return min(wait, left)
+
+
+def limiting_disabled():
+    return os.environ.get("RATE_LIMIT_DISABLE", "0") == "1"
+
+
+def get_limiter():
+    """Process-wide RateLimiter, or None when RATE_LIMIT_DISABLE=1."""
+    global _limiter
+    if limiting_disabled():
+        return None
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,280 @@
+"""
+Unified retry / backoff policy engine with deadline budgets.
+
+The waiters, the discovery submit loop, the VPN conflict retry, the broker
+allocation loop and the user-creation loop each used to hand-roll their own
+backoff with different semantics. A call site now declares a named
+RetryPolicy and runs its attempt function through it:
+
+  - decorrelated jitter:  sleep = min(cap, uniform(base, prev * 3))
+  - Retry-After honoured, both delta-seconds and HTTP-date forms
+  - per-status classification (retry_on); anything else is returned as-is
+  - an overall deadline that carries across nested calls: a policy run
+    inside another policy (or inside `with deadline(...)`) never outlives
+    the outer budget, and pooled-session request timeouts are clamped to
+    whatever budget is left (see csp_client.PooledAdapter)
+
+Usage:
+  from retry_policy import get_policy, RETRY, RetryError
+
+  policy = get_policy("propagation", deadline=240)
+
+  def attempt():
+      r = session.get(url)
+      if policy.retryable(r):
+          return r                      # retried, honouring Retry-After
+      r.raise_for_status()
+      return r.json() or RETRY          # RETRY = "not there yet"
+
+  try:
+      data = policy.call(attempt, label="DNS View")
+  except RetryError as e:               # DeadlineExceeded is a RetryError
+      ...
+
+  # async (httpx via csp_async): fn returns an awaitable
+  r = await policy.call_async(lambda: client.delete(path), label="Delete view")
+
+Environment Variables:
+  RETRY_<NAME>_DEADLINE      - Override a named policy's deadline in seconds
+  RETRY_<NAME>_MAX_ATTEMPTS  - Override a named policy's attempt cap
+                               (NAME is upper-cased, e.g. RETRY_PROPAGATION_DEADLINE)
+"""
+
+import os
+import time
+import asyncio
+import random
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+import requests
+
+MAX_RETRY_AFTER = 300  # never honour a Retry-After longer than this
+
+_deadline = contextvars.ContextVar("retry_deadline", default=None)
+
+
+class RetryError(RuntimeError):
+    """Raised when a policy gives up; `last` is the final response / outcome."""
+
+    def __init__(self, message, last=None, attempts=0):
+        super().__init__(message)
+        self.last = last
+        self.attempts = attempts
+
+
+class DeadlineExceeded(RetryError):
+    pass
+
+
+class Retry:
+    """Returned by an attempt function to ask for another try."""
+
+    def __init__(self, reason="not ready yet", after=None):
+        self.reason = reason
+        self.after = after
+
+
+RETRY = Retry()
+
+
+# ---------- deadlines ----------
+@contextmanager
+def deadline(seconds):
+    """Bound everything inside to `seconds` (or the enclosing deadline, if sooner)."""
+    if seconds is None:
+        yield remaining()
+        return
+    parent = _deadline.get()
+    until = time.monotonic() + seconds
+    if parent is not None:
+        until = min(parent, until)
+    token = _deadline.set(until)
+    try:
+        yield until - time.monotonic()
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current deadline, or None when unbounded."""
+    until = _deadline.get()
+    return None if until is None else until - time.monotonic()
+
+
+def clamp_timeout(timeout, floor=1.0):
+    """Shrink a requests timeout (float or (connect, read)) to the remaining budget."""
+    left = remaining()
+    if left is None or timeout is None:
+        return timeout
+    left = max(floor, left)
+    if isinstance(timeout, tuple):
+        return tuple(None if t is None else min(t, left) for t in timeout)
+    return min(timeout, left)
+
+
+# ---------- Retry-After ----------
+def parse_retry_after(value, now=None):
+    """Seconds to wait for a Retry-After header value (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(MAX_RETRY_AFTER, int(value))
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return min(MAX_RETRY_AFTER, max(0.0, when.timestamp() - now))
+
+
+def retry_after_seconds(response):
+    return parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+
+
+# ---------- policy ----------
+class RetryPolicy:
+    def __init__(self, name, base=1.0, cap=30.0, deadline=None, max_attempts=None,
+                 retry_on=(429, 502, 503, 504),
+                 retry_exceptions=(requests.ConnectionError, requests.Timeout),
+                 respect_retry_after=True, verbose=True):
+        self.name = name
+        self.base = base
+        self.cap = cap
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.retry_on = frozenset(retry_on)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.respect_retry_after = respect_retry_after
+        self.verbose = verbose
+
+    def with_options(self, **overrides):
+        options = dict(vars(self))
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return RetryPolicy(**options)
+
+    def retryable(self, response):
+        return response.status_code in self.retry_on
+
+    def backoff(self, previous):
+        """Decorrelated jitter (AWS Architecture Blog): next sleep from the previous one."""
+        return min(self.cap, random.uniform(self.base, max(self.base, previous * 3)))
+
+    def _outcome(self, result):
+        """(retry?, reason, server-requested delay) for an attempt's return value."""
+        if isinstance(result, Retry):
+            return True, result.reason, result.after
+        # requests.Response or httpx.Response (csp_async)
+        if isinstance(getattr(result, "status_code", None), int) and self.retryable(result):
+            after = retry_after_seconds(result) if self.respect_retry_after else None
+            return True, f"HTTP {result.status_code}", after
+        return False, None, None
+
+    def _next_sleep(self, previous, attempt, reason, after, last, label):
+        """Seconds to sleep before the next attempt; raises once attempts or the deadline run out."""
+        if self.max_attempts and attempt >= self.max_attempts:
+            raise RetryError(f"❌ {label}: gave up after {attempt} attempt(s) ({reason})",
+                             last=last, attempts=attempt)
+        sleep_s = self.backoff(previous)
+        if after is not None:
+            sleep_s = max(after, self.base)
+        left = remaining()
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(f"❌ {label}: deadline exceeded after {attempt} attempt(s) ({reason})",
+                                       last=last, attempts=attempt)
+            sleep_s = min(sleep_s, left)
+        if self.verbose:
+            print(f"🕐 {label}: {reason}; retry {attempt + 1}"
+                  f"{'/' + str(self.max_attempts) if self.max_attempts else ''}"
+                  f" in ~{sleep_s:.1f}s", flush=True)
+        return sleep_s
+
+    def call(self, fn, label=None):
+        """
+        Run fn() until it returns something that is not a retry.
+        fn may return a Response (retried when its status is in retry_on, else
+        returned), RETRY / Retry(...) to try again, or any final value.
+        retry_exceptions raised by fn are retried; everything else propagates.
+        """
+        label = label or self.name
+        with deadline(self.deadline):
+            sleep_s, attempt, last = self.base, 0, None
+            while True:
+                attempt += 1
+                try:
+                    last = fn()
+                    again, reason, after = self._outcome(last)
+                except self.retry_exceptions as e:
+                    again, reason, after, last = True, f"{type(e).__name__}: {e}", None, e
+                if not again:
+                    return last
+                sleep_s = self._next_sleep(sleep_s, attempt, reason, after, last, label)
+                time.sleep(sleep_s)
+
+    async def call_async(self, fn, label=None):
+        """call() for coroutines: fn() returns an awaitable; sleeps don't block the event loop."""
+        label = label or self.name
+        with deadline(self.deadline):
+            sleep_s, attempt, last = self.base, 0, None
+            while True:
+                attempt += 1
+                try:
+                    last = await fn()
+                    again, reason, after = self._outcome(last)
+                except self.retry_exceptions as e:
+                    again, reason, after, last = True, f"{type(e).__name__}: {e}", None, e
+                if not again:
+                    return last
+                sleep_s = self._next_sleep(sleep_s, attempt, reason, after, last, label)
+                await asyncio.sleep(sleep_s)
+
+
+# ---------- named policies (tune worst-case latency here) ----------
+POLICIES = {
+    # Newly created objects / freshly switched accounts becoming visible
+    "propagation": RetryPolicy("propagation", base=5, cap=20, deadline=240,
+                               retry_on=(401, 403, 429, 500, 502, 503, 504),
+                               retry_exceptions=(requests.RequestException,)),
+    # Cloud Discovery API readable after account switch
+    "discovery_ready": RetryPolicy("discovery_ready", base=3, cap=30, deadline=600,
+                                   retry_on=(403, 429, 502, 503, 504)),
+    # Deleted Cloud Discovery providers disappearing (IPAM/asset data purge runs server-side)
+    "discovery_purge": RetryPolicy("discovery_purge", base=2, cap=30, deadline=900,
+                                   retry_on=(403, 429, 502, 503, 504), verbose=False),
+    # Cloud Discovery provider submit (entitlements attach late, 409 while busy)
+    "discovery_submit": RetryPolicy("discovery_submit", base=3, cap=60, deadline=900,
+                                    retry_on=(401, 403, 409, 429, 502, 503, 504)),
+    # Mutations that answer 409 while a previous operation is in flight
+    "conflict": RetryPolicy("conflict", base=5, cap=60, max_attempts=12, retry_on=(409, 429)),
+    # Broker POST /allocate (403 = WAF, paced by the shared rate limiter)
+    "broker_allocate": RetryPolicy("broker_allocate", base=1, cap=30, max_attempts=5, deadline=180,
+                                   retry_on=(403, 500, 502, 503, 504),
+                                   retry_exceptions=(requests.RequestException,)),
+    # Broker POST /sandboxes/{id}/mark-for-deletion (bulk cleanup after an event)
+    "broker_deallocate": RetryPolicy("broker_deallocate", base=1, cap=30, max_attempts=5, deadline=120,
+                                     retry_on=(403, 429, 500, 502, 503, 504),
+                                     retry_exceptions=(requests.RequestException,)),
+    # Queue-and-wait on an exhausted broker pool (409); deadline = ALLOCATION_WAIT_TIMEOUT
+    "broker_queue": RetryPolicy("broker_queue", base=5, cap=60, retry_on=(409,), verbose=False),
+    # Bulk CSP DELETE fan-outs (csp_async; pass retry_exceptions=(httpx.TransportError,))
+    "csp_delete": RetryPolicy("csp_delete", base=1, cap=30, max_attempts=5, deadline=300,
+                              retry_on=(429, 500, 502, 503, 504)),
+    # CSP user creation
+    "create_user": RetryPolicy("create_user", base=1, cap=16, max_attempts=5,
+                               retry_exceptions=(requests.RequestException,)),
+}
+
+
+def get_policy(name, **overrides):
+    """Named policy with call-site overrides, then RETRY_<NAME>_* env overrides applied."""
+    policy = POLICIES[name].with_options(**overrides)
+    env = f"RETRY_{name.upper()}_"
+    if os.environ.get(env + "DEADLINE"):
+        policy.deadline = float(os.environ[env + "DEADLINE"])
+    if os.environ.get(env + "MAX_ATTEMPTS"):
+        policy.max_attempts = int(os.environ[env + "MAX_ATTEMPTS"])
+    return policy
@@ -1,6 +1,8 @@
 import json
-import requests
 import logging
+from csp_client import get_session
+from csp_query import eq, matches, query, regex_escape
+from pager import iter_items
 from logging.handlers import RotatingFileHandler
 
 # Setup logging
@@ -20,6 +22,7 @@ class SandboxAccountAPI:
     def __init__(self, base_url: str, token: str):
         self.base_url = base_url.rstrip("/")
         self.token = token
+        self.session = get_session()
 
     def _headers(self):
         headers = {
@@ -34,7 +37,7 @@ class SandboxAccountAPI:
         endpoint = f"{self.base_url}/sandbox/accounts"
         try:
             logger.debug(f"Creating sandbox at {endpoint} with payload: {sandbox_account_request}")
-            response = requests.post(url=endpoint, headers=self._headers(), data=json.dumps(sandbox_account_request))
+            response = self.session.post(url=endpoint, headers=self._headers(), data=json.dumps(sandbox_account_request))
             response.raise_for_status()
             result = response.json()
             logger.info(f"Sandbox created: {json.dumps(result, indent=2)}")
@@ -45,10 +48,10 @@ class SandboxAccountAPI:
 
     def get_sandbox_account_id_by_name(self, name: str) -> str:
         endpoint = f"{self.base_url}/sandbox/accounts"
-        params = {"_filter": f'name=="{name}"'}
+        params = query(eq("name", name))
         try:
             logger.debug(f"Querying sandbox ID with filter: {params}")
-            response = requests.get(endpoint, headers=self._headers(), params=params)
+            response = self.session.get(endpoint, headers=self._headers(), params=params)
             response.raise_for_status()
             result = response.json()
             if result.get("results"):
@@ -62,11 +65,20 @@ class SandboxAccountAPI:
             logger.error(f"Error fetching sandbox ID: {e}")
             return None
 
+    def list_sandbox_accounts(self, name_prefix: str = None) -> list:
+        """Every sandbox account (all pages), optionally only names starting with name_prefix."""
+        endpoint = f"{self.base_url}/sandbox/accounts"
+        params = query(matches("name", f"^{regex_escape(name_prefix)}") if name_prefix else None)
+        accounts = [a for a in iter_items(self.session, endpoint, headers=self._headers(), params=params)
+                    if not name_prefix or a.get("name", "").startswith(name_prefix)]
+        logger.info(f"Listed {len(accounts)} sandbox account(s) (prefix: {name_prefix})")
+        return accounts
+
     def delete_sandbox_account(self, sandbox_id: str) -> bool:
         endpoint = f"{self.base_url}/sandbox/accounts/{sandbox_id}"
         try:
             logger.debug(f"Deleting sandbox ID: {sandbox_id} at {endpoint}")
-            response = requests.delete(endpoint, headers=self._headers())
+            response = self.session.delete(endpoint, headers=self._headers())
             if response.status_code == 204:
                 logger.info(f"Sandbox ID {sandbox_id} deleted successfully.")
                 return True
@@ -76,3 +88,9 @@ class SandboxAccountAPI:
         except Exception as e:
             logger.error(f"Error deleting sandbox: {e}")
             return False
+
+
+def sandbox_account_external_id(account: dict) -> str:
+    """The id to account-switch into: the sandbox admin user's account (not the sandbox record id)."""
+    external = (account.get("admin_user") or {}).get("account_id") or account.get("id") or ""
+    return external.split("/")[-1]
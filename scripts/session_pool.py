@@ -0,0 +1,115 @@
+"""
+Multi-account CSP session pool for cross-sandbox batch operations.
+
+InfobloxSession.switch_account() reads a single sandbox_id.txt, so one
+process could only ever act on one sandbox. AccountSessionPool holds
+account-switched JWTs for many sandbox accounts behind a single admin
+sign-in: per-account CSPClients are created lazily on first use, share the
+pooled HTTP session and on-disk token cache, and are evicted LRU-first
+once more than max_accounts are live.
+
+Usage:
+  pool = AccountSessionPool()
+  client = pool.client_for(account_id)          # switched CSPClient
+  client.get("/api/cloud_discovery/v2/providers")
+
+  results = pool.map(purge_one, account_ids, max_workers=8)
+  # -> {account_id: result or Exception}
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from csp_client import CSPClient
+
+DEFAULT_MAX_ACCOUNTS = 64
+
+
+class AccountSessionPool:
+    def __init__(self, admin=None, max_accounts=DEFAULT_MAX_ACCOUNTS):
+        self.admin = admin or CSPClient()
+        self.max_accounts = max_accounts
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._admin_lock = threading.Lock()
+        self._account_locks = {}
+
+    def __len__(self):
+        return len(self._clients)
+
+    def accounts(self):
+        with self._lock:
+            return list(self._clients)
+
+    # ---------- admin sign-in ----------
+    def _admin_jwt(self, force=False):
+        with self._admin_lock:
+            if force or self.admin.jwt is None or self.admin.account_id is not None:
+                self.admin.login(force=force)
+            return self.admin.jwt
+
+    # ---------- per-account clients ----------
+    def client_for(self, account_id):
+        """Return a CSPClient switched into account_id, creating it on first use."""
+        with self._lock:
+            client = self._clients.get(account_id)
+            if client is not None:
+                self._clients.move_to_end(account_id)
+                return client
+            account_lock = self._account_locks.setdefault(account_id, threading.Lock())
+
+        with account_lock:  # one switch per account even under concurrent first use
+            with self._lock:
+                client = self._clients.get(account_id)
+                if client is not None:
+                    return client
+            client = self._switched_client(account_id)
+            with self._lock:
+                self._clients[account_id] = client
+                self._clients.move_to_end(account_id)
+                while len(self._clients) > self.max_accounts:
+                    evicted, _ = self._clients.popitem(last=False)
+                    self._account_locks.pop(evicted, None)
+            return client
+
+    def _switched_client(self, account_id):
+        client = CSPClient(self.admin.base_url, self.admin.email, self.admin.password,
+                           session=self.admin.session, token_cache=self.admin.token_cache)
+        cached = (client.token_cache.get(client.email, account_id, base_url=client.base_url)
+                  if client.token_cache else None)
+        if cached:
+            client.jwt, client.account_id, client.from_cache = cached, account_id, True
+            return client
+
+        client.jwt = self._admin_jwt()
+        try:
+            client.switch_account(account_id, force=True)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 401:
+                raise
+            # Admin token went stale during a long batch: sign in once more and retry
+            client.jwt, client.account_id = self._admin_jwt(force=True), None
+            client.switch_account(account_id, force=True)
+        return client
+
+    def evict(self, account_id):
+        with self._lock:
+            self._clients.pop(account_id, None)
+            self._account_locks.pop(account_id, None)
+
+    # ---------- batch helper ----------
+    def map(self, fn, account_ids, max_workers=8):
+        """
+        Run fn(account_id, client) for every account concurrently.
+        Returns {account_id: result}, with exceptions captured as values.
+        """
+        def run(account_id):
+            try:
+                return fn(account_id, self.client_for(account_id))
+            except Exception as e:
+                return e
+
+        account_ids = list(dict.fromkeys(account_ids))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(account_ids, pool.map(run, account_ids)))
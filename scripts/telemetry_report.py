@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Aggregate lab_telemetry.py JSONL files into percentile tables.
+
+Collect the lab_telemetry.jsonl files from lab VMs / operator hosts and point
+this at them to size the sandbox pool and find slow periods:
+
+  - per kind and track: runs, success rate, attempts and wall-time p50/p95/p99
+  - per UTC hour: runs, failures (pool exhausted), wall-time p50/p95
+  - pool sizing: peak number of sandboxes held at once per track (allocation
+    until deallocation, or until expires_at when no deallocation was logged)
+
+Usage:
+  python3 telemetry_report.py ~/.cache/infoblox/lab_telemetry.jsonl
+  python3 telemetry_report.py collected/ --kind allocate --since 48
+  python3 telemetry_report.py collected/ --json report.json
+
+Options:
+  --kind KIND   Only this record kind (allocate, deallocate, user_provision, user_delete)
+  --track SLUG  Only this track
+  --since H     Only runs started in the last H hours
+  --json FILE   Also write the tables as JSON
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from collections import defaultdict
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an unsorted list (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def load_records(paths):
+    """Every JSON line from the given files and (recursively) *.jsonl files in directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in sorted(names) if n.endswith(".jsonl")]
+        else:
+            files.append(path)
+    records, bad = [], 0
+    for path in files:
+        try:
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        bad += 1  # truncated line from a killed VM
+        except OSError as e:
+            print(f"⚠️ Skipping {path}: {e}", flush=True)
+    if bad:
+        print(f"⚠️ Ignored {bad} malformed line(s)", flush=True)
+    return records
+
+
+def stats(runs):
+    walls = [r.get("wall_seconds", 0) for r in runs]
+    attempts = [r.get("attempts", 0) for r in runs]
+    ok = sum(1 for r in runs if r.get("outcome") == "ok")
+    return {
+        "n": len(runs),
+        "ok_pct": round(100 * ok / len(runs), 1) if runs else None,
+        "attempts_mean": round(sum(attempts) / len(attempts), 2) if attempts else None,
+        "attempts_p95": percentile(attempts, 95),
+        **{f"p{p}": percentile(walls, p) for p in (50, 95, 99)},
+        "max": max(walls) if walls else None,
+        "reasons": dict(sorted(_count(r.get("reason") for r in runs if r.get("outcome") != "ok").items())),
+    }
+
+
+def _count(values):
+    counts = defaultdict(int)
+    for v in values:
+        counts[v or "unknown"] += 1
+    return counts
+
+
+def by_track(records):
+    groups = defaultdict(list)
+    for r in records:
+        groups[(r.get("kind", "?"), r.get("track_slug") or "-")].append(r)
+    return {f"{kind}|{track}": stats(runs) for (kind, track), runs in sorted(groups.items())}
+
+
+def by_hour(records):
+    groups = defaultdict(list)
+    for r in records:
+        hour = time.strftime("%Y-%m-%d %H:00", time.gmtime(r.get("started", 0)))
+        groups[(hour, r.get("kind", "?"))].append(r)
+    return {f"{hour}|{kind}": stats(runs) for (hour, kind), runs in sorted(groups.items())}
+
+
+def peak_held(records):
+    """{track: (peak sandboxes held at once, UTC time of the peak)} from allocate/deallocate records."""
+    released = {}
+    for r in records:
+        if r.get("kind") == "deallocate" and r.get("outcome") == "ok":
+            key = r.get("participant_id")
+            released[key] = min(released.get(key, math.inf), r.get("started", math.inf))
+    events = defaultdict(list)
+    for r in records:
+        if r.get("kind") != "allocate" or r.get("outcome") != "ok":
+            continue
+        start = r.get("started", 0) + r.get("wall_seconds", 0)
+        end = released.get(r.get("participant_id"), r.get("expires_at") or math.inf)
+        track = r.get("track_slug") or "-"
+        events[track] += [(start, 1), (max(start, end), -1)]
+    peaks = {}
+    for track, evs in events.items():
+        held = peak = 0
+        peak_at = None
+        for at, delta in sorted(evs, key=lambda e: (e[0], e[1])):
+            held += delta
+            if held > peak:
+                peak, peak_at = held, at
+        peaks[track] = (peak, time.strftime("%Y-%m-%d %H:%M", time.gmtime(peak_at)) if peak_at else None)
+    return peaks
+
+
+def _fmt(v):
+    return f"{v:8.2f}" if isinstance(v, (int, float)) else f"{'-':>8}"
+
+
+def print_table(title, rows, key_names):
+    print(f"\n📊 {title}", flush=True)
+    header = "".join(f"{k:<22}" for k in key_names)
+    print(f"   {header}{'n':>6}{'ok%':>7}{'att':>6}{'p50':>8}{'p95':>8}{'p99':>8}{'max':>8}  failures", flush=True)
+    for key, s in rows.items():
+        keys = "".join(f"{k[:21]:<22}" for k in key.split("|"))
+        failures = ", ".join(f"{reason}={n}" for reason, n in s["reasons"].items())
+        print(f"   {keys}{s['n']:>6}{s['ok_pct']:>7}{s['attempts_mean']:>6}"
+              f"{_fmt(s['p50'])}{_fmt(s['p95'])}{_fmt(s['p99'])}{_fmt(s['max'])}  {failures}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Percentile report over lab telemetry JSONL files")
+    parser.add_argument("paths", nargs="+", help="JSONL files or directories containing them")
+    parser.add_argument("--kind")
+    parser.add_argument("--track")
+    parser.add_argument("--since", type=float, help="Only runs from the last H hours")
+    parser.add_argument("--json")
+    args = parser.parse_args()
+
+    records = load_records(args.paths)
+    if args.since:
+        cutoff = time.time() - args.since * 3600
+        records = [r for r in records if r.get("started", 0) >= cutoff]
+    if args.track:
+        records = [r for r in records if r.get("track_slug") == args.track]
+    all_records = records  # pool sizing needs the deallocations even with --kind
+    if args.kind:
+        records = [r for r in records if r.get("kind") == args.kind]
+    if not records:
+        print("ℹ️ No telemetry records matched", flush=True)
+        sys.exit(0)
+
+    print(f"🔎 {len(records)} run(s) from {len(args.paths)} source(s)", flush=True)
+    report = {"by_track": by_track(records), "by_hour": by_hour(records), "peak_held": peak_held(all_records)}
+    print_table("Wall time (s) per kind / track", report["by_track"], ("kind", "track"))
+    print_table("Wall time (s) per UTC hour", report["by_hour"], ("hour", "kind"))
+    if report["peak_held"]:
+        print("\n🏊 Pool sizing: peak sandboxes held at once", flush=True)
+        for track, (peak, at) in sorted(report["peak_held"].items()):
+            print(f"   {track:<30}{peak:>6}  at {at} UTC", flush=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to {args.json}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
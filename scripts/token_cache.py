@@ -0,0 +1,130 @@
+"""
+On-disk JWT cache shared by the CSP lifecycle scripts.
+
+A setup chain runs 6+ scripts back to back, and each one used to sign in and
+account-switch from scratch. Tokens are cached per (CSP base URL, email,
+account id) together with the JWT "exp" claim, so the next script in the chain can reuse a valid,
+already account-switched token and only re-authenticate near expiry.
+
+Usage:
+  from token_cache import TokenCache
+
+  cache = TokenCache()
+  jwt = cache.get(email, account_id, base_url=client.base_url)   # None on miss / near expiry
+  cache.put(email, account_id, jwt, base_url=client.base_url)
+
+The base URL keeps tokens from a mock_csp_server.py run (or another CSP
+region) from being handed to production and vice versa.
+
+Environment Variables:
+  CSP_TOKEN_CACHE          - Cache file (default: ~/.cache/infoblox/csp_tokens.json)
+  CSP_TOKEN_MIN_TTL        - Seconds of validity a cached token must still have (default: 300)
+  CSP_TOKEN_CACHE_DISABLE  - Set to 1 to always authenticate from scratch
+"""
+
+import os
+import json
+import time
+import base64
+import fcntl
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "csp_tokens.json")
+DEFAULT_MIN_TTL = 300
+
+
+def jwt_claims(token):
+    """Decode the (unverified) claims of a JWT, or {} if it is not a JWT."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload.encode()))
+    except (AttributeError, IndexError, ValueError):
+        return {}
+
+
+def jwt_expiry(token):
+    """Return the JWT 'exp' claim as a unix timestamp, or None if absent."""
+    exp = jwt_claims(token).get("exp")
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+
+def normalize_base_url(base_url):
+    """scheme://host[:port][/path] lower-cased, without a trailing slash; "-" when unknown."""
+    if not base_url:
+        return "-"
+    parsed = urlparse(base_url if "://" in base_url else f"https://{base_url}")
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{parsed.path.rstrip('/')}"
+
+
+def cache_disabled():
+    return os.environ.get("CSP_TOKEN_CACHE_DISABLE", "0") == "1"
+
+
+class TokenCache:
+    """
+    JSON file of {"<base url>|<email>|<account id>": {"jwt": ..., "exp": ...}}.
+    Reads and writes take an exclusive flock so parallel scripts don't clobber
+    each other; the file is written atomically with 0600 permissions.
+    """
+
+    def __init__(self, path=None, min_ttl=None):
+        self.path = path or os.environ.get("CSP_TOKEN_CACHE", DEFAULT_CACHE_FILE)
+        self.min_ttl = float(min_ttl if min_ttl is not None
+                             else os.environ.get("CSP_TOKEN_MIN_TTL", DEFAULT_MIN_TTL))
+
+    @staticmethod
+    def _key(email, account_id, base_url=None):
+        return f"{normalize_base_url(base_url)}|{(email or '').lower()}|{account_id or '-'}"
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _store(self, data):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def get(self, email, account_id=None, base_url=None):
+        """Return a cached JWT with at least min_ttl seconds left, else None."""
+        with self._locked():
+            entry = self._load().get(self._key(email, account_id, base_url))
+        if not entry or not entry.get("exp"):
+            return None
+        if entry["exp"] - time.time() < self.min_ttl:
+            return None
+        return entry.get("jwt")
+
+    def put(self, email, account_id, jwt, base_url=None):
+        exp = jwt_expiry(jwt)
+        if exp is None:
+            return  # no expiry claim → never safe to reuse
+        now = time.time()
+        with self._locked():
+            data = {k: v for k, v in self._load().items() if v.get("exp", 0) > now}
+            data[self._key(email, account_id, base_url)] = {"jwt": jwt, "exp": exp}
+            self._store(data)
+
+    def invalidate(self, email, account_id=None, base_url=None):
+        with self._locked():
+            data = self._load()
+            if data.pop(self._key(email, account_id, base_url), None) is not None:
+                self._store(data)
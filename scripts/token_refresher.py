@@ -0,0 +1,93 @@
+"""
+Background, proactive JWT refresher for long-running CSP waiters.
+
+The discovery waiters used to do a blocking login() + switch_account() on
+every 3rd poll whether or not the token was stale. A TokenRefresher instead
+runs in a daemon thread: it renews the account-switched token shortly before
+its "exp" claim, or promptly when a caller signals a 401/403, and publishes
+the new JWT on the client. Waiters simply read client.jwt on each request
+and never pay refresh latency inline.
+
+Usage:
+  refresher = TokenRefresher(client, account_id).start()
+  ...
+  if r.status_code in (401, 403):
+      refresher.signal_auth_failure()
+  ...
+  refresher.stop()
+"""
+
+import threading
+import time
+from token_cache import jwt_expiry
+
+DEFAULT_SKEW = 120          # renew this many seconds before exp
+DEFAULT_MIN_INTERVAL = 30   # never refresh more often than this on auth-failure signals
+FALLBACK_LIFETIME = 900     # refresh cadence when the JWT carries no exp claim
+
+
+class TokenRefresher:
+    def __init__(self, client, account_id, skew=DEFAULT_SKEW,
+                 min_interval=DEFAULT_MIN_INTERVAL, on_refresh=None):
+        self.client = client
+        self.account_id = account_id
+        self.skew = skew
+        self.min_interval = min_interval
+        self.on_refresh = on_refresh
+        self.refreshes = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._last_refresh = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="csp-token-refresher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def signal_auth_failure(self):
+        """Ask for a refresh soon (non-blocking); coalesced and rate-limited."""
+        self._wake.set()
+
+    def _seconds_until_due(self):
+        exp = jwt_expiry(self.client.jwt)
+        if exp is None:
+            return max(0.0, self._last_refresh + FALLBACK_LIFETIME - time.monotonic())
+        return max(0.0, exp - self.skew - time.time())
+
+    def _run(self):
+        while not self._stopped.is_set():
+            signalled = self._wake.wait(timeout=self._seconds_until_due())
+            if self._stopped.is_set():
+                return
+            self._wake.clear()
+            if signalled:
+                # Coalesce bursts of 401/403 into at most one refresh per min_interval
+                backoff = self._last_refresh + self.min_interval - time.monotonic()
+                if backoff > 0 and self._stopped.wait(timeout=backoff):
+                    return
+            if not self._refresh():
+                self._stopped.wait(timeout=self.min_interval)
+
+    def _refresh(self):
+        # Authenticate on a side client so readers never observe the transient
+        # (not yet account-switched) sign-in token, then swap in the result.
+        fresh = type(self.client)(self.client.base_url, self.client.email, self.client.password,
+                                  session=self.client.session, token_cache=self.client.token_cache)
+        try:
+            fresh.login(force=True)
+            fresh.switch_account(self.account_id, force=True)
+        except Exception as e:
+            print(f"⚠️ Background token refresh failed: {e}", flush=True)
+            return False
+        self.client.jwt = fresh.jwt
+        self.client.account_id = fresh.account_id
+        self.refreshes += 1
+        self._last_refresh = time.monotonic()
+        print("🔄 JWT refreshed in background", flush=True)
+        if self.on_refresh:
+            self.on_refresh(fresh.jwt)
+        return True
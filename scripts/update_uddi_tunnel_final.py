@@ -1,15 +1,18 @@
-import os
 import json
 import requests
+from csp_client import CSPClient
+from lookup_cache import get_cache
 
 class InfobloxSession:
     def __init__(self):
-        self.base_url = "https://csp.infoblox.com"
-        self.email = os.getenv("INFOBLOX_EMAIL")
-        self.password = os.getenv("INFOBLOX_PASSWORD")
+        self.client = CSPClient()
+        self.base_url = self.client.base_url
+        self.email = self.client.email
+        self.password = self.client.password
         self.jwt = None
-        self.session = requests.Session()
+        self.session = self.client.session
         self.headers = {"Content-Type": "application/json"}
+        self.lookups = get_cache()
 
     def _auth_headers(self):
         return {
@@ -26,20 +29,12 @@ class InfobloxSession:
             f.write(content)
 
     def login(self):
-        url = f"{self.base_url}/v2/session/users/sign_in"
-        payload = {"email": self.email, "password": self.password}
-        response = self.session.post(url, headers=self.headers, json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = self.client.login()
         print("✅ Logged in")
 
     def switch_account(self):
         sandbox_id = self._read_file("sandbox_id.txt")
-        url = f"{self.base_url}/v2/session/account_switch"
-        payload = {"id": f"identity/accounts/{sandbox_id}"}
-        response = self.session.post(url, headers=self._auth_headers(), json=payload)
-        response.raise_for_status()
-        self.jwt = response.json().get("jwt")
+        self.jwt = self.client.switch_account(sandbox_id)
         print(f"✅ Switched to sandbox: {sandbox_id}")
 
     def get(self, endpoint, params=None):
@@ -64,7 +59,13 @@ class InfobloxSession:
         """
         Returns the default DFP/security policy id.
         """
-        data = self.get("/api/atcfw/v1/security_policies", params={"_fields": "id,name,is_default"})
+        params = {"_fields": "id,name,is_default"}
+        if self.lookups:
+            data = self.lookups.get_json(self.session, f"{self.base_url}/api/atcfw/v1/security_policies",
+                                         self.client.account_id, headers=self._auth_headers(),
+                                         params=params, key="security_policies")
+        else:
+            data = self.get("/api/atcfw/v1/security_policies", params=params)
         for it in data.get("results", []):
             if it.get("is_default") is True:
                 return str(it["id"])
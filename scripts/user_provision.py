@@ -16,12 +16,20 @@ Environment Variables:
   INFOBLOX_EMAIL    - Required. Admin email for CSP JWT auth.
   INFOBLOX_PASSWORD - Required. Admin password for CSP JWT auth.
   CSP_URL           - CSP base URL (default: csp.infoblox.com)
+  CSP_BASE_URL      - Full CSP URL override incl. scheme (e.g. a local mock_csp_server.py)
   USER_DOMAIN       - Domain for user email (default: infoblox.lab)
+  WARM_POOL_RENAME  - Set to 1 to set a warm user's display name to the
+                      participant (its email stays <sandbox name>@USER_DOMAIN)
+  CSP_LOOKUP_CACHE_DISABLE - Set to 1 to always re-fetch the group ids (see lookup_cache.py)
+  RETRY_CREATE_USER_DEADLINE / RETRY_CREATE_USER_MAX_ATTEMPTS
+                    - Override the "create_user" retry policy (see retry_policy.py)
 
 Input Files (from allocation_broker_subtenant.py):
   sandbox_id.txt        - Account UUID for account switching
   sandbox_name.txt      - Used to construct username
   sfdc_account_id.txt   - SFDC ID (saved to credentials)
+  warm_user.json        - Optional. User pre-provisioned by warm_pool.py and delivered
+                          with this sandbox's bundle; used instead of creating one
 
 Output Files:
   user_email.txt        - Generated login email
@@ -32,10 +40,17 @@ Output Files:
 
 import os
 import sys
-import time
 import random
 import string
-import requests
+from csp_client import CSPClient, get_session
+from lab_telemetry import start_run
+from lookup_cache import get_cache
+from pager import iter_items
+from retry_policy import RetryError, get_policy
+from csp_query import any_of, eq, query
+from warm_pool import load_warm_user, rename_user
+
+GROUP_NAMES = ("user", "act_admin")
 
 
 def generate_password(length=16):
@@ -63,44 +78,29 @@ def read_file(filename):
         sys.exit(1)
 
 
-def authenticate(base_url, email, password):
-    """Authenticate with CSP and return JWT headers."""
-    resp = requests.post(
-        f"{base_url}/v2/session/users/sign_in",
-        json={"email": email, "password": password}
-    )
-    resp.raise_for_status()
-    jwt = resp.json()["jwt"]
-    return {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
-
-
-def switch_account(base_url, headers, account_id):
-    """Switch to sandbox account and return new JWT headers."""
-    resp = requests.post(
-        f"{base_url}/v2/session/account_switch",
-        headers=headers,
-        json={"id": f"identity/accounts/{account_id}"}
-    )
-    resp.raise_for_status()
-    jwt = resp.json()["jwt"]
-    return {"Authorization": f"Bearer {jwt}", "Content-Type": "application/json"}
-
-
-def get_groups(base_url, headers):
-    """Fetch user and admin group IDs."""
-    resp = requests.get(f"{base_url}/v2/groups", headers=headers)
-    resp.raise_for_status()
-    groups = resp.json().get("results", [])
-    user_gid = next((g["id"] for g in groups if g.get("name") == "user"), None)
-    admin_gid = next((g["id"] for g in groups if g.get("name") == "act_admin"), None)
-    return user_gid, admin_gid
+def get_groups(base_url, headers, account_id=None):
+    """Fetch user and admin group IDs (cached per account when account_id is given)."""
+    cache = get_cache() if account_id else None
+    found = (cache.get(account_id, "groups", base_url=base_url) if cache else None) or {}
+    if not all(found.get(n) for n in GROUP_NAMES):
+        found = {}
+        params = query(any_of("name", GROUP_NAMES), projection=("id", "name"))
+        for g in iter_items(get_session(), f"{base_url}/v2/groups", headers=headers, params=params):
+            if g.get("name") in GROUP_NAMES:
+                found.setdefault(g["name"], g["id"])
+                if len(found) == len(GROUP_NAMES):
+                    break  # no need to page through the rest
+        if cache and len(found) == len(GROUP_NAMES):
+            cache.put(account_id, "groups", found, base_url=base_url)
+    return found.get("user"), found.get("act_admin")
 
 
 def get_user_id_by_email(base_url, headers, email):
     """Look up existing user by email, return user_id or None."""
-    resp = requests.get(
-        f"{base_url}/v2/users?_filter=email==\"{email}\"",
-        headers=headers
+    resp = get_session().get(
+        f"{base_url}/v2/users",
+        headers=headers,
+        params=query(eq("email", email), projection=("id",))
     )
     if resp.status_code == 200:
         results = resp.json().get("results", [])
@@ -111,7 +111,7 @@ def get_user_id_by_email(base_url, headers, email):
 
 
 def create_user(base_url, headers, name, email, user_gid, admin_gid):
-    """Create user with retries. Returns user_id or None."""
+    """Create user, retrying per the "create_user" policy. Returns user_id or None."""
     payload = {
         "name": name,
         "email": email,
@@ -119,25 +119,28 @@ def create_user(base_url, headers, name, email, user_gid, admin_gid):
         "group_ids": [user_gid, admin_gid]
     }
 
-    for attempt in range(5):
-        try:
-            resp = requests.post(f"{base_url}/v2/users", headers=headers, json=payload)
-            if resp.status_code == 409:
-                print("  ⚠️ User already exists, looking up ID...", flush=True)
-                return get_user_id_by_email(base_url, headers, email)
-            resp.raise_for_status()
-            uid = resp.json().get("result", {}).get("id", "")
-            return uid.split("/")[-1] if "/" in uid else uid
-        except requests.RequestException as e:
-            print(f"  ⚠️ Attempt {attempt + 1} failed: {e}", flush=True)
-            time.sleep((2 ** attempt) + random.random())
-
-    return None
+    def attempt():
+        resp = get_session().post(f"{base_url}/v2/users", headers=headers, json=payload)
+        if resp.status_code == 409:
+            print("  ⚠️ User already exists, looking up ID...", flush=True)
+            return get_user_id_by_email(base_url, headers, email)
+        if policy.retryable(resp):
+            return resp  # retried by the policy, honouring Retry-After
+        resp.raise_for_status()
+        uid = resp.json().get("result", {}).get("id", "")
+        return uid.split("/")[-1] if "/" in uid else uid
+
+    policy = get_policy("create_user")
+    try:
+        return policy.call(attempt, label=f"Create user {email}")
+    except RetryError as e:
+        print(f"  ⚠️ {e}", flush=True)
+        return None
 
 
 def set_password(base_url, headers, user_id, password):
     """Set user password. Returns True on success."""
-    resp = requests.post(
+    resp = get_session().post(
         f"{base_url}/v2/users/{user_id}/password",
         headers=headers,
         json={"new_password": password}
@@ -147,10 +150,44 @@ def set_password(base_url, headers, user_id, password):
 
 def delete_user(base_url, headers, user_id):
     """Delete user by ID. Returns True on success."""
-    resp = requests.delete(f"{base_url}/v2/users/{user_id}", headers=headers)
+    resp = get_session().delete(f"{base_url}/v2/users/{user_id}", headers=headers)
     return resp.status_code in (200, 204)
 
 
+def save_credentials(user_email, user_password, user_id, sfdc_account_id):
+    files = {
+        "user_email.txt": user_email,
+        "user_password.txt": user_password,
+        "user_id.txt": user_id,
+    }
+    for filename, value in files.items():
+        with open(filename, "w") as f:
+            f.write(value)
+
+    with open("user_credentials.sh", "w") as f:
+        f.write("#!/bin/bash\n")
+        f.write("# Auto-generated by user_provision.py\n")
+        f.write(f"export CSP_USER_EMAIL='{user_email}'\n")
+        f.write(f"export CSP_USER_PASSWORD='{user_password}'\n")
+        f.write(f"export CSP_USER_ID='{user_id}'\n")
+        f.write(f"export SFDC_ACCOUNT_ID='{sfdc_account_id}'\n")
+
+
+def print_summary(sandbox_name, sfdc_account_id, user_email, user_password, user_id):
+    print(f"\n{'='*60}", flush=True)
+    print("🎉 User Provisioning Complete!", flush=True)
+    print(f"   Sandbox:  {sandbox_name}", flush=True)
+    print(f"   SFDC ID:  {sfdc_account_id}", flush=True)
+    print(f"   Email:    {user_email}", flush=True)
+    print(f"   Password: {user_password}", flush=True)
+    print(f"   User ID:  {user_id}", flush=True)
+    print(f"\n   Login at: https://csp.infoblox.com", flush=True)
+    print(f"\n   Instruqt:", flush=True)
+    print(f"     set-var CSP_USER_EMAIL '{user_email}'", flush=True)
+    print(f"     set-var CSP_USER_PASSWORD '{user_password}'", flush=True)
+    print(f"{'='*60}", flush=True)
+
+
 # ==============================================================
 # Main
 # ==============================================================
@@ -162,7 +199,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # --- Config ---
-    CSP_URL = f"https://{os.environ.get('CSP_URL', 'csp.infoblox.com')}"
+    CSP_URL = os.environ.get("CSP_BASE_URL") or f"https://{os.environ.get('CSP_URL', 'csp.infoblox.com')}"
     INFOBLOX_EMAIL = os.environ.get("INFOBLOX_EMAIL")
     INFOBLOX_PASSWORD = os.environ.get("INFOBLOX_PASSWORD")
     USER_DOMAIN = os.environ.get("USER_DOMAIN", "infoblox.lab")
@@ -180,6 +217,8 @@ if __name__ == "__main__":
     if not PARTICIPANT_ID:
         print("❌ INSTRUQT_PARTICIPANT_ID not set", flush=True)
         sys.exit(1)
+    run = start_run("user_delete" if args.delete else "user_provision", PARTICIPANT_ID,
+                    attempt_endpoint="/v2/users", sandbox_name=sandbox_name)
 
     # --- Construct user credentials (participant_id is unique per student) ---
     user_email = f"{PARTICIPANT_ID}@{USER_DOMAIN}"
@@ -190,23 +229,46 @@ if __name__ == "__main__":
     print(f"📋 User:     {user_email}", flush=True)
     print()
 
+    # --- Warm pool: user provisioned ahead of time, delivered with the bundle ---
+    warm = None if args.delete else load_warm_user(sandbox_id)
+    if warm:
+        user_email, user_password, user_id = warm["user_email"], warm["user_password"], warm["user_id"]
+        print(f"⚡ Using pre-provisioned user {user_email} (ID: {user_id})", flush=True)
+        if os.environ.get("WARM_POOL_RENAME", "0") == "1":
+            client = CSPClient(CSP_URL, INFOBLOX_EMAIL, INFOBLOX_PASSWORD)
+            if rename_user(client, sandbox_id, user_id, PARTICIPANT_ID):
+                print(f"✅ Renamed to {PARTICIPANT_ID}", flush=True)
+            else:
+                print("⚠️ Rename failed, keeping the sandbox name", flush=True)
+        save_credentials(user_email, user_password, user_id, sfdc_account_id)
+        run.succeed(user_id=user_id, warm=True)
+        print_summary(sandbox_name, sfdc_account_id, user_email, user_password, user_id)
+        sys.exit(0)
+
     # --- Step 1: Authenticate ---
     print("🔐 Authenticating with CSP...", flush=True)
-    headers = authenticate(CSP_URL, INFOBLOX_EMAIL, INFOBLOX_PASSWORD)
+    client = CSPClient(CSP_URL, INFOBLOX_EMAIL, INFOBLOX_PASSWORD)
+    client.login()
     print("✅ Authenticated", flush=True)
 
     # --- Step 2: Switch to sandbox account ---
     print(f"🔁 Switching to sandbox {sandbox_id}...", flush=True)
-    headers = switch_account(CSP_URL, headers, sandbox_id)
-    print("✅ Switched", flush=True)
-    time.sleep(2)
+    client.switch_account(sandbox_id)
+    headers = client.auth_headers()
+    if client.from_cache:
+        print("✅ Switched (cached token)", flush=True)
+    else:
+        print(f"✅ Switched (ready after {client.last_switch_delay:.2f}s)", flush=True)
 
     # --- DELETE mode ---
     if args.delete:
         user_id = read_file("user_id.txt")
+        if os.path.exists("user_email.txt"):
+            user_email = read_file("user_email.txt")  # a warm user is <sandbox name>@USER_DOMAIN
         print(f"\n🗑️ Deleting user {user_email} (ID: {user_id})...", flush=True)
         if delete_user(CSP_URL, headers, user_id):
             print("✅ User deleted", flush=True)
+            run.succeed()
         else:
             print("❌ Delete failed", flush=True)
             sys.exit(1)
@@ -215,7 +277,7 @@ if __name__ == "__main__":
     # --- CREATE mode ---
     # Step 3: Get groups
     print("👥 Fetching groups...", flush=True)
-    user_gid, admin_gid = get_groups(CSP_URL, headers)
+    user_gid, admin_gid = get_groups(CSP_URL, headers, sandbox_id)
     if not user_gid or not admin_gid:
         print("❌ Could not find required groups", flush=True)
         sys.exit(1)
@@ -237,34 +299,6 @@ if __name__ == "__main__":
         print("❌ Password set failed", flush=True)
         sys.exit(1)
 
-    # --- Save credentials ---
-    files = {
-        "user_email.txt": user_email,
-        "user_password.txt": user_password,
-        "user_id.txt": user_id,
-    }
-    for filename, value in files.items():
-        with open(filename, "w") as f:
-            f.write(value)
-
-    with open("user_credentials.sh", "w") as f:
-        f.write("#!/bin/bash\n")
-        f.write("# Auto-generated by user_provision.py\n")
-        f.write(f"export CSP_USER_EMAIL='{user_email}'\n")
-        f.write(f"export CSP_USER_PASSWORD='{user_password}'\n")
-        f.write(f"export CSP_USER_ID='{user_id}'\n")
-        f.write(f"export SFDC_ACCOUNT_ID='{sfdc_account_id}'\n")
-
-    # --- Summary ---
-    print(f"\n{'='*60}", flush=True)
-    print("🎉 User Provisioning Complete!", flush=True)
-    print(f"   Sandbox:  {sandbox_name}", flush=True)
-    print(f"   SFDC ID:  {sfdc_account_id}", flush=True)
-    print(f"   Email:    {user_email}", flush=True)
-    print(f"   Password: {user_password}", flush=True)
-    print(f"   User ID:  {user_id}", flush=True)
-    print(f"\n   Login at: https://csp.infoblox.com", flush=True)
-    print(f"\n   Instruqt:", flush=True)
-    print(f"     set-var CSP_USER_EMAIL '{user_email}'", flush=True)
-    print(f"     set-var CSP_USER_PASSWORD '{user_password}'", flush=True)
-    print(f"{'='*60}", flush=True)
+    save_credentials(user_email, user_password, user_id, sfdc_account_id)
+    run.succeed(user_id=user_id)
+    print_summary(sandbox_name, sfdc_account_id, user_email, user_password, user_id)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Warm-pool pre-provisioning of CSP users in broker sandboxes.
+
+user_provision.py signs in, switches into the sandbox, looks up the groups,
+creates the user and sets the password while the student waits. This tool
+does that ahead of time for pooled, not yet allocated sandboxes and stores
+one ready credential record per sandbox account in a pool directory on the
+operator host. The pool directory holds every sandbox's act_admin password
+and never leaves that host.
+
+Records are claimed centrally: bulk_allocate.py --warm-pool claims the
+record of each sandbox it allocates (an atomic rename, on one host) and
+writes it as warm_user.json into that participant's bundle only.
+allocation_subtenant.py copies it next to sandbox_id.txt and
+user_provision.py uses it instead of creating a user (no CSP round trips).
+Sandboxes allocated live on the VM have no warm record and are provisioned
+as before.
+
+Identity: warm users are created before the participant is known, so their
+login email is <sandbox name>@USER_DOMAIN rather than the cold path's
+<participant id>@USER_DOMAIN. WARM_POOL_RENAME=1 only sets the display
+name to the participant id; the login email stays as created. Tracks that
+need the participant email must not use the warm pool.
+
+Usage:
+  # Pre-provision from a broker pool export (CSV: external_id,name)
+  python3 warm_pool.py provision pool.csv --parallel 4
+
+  # ... or from the sandbox accounts visible to the operator, by name prefix
+  python3 warm_pool.py provision --from-csp --name-prefix lab
+
+  python3 warm_pool.py status
+
+  # Claim while pre-allocating the class (same host as the pool):
+  python3 bulk_allocate.py participants.csv --out-dir bundles --warm-pool
+
+Environment Variables:
+  WARM_POOL_DIR     - Credential records on the operator host, one
+                      <account id>.json per sandbox (default: ~/.cache/infoblox/warm_pool)
+  WARM_POOL_RENAME  - Set to 1 (on the VM) to set a claimed user's display
+                      name to the participant id; the email is unchanged
+  INFOBLOX_EMAIL    - Required for provision. Admin email for CSP JWT auth.
+  INFOBLOX_PASSWORD - Required for provision. Admin password for CSP JWT auth.
+  CSP_BASE_URL      - CSP URL override (e.g. a local mock_csp_server.py)
+  USER_DOMAIN       - Domain for warm user emails (default: infoblox.lab)
+"""
+
+import os
+import csv
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from csp_client import CSPClient, DEFAULT_BASE_URL
+
+DEFAULT_POOL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "infoblox", "warm_pool")
+ACCOUNT_COLUMNS = ("external_id", "account_id", "sandbox_id", "csp_account_id")
+WARM_USER_FILE = "warm_user.json"  # the one record delivered in a participant's bundle
+
+
+def pool_dir():
+    return os.environ.get("WARM_POOL_DIR", DEFAULT_POOL_DIR)
+
+
+def _record_path(account_id, directory=None):
+    return os.path.join(directory or pool_dir(), f"{account_id.split('/')[-1]}.json")
+
+
+def claim_warm_user(account_id, participant_id, directory=None):
+    """
+    Take the warm credential record for a sandbox account, or None.
+    The rename to <id>.claimed is atomic, so a record is handed out once.
+    """
+    if not account_id:
+        return None
+    path = _record_path(account_id, directory)
+    claimed = path[:-len(".json")] + ".claimed"
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    try:
+        with open(claimed) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    record.update(claimed_by=participant_id, claimed_at=int(time.time()))
+    _write_private(claimed, record)
+    return record
+
+
+def claim_into_bundle(account_id, participant_id, bundle_dir, directory=None):
+    """Claim the sandbox's record on the operator host and write it (0600) into one participant's bundle."""
+    path = os.path.join(bundle_dir, WARM_USER_FILE)
+    if os.path.exists(path):
+        return None  # already claimed on an earlier run
+    record = claim_warm_user(account_id, participant_id, directory)
+    if record:
+        _write_private(path, record)
+    return record
+
+
+def copy_bundle_warm_user(bundle_dir, path=WARM_USER_FILE):
+    """Copy the record from this participant's bundle next to the other allocation files (0600)."""
+    try:
+        with open(os.path.join(bundle_dir, WARM_USER_FILE)) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _write_private(path, record)
+    return record
+
+
+def load_warm_user(account_id, path=WARM_USER_FILE):
+    """The warm record delivered with this sandbox's bundle, or None (also if it is for another sandbox)."""
+    try:
+        with open(path) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not account_id or record.get("account_id", "").split("/")[-1] != account_id.split("/")[-1]:
+        return None
+    return record
+
+
+def rename_user(client, account_id, user_id, name):
+    """Set the warm user's display name to the participant (one PATCH)."""
+    client.switch_account(account_id)
+    r = client.request("PATCH", f"/v2/users/{user_id}", json={"name": name})
+    return r.status_code in (200, 204)
+
+
+def _write_private(path, record):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------- provisioning ----------
+def provision_sandbox(account_id, sandbox_name, domain, directory):
+    """Create (or adopt) the warm user in one sandbox and store its credentials."""
+    from user_provision import generate_password, get_groups, create_user, set_password
+
+    client = CSPClient(DEFAULT_BASE_URL)
+    client.switch_account(account_id)
+    headers = client.auth_headers()
+    user_gid, admin_gid = get_groups(client.base_url, headers, account_id)
+    if not user_gid or not admin_gid:
+        raise RuntimeError("required groups not found")
+    email = f"{sandbox_name}@{domain}"
+    user_id = create_user(client.base_url, headers, sandbox_name, email, user_gid, admin_gid)
+    if not user_id:
+        raise RuntimeError("user creation failed")
+    password = generate_password()
+    if not set_password(client.base_url, headers, user_id, password):
+        raise RuntimeError("password set failed")
+    record = {"account_id": account_id, "sandbox_name": sandbox_name, "user_email": email,
+              "user_password": password, "user_id": user_id, "created": int(time.time())}
+    _write_private(_record_path(account_id, directory), record)
+    return record
+
+
+def read_pool_csv(path):
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip().lower(): c for c in reader.fieldnames or []}
+        id_col = next((columns[c] for c in ACCOUNT_COLUMNS if c in columns), None)
+        if id_col is None or "name" not in columns:
+            raise SystemExit(f"❌ {path}: need external_id and name columns (have: {', '.join(columns)})")
+        return [((row[id_col] or "").strip().split("/")[-1], (row[columns["name"]] or "").strip())
+                for row in reader if (row.get(id_col) or "").strip()]
+
+
+def list_csp_sandboxes(name_prefix):
+    """(account id, name) of the operator's sandbox accounts whose name starts with name_prefix."""
+    client = CSPClient(DEFAULT_BASE_URL)
+    client.login()
+    r = client.get("/v2/sandbox/accounts")
+    r.raise_for_status()
+    sandboxes = []
+    for acct in r.json().get("results", []):
+        name = acct.get("name", "")
+        account_id = ((acct.get("admin_user") or {}).get("account_id") or "").split("/")[-1]  # external id
+        if account_id and name.startswith(name_prefix or ""):
+            sandboxes.append((account_id, name))
+    return sandboxes
+
+
+def cmd_provision(args):
+    if not (os.getenv("INFOBLOX_EMAIL") and os.getenv("INFOBLOX_PASSWORD")):
+        print("❌ Set INFOBLOX_EMAIL and INFOBLOX_PASSWORD", flush=True)
+        sys.exit(1)
+    sandboxes = list_csp_sandboxes(args.name_prefix) if args.from_csp else read_pool_csv(args.csv)
+    directory = pool_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    todo = [(a, n) for a, n in sandboxes
+            if not os.path.exists(_record_path(a, directory))
+            and not os.path.exists(_record_path(a, directory)[:-len(".json")] + ".claimed")]
+    print(f"🔥 Warming {len(todo)} of {len(sandboxes)} sandbox(es) into {directory} "
+          f"(parallel={args.parallel})", flush=True)
+
+    start, failed = time.monotonic(), 0
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as pool:
+        futures = {pool.submit(provision_sandbox, a, n, args.domain, directory): (a, n) for a, n in todo}
+        for i, future in enumerate(as_completed(futures), 1):
+            account_id, name = futures[future]
+            try:
+                record = future.result()
+                print(f"   ✅ [{i}/{len(todo)}] {name}: {record['user_email']}", flush=True)
+            except Exception as e:  # one bad sandbox must not stop the warm-up
+                failed += 1
+                print(f"   ❌ [{i}/{len(todo)}] {name} ({account_id}): {e}", flush=True)
+    print(f"🏁 Warmed {len(todo) - failed}/{len(todo)} in {time.monotonic() - start:.1f}s", flush=True)
+    sys.exit(1 if failed else 0)
+
+
+def cmd_status(args):
+    directory = pool_dir()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        names = []
+    ready = [n for n in names if n.endswith(".json")]
+    claimed = [n for n in names if n.endswith(".claimed")]
+    print(f"🔥 Warm pool {directory}: {len(ready)} ready, {len(claimed)} claimed", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-provision CSP users in pooled broker sandboxes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("provision", help="Create warm users")
+    p.add_argument("csv", nargs="?", help="Pool export with external_id and name columns")
+    p.add_argument("--from-csp", action="store_true", help="List sandbox accounts from CSP instead")
+    p.add_argument("--name-prefix", default=os.environ.get("SANDBOX_NAME_PREFIX", "lab"))
+    p.add_argument("--domain", default=os.environ.get("USER_DOMAIN", "infoblox.lab"))
+    p.add_argument("--parallel", type=int, default=4)
+    sub.add_parser("status", help="Count ready / claimed records")
+    args = parser.parse_args()
+
+    if args.command == "provision":
+        if not (args.csv or args.from_csp):
+            parser.error("give a pool CSV or --from-csp")
+        cmd_provision(args)
+    else:
+        cmd_status(args)
+
+
+if __name__ == "__main__":
+    main()
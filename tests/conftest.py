@@ -0,0 +1,6 @@
+"""The lab scripts are a flat directory of modules, not a package: import them from scripts/."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
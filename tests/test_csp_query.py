@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from csp_query import and_, any_of, contains, eq, fields, literal, matches, not_, query, regex_escape
+from mock_csp_server import _filter_match
+
+
+def test_literal_quotes_and_backslashes():
+    assert literal('say "hi"') == r'"say \"hi\""'
+    assert literal("a\\b") == r'"a\\b"'
+    assert literal(None) == "null"
+    assert literal(True) == "true"
+    assert literal(3) == "3"
+
+
+def test_eq_and_grouping():
+    assert eq("name", "user") == 'name=="user"'
+    assert and_(eq("a", 1)) == "a==1"
+    assert and_(eq("a", 1), "", eq("b", 2)) == "(a==1 and b==2)"
+    assert any_of("name", ["user", "act_admin"]) == '(name=="user" or name=="act_admin")'
+    assert not_(eq("a", 1)) == "not (a==1)"
+
+
+def test_invalid_field_rejected():
+    with pytest.raises(ValueError):
+        eq("name) or (1", "x")
+    with pytest.raises(ValueError):
+        any_of("name", [])
+
+
+def test_contains_leaves_plain_ids_unescaped():
+    # Participant ids carry hyphens; re.escape would send abc\-123
+    assert contains("name", "abc-123_x") == 'name~"abc-123_x"'
+
+
+@pytest.mark.parametrize("text", ["a.b", "x*y", "a+b?", "(grp)", "[v]", "{1}", "a|b", "$HOME", "^start",
+                                  "back\\slash", 'q"uote', "lab-adventure-0086"])
+def test_contains_pattern_matches_the_literal_text(text):
+    assert re.search(regex_escape(text), f"--{text}--")
+
+
+@pytest.mark.parametrize("text, other", [("a.b", "aXb"), ("x*y", "xxxy"), ("a+b", "aab"), ("a|b", "a"),
+                                         ("(grp)", "grp"), ("[v]", "v")])
+def test_contains_pattern_has_no_regex_meaning(text, other):
+    assert not re.search(regex_escape(text), other)
+
+
+def test_contains_without_backslash_escapes_for_metacharacters():
+    # Means the same whether or not the server unescapes the string literal
+    assert regex_escape("a.b*c") == "a[.]b[*]c"
+    assert "\\" not in regex_escape("v1.2 (beta)|{y}$")
+
+
+def test_contains_round_trips_through_the_mock_filter_parser():
+    view = {"name": "default.view (abc-1.2)", "type": "view"}
+    assert _filter_match(and_(eq("type", "view"), contains("name", "abc-1.2")), view)
+    assert not _filter_match(contains("name", "abc-1x2"), view)
+    assert _filter_match(contains("name", 'a"b\\c'), {"name": 'xa"b\\cx'})
+
+
+def test_query_projection():
+    assert query(eq("a", 1), projection=("id", "name"), _limit=5) == {
+        "_filter": "a==1", "_fields": "id,name", "_limit": 5}
+    assert query(projection="id") == {"_fields": "id"}
+    assert query() == {}
+    assert fields(["id", "config.name"]) == "id,config.name"
+    assert matches("name", "^lab") == 'name~"^lab"'
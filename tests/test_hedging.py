@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from hedging import LatencyWindow, hedged_call
+
+
+@pytest.fixture
+def window(tmp_path):
+    return LatencyWindow("t", path=str(tmp_path / "hedge.json"))
+
+
+def scripted(*delays):
+    """fn whose n-th call sleeps delays[n] and returns its call number."""
+    calls = iter(range(len(delays)))
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            n = next(calls)
+        time.sleep(delays[n])
+        return n
+    return fn
+
+
+def wait_for_samples(window, n, timeout=2.0):
+    end = time.monotonic() + timeout
+    while len(window.entry()["samples"]) < n and time.monotonic() < end:
+        time.sleep(0.01)
+    return window.entry()["samples"]
+
+
+def test_primary_latency_recorded_without_hedge(window):
+    assert hedged_call(scripted(0.01), window, delay=1.0) == 0
+    samples = window.entry()["samples"]
+    assert len(samples) == 1 and samples[0] < 1.0
+    assert window.entry()["counters"] == {"calls": 1}
+
+
+def test_hedge_win_records_the_primary_later_not_the_hedge(window):
+    assert hedged_call(scripted(0.5, 0.01), window, delay=0.05) == 1
+    assert window.entry()["samples"] == []  # hedge latency is never a sample
+    samples = wait_for_samples(window, 1)
+    assert len(samples) == 1 and samples[0] >= 0.5
+    counters = window.entry()["counters"]
+    assert counters["won"] == 1 and counters["saved_samples"] == 1
+
+
+def test_primary_win_after_hedge_fired_records_primary(window):
+    assert hedged_call(scripted(0.2, 1.0), window, delay=0.05) == 0
+    samples = window.entry()["samples"]
+    assert len(samples) == 1 and samples[0] >= 0.2
+    assert window.entry()["counters"]["won"] == 0
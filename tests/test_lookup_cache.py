@@ -0,0 +1,138 @@
+import pytest
+
+import lookup_cache
+from lookup_cache import LookupCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, etag=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = {"ETag": etag} if etag else {}
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(lookup_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return LookupCache(path=str(tmp_path / "lookups.json"), ttl=60)
+
+
+def test_get_within_ttl_only(cache, clock):
+    cache.put("acct", "groups", {"user": "g1"})
+    assert cache.get("acct", "groups") == {"user": "g1"}
+    assert cache.get("other", "groups") is None
+    clock.now += 61
+    assert cache.get("acct", "groups", "miss") == "miss"
+    assert cache.entry("acct", "groups")["value"] == {"user": "g1"}  # kept for revalidation
+
+
+def test_cached_calls_loader_once_per_ttl(cache, clock):
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return None
+    assert cache.cached("acct", "k", loader) is None
+    assert cache.cached("acct", "k", loader) is None
+    assert len(calls) == 1
+    clock.now += 61
+    cache.cached("acct", "k", loader)
+    assert len(calls) == 2
+
+
+def test_cached_loader_error_caches_nothing(cache):
+    def failing():
+        raise RuntimeError("HTTP 503")
+    with pytest.raises(RuntimeError):
+        cache.cached("acct", "k", failing)
+    assert cache.entry("acct", "k") is None
+
+
+def test_get_json_fresh_entry_makes_no_request(cache):
+    session = FakeSession(FakeResponse(200, {"results": [1]}, etag='"v1"'))
+    assert cache.get_json(session, "https://x/api/p", "acct", key="p") == {"results": [1]}
+    assert cache.get_json(session, "https://x/api/p", "acct", key="p") == {"results": [1]}
+    assert len(session.calls) == 1
+
+
+def test_get_json_revalidates_with_etag(cache, clock):
+    session = FakeSession(FakeResponse(200, {"v": 1}, etag='"v1"'), FakeResponse(304),
+                          FakeResponse(200, {"v": 2}, etag='"v2"'))
+    cache.get_json(session, "https://x/api/p", "acct", key="p")
+    clock.now += 61
+    assert cache.get_json(session, "https://x/api/p", "acct", key="p") == {"v": 1}
+    assert session.calls[1]["If-None-Match"] == '"v1"'
+    assert cache.get("acct", "p", base_url="https://x") == {"v": 1}  # 304 renewed the TTL
+    clock.now += 61
+    assert cache.get_json(session, "https://x/api/p", "acct", key="p") == {"v": 2}
+    assert cache.entry("acct", "p", base_url="https://x")["etag"] == '"v2"'
+
+
+def test_get_json_error_is_not_cached(cache):
+    session = FakeSession(FakeResponse(503))
+    with pytest.raises(RuntimeError):
+        cache.get_json(session, "https://x/api/p", "acct", key="p")
+    assert cache.entry("acct", "p", base_url="https://x") is None
+
+
+def test_entries_are_separated_by_base_url(cache):
+    cache.put("acct", "credentials_endpoint", "/mock/path", base_url="http://127.0.0.1:8080/")
+    assert cache.get("acct", "credentials_endpoint", base_url="https://csp.infoblox.com") is None
+    assert cache.get("acct", "credentials_endpoint", base_url="HTTP://127.0.0.1:8080") == "/mock/path"
+
+
+def test_get_json_keys_by_the_url_host(cache):
+    mock = FakeSession(FakeResponse(200, {"v": "mock"}))
+    prod = FakeSession(FakeResponse(200, {"v": "prod"}))
+    assert cache.get_json(mock, "http://127.0.0.1:8080/api/p", "acct", key="p") == {"v": "mock"}
+    assert cache.get_json(prod, "https://csp.infoblox.com/api/p", "acct", key="p") == {"v": "prod"}
+    assert cache.get("acct", "p", base_url="http://127.0.0.1:8080") == {"v": "mock"}
+
+
+def test_invalidate_by_base_url(cache):
+    cache.put("a", "k", 1, base_url="http://mock")
+    cache.put("a", "k", 2, base_url="https://csp.infoblox.com")
+    assert cache.invalidate("a", "k", base_url="http://mock") == 1
+    assert cache.get("a", "k", base_url="https://csp.infoblox.com") == 2
+
+
+def test_invalidate(cache):
+    cache.put("a", "k1", 1)
+    cache.put("a", "k2", 2)
+    cache.put("b", "k1", 3)
+    assert cache.invalidate("a", "k1") == 1
+    assert cache.get("a", "k2") == 2
+    assert cache.invalidate("a") == 1
+    assert cache.get("b", "k1") == 3
+    assert cache.invalidate() == 1
@@ -0,0 +1,93 @@
+import pytest
+
+from pager import iter_items, list_all
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class FakeSession:
+    """Serves pages from a handler(params) and records the params of every request."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def get(self, url, headers=None, params=None):
+        self.calls.append(dict(params or {}))
+        return FakeResponse(self.handler(dict(params or {})))
+
+
+def offset_endpoint(total, report_total=True):
+    objects = [{"id": str(i)} for i in range(total)]
+
+    def handler(params):
+        offset, limit = int(params.get("_offset", 0)), int(params.get("_limit", total))
+        page = {"results": objects[offset:offset + limit]}
+        if report_total:
+            page["total_size"] = total
+        return page
+    return handler
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_offset_paging_walks_every_page(prefetch):
+    session = FakeSession(offset_endpoint(25))
+    items = list(iter_items(session, "u", params={"_filter": "x"}, limit=10, prefetch=prefetch))
+    assert [i["id"] for i in items] == [str(i) for i in range(25)]
+    assert [c["_offset"] for c in session.calls] == [0, 10, 20]
+    assert all(c["_filter"] == "x" for c in session.calls)
+
+
+def test_offset_paging_stops_on_total_size_without_an_empty_page():
+    session = FakeSession(offset_endpoint(20))
+    assert len(list_all(session, "u", limit=10)) == 20
+    assert len(session.calls) == 2
+
+
+def test_offset_paging_without_total_size_stops_on_short_page():
+    session = FakeSession(offset_endpoint(20, report_total=False))
+    assert len(list_all(session, "u", limit=10)) == 20
+    assert [c["_offset"] for c in session.calls] == [0, 10, 20]
+
+
+def test_endpoint_ignoring_offset_is_read_once():
+    session = FakeSession(lambda params: {"results": [{"id": "a"}, {"id": "b"}]})
+    assert [i["id"] for i in list_all(session, "u", limit=2)] == ["a", "b"]
+
+
+@pytest.mark.parametrize("key", ["next_page_token", "page_token", "next"])
+def test_token_paging_sends_the_token_back(key):
+    pages = {None: ([1, 2], "t1"), "t1": ([3], "t2"), "t2": ([4], None)}
+
+    def handler(params):
+        items, token = pages[params.get("page_token")]
+        return {"results": [{"id": i} for i in items], **({key: token} if token else {})}
+    session = FakeSession(handler)
+    items = list_all(session, "u", limit=None, token_param="page_token")
+    assert [i["id"] for i in items] == [1, 2, 3, 4]
+    assert [c.get("page_token") for c in session.calls] == [None, "t1", "t2"]
+    assert all("_offset" not in c for c in session.calls)
+
+
+def test_token_paging_drops_offset_and_stops_on_repeated_token():
+    session = FakeSession(lambda params: {"results": [{"id": params.get("_page_token", "first")}], "next": "same"})
+    items = list_all(session, "u", limit=1)
+    assert [i["id"] for i in items] == ["first", "same"]
+    assert "_offset" not in session.calls[1]
+    assert len(session.calls) == 2
+
+
+def test_bare_list_response_is_one_page():
+    session = FakeSession(lambda params: [{"id": 1}, {"id": 2}])
+    assert len(list_all(session, "u", limit=None)) == 2
+    assert len(session.calls) == 1
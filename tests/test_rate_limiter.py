@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+import requests
+
+import rate_limiter
+import retry_policy
+from rate_limiter import RateLimiter, parse_budgets
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    monkeypatch.setattr(retry_policy, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(tmp_path, clock, monkeypatch):
+    monkeypatch.delenv("RATE_LIMIT_BUDGETS", raising=False)
+    return RateLimiter(state_dir=str(tmp_path / "rl"), budgets={"t": (2.0, 4)})
+
+
+def test_parse_budgets():
+    assert parse_budgets("broker=0.5/2, csp:read=20/40") == {"broker": (0.5, 2), "csp:read": (20.0, 40)}
+    assert parse_budgets("x=3") == {"x": (3.0, 3)}
+    assert parse_budgets("") == {}
+
+
+def test_burst_then_wait_for_refill(limiter, clock):
+    assert [limiter._try_take("t") for _ in range(4)] == [0.0] * 4
+    assert limiter._try_take("t") == pytest.approx(0.5)  # 1 token at 2/s
+    clock.now += 1.0
+    assert limiter._try_take("t") == 0.0
+    assert limiter._try_take("t") == 0.0
+    assert limiter._try_take("t") == pytest.approx(0.5)
+
+
+def test_refill_is_capped_at_burst(limiter, clock):
+    limiter._try_take("t", n=4)
+    clock.now += 3600
+    assert limiter._try_take("t", n=4) == 0.0
+    assert limiter._try_take("t") == pytest.approx(0.5)
+
+
+def test_acquire_sleeps_the_computed_wait(limiter, clock):
+    for _ in range(4):
+        limiter.acquire("t")
+    assert limiter.acquire("t", n=2) == pytest.approx(1.0)
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_penalty_blocks_and_loads_the_bucket(limiter, clock):
+    assert limiter.load("t") == 0.0
+    limiter.penalize("t", 5)
+    assert limiter.load("t") == 1.0
+    assert limiter._try_take("t") == pytest.approx(5)
+    clock.now += 5 + rate_limiter.THROTTLE_MEMORY_SECONDS / 2
+    assert limiter.load("t") == pytest.approx(0.5)  # refilled, but recently throttled
+    clock.now += rate_limiter.THROTTLE_MEMORY_SECONDS
+    assert limiter.load("t") == 0.0
+
+
+def test_penalty_is_capped(limiter):
+    limiter.penalize("t", 10 ** 6)
+    assert limiter._try_take("t") == pytest.approx(rate_limiter.MAX_PENALTY_SECONDS)
+
+
+def test_observe_retry_after(limiter):
+    r = requests.Response()
+    r.status_code = 429
+    r.headers["Retry-After"] = "12"
+    limiter.observe("t", r)
+    assert limiter._try_take("t") == pytest.approx(12)
+
+
+def test_acquire_stops_at_the_retry_deadline(limiter, clock):
+    limiter.penalize("t", 300)
+    with retry_policy.deadline(60):
+        with pytest.raises(retry_policy.DeadlineExceeded):
+            limiter.acquire("t")
+    assert clock.sleeps and max(clock.sleeps) <= 60
+
+
+def test_acquire_async(limiter, clock, monkeypatch):
+    async def fake_sleep(seconds):
+        clock.sleep(seconds)
+    monkeypatch.setattr(rate_limiter.asyncio, "sleep", fake_sleep)
+    for _ in range(4):
+        limiter.acquire("t")
+
+    async def main():
+        return await limiter.acquire_async("t")
+    assert asyncio.run(main()) == pytest.approx(0.5)
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+def test_state_files_are_private(limiter, tmp_path):
+    limiter.acquire("t")
+    assert (tmp_path / "rl").stat().st_mode & 0o777 == 0o700
+    assert (tmp_path / "rl" / "t.json").stat().st_mode & 0o777 == 0o600
+
+
+def test_bucket_classification(limiter):
+    assert limiter.bucket_for("POST", "https://csp.infoblox.com/v2/session/users/sign_in") == "csp:auth"
+    assert limiter.bucket_for("GET", "https://csp.infoblox.com/api/ddi/v1/dns/view") == "csp:read"
+    assert limiter.bucket_for("DELETE", "https://csp.infoblox.com/api/ddi/v1/dns/view/x") == "csp:write"
+    assert limiter.bucket_for("POST", "https://api-sandbox-broker.highvelocitynetworking.com/v1/allocate") == "broker"
@@ -0,0 +1,109 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+import retry_policy
+from retry_policy import DeadlineExceeded, Retry, RetryError, RetryPolicy, parse_retry_after, remaining
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(retry_policy.time, "sleep", recorded.append)
+    return recorded
+
+
+def response(status, retry_after=None):
+    r = requests.Response()
+    r.status_code = status
+    if retry_after is not None:
+        r.headers["Retry-After"] = retry_after
+    return r
+
+
+@pytest.mark.parametrize("previous", [0.0, 1.0, 2.0, 7.5, 100.0])
+def test_backoff_stays_within_decorrelated_jitter_bounds(previous):
+    policy = RetryPolicy("t", base=1.0, cap=20.0)
+    upper = min(20.0, max(1.0, previous * 3))
+    for _ in range(500):
+        assert 1.0 <= policy.backoff(previous) <= upper
+
+
+def test_backoff_never_exceeds_cap():
+    policy = RetryPolicy("t", base=5.0, cap=6.0)
+    assert max(policy.backoff(60.0) for _ in range(200)) <= 6.0
+
+
+def test_call_retries_until_final_value(sleeps):
+    outcomes = iter([Retry("not yet"), response(503), "done"])
+    policy = RetryPolicy("t", base=0.5, cap=4.0, verbose=False)
+    assert policy.call(lambda: next(outcomes)) == "done"
+    assert len(sleeps) == 2
+    assert all(0.5 <= s <= 4.0 for s in sleeps)
+
+
+def test_call_honours_retry_after(sleeps):
+    outcomes = iter([response(429, "7"), Retry(after=0.1), "ok"])
+    policy = RetryPolicy("t", base=0.5, cap=4.0, verbose=False)
+    policy.call(lambda: next(outcomes))
+    assert sleeps == [7, 0.5]  # server delay wins over the cap; never below base
+
+
+def test_call_returns_non_retryable_response(sleeps):
+    policy = RetryPolicy("t", verbose=False)
+    assert policy.call(lambda: response(404)).status_code == 404
+    assert sleeps == []
+
+
+def test_call_gives_up_after_max_attempts(sleeps):
+    policy = RetryPolicy("t", base=0.1, cap=0.1, max_attempts=3, verbose=False)
+    with pytest.raises(RetryError) as e:
+        policy.call(lambda: Retry("still busy"))
+    assert e.value.attempts == 3
+    assert len(sleeps) == 2
+
+
+def test_call_async_retries_httpx_responses_and_transport_errors(monkeypatch):
+    slept = []
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", fake_sleep)
+    outcomes = iter([httpx.ConnectError("reset"), httpx.Response(429, headers={"Retry-After": "3"}),
+                     httpx.Response(204)])
+
+    async def attempt():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    policy = RetryPolicy("t", base=0.5, cap=1.0, retry_exceptions=(httpx.TransportError,), verbose=False)
+    assert asyncio.run(policy.call_async(attempt)).status_code == 204
+    assert len(slept) == 2 and slept[1] == 3
+
+
+def test_call_stops_at_deadline():
+    policy = RetryPolicy("t", base=0.02, cap=0.05, deadline=0.2, verbose=False)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        policy.call(lambda: Retry())
+    assert time.monotonic() - start < 0.5
+
+
+def test_nested_deadline_takes_the_sooner():
+    with retry_policy.deadline(10):
+        with retry_policy.deadline(0.5):
+            assert remaining() <= 0.5
+        assert remaining() > 5
+    assert remaining() is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("3") == 3
+    assert parse_retry_after("100000") == retry_policy.MAX_RETRY_AFTER
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:10 GMT", now=1445412480) == pytest.approx(10)
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,75 @@
+import base64
+import json
+import time
+
+import pytest
+
+from token_cache import TokenCache, jwt_expiry, normalize_base_url
+
+PROD = "https://csp.infoblox.com"
+MOCK = "http://127.0.0.1:8080"
+
+
+def make_jwt(exp=None):
+    claims = {} if exp is None else {"exp": exp}
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"hdr.{payload}.sig"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TokenCache(path=str(tmp_path / "tokens.json"), min_ttl=300)
+
+
+def test_jwt_expiry():
+    assert jwt_expiry(make_jwt(1234)) == 1234.0
+    assert jwt_expiry(make_jwt()) is None
+    assert jwt_expiry("not-a-jwt") is None
+
+
+def test_round_trip_and_email_case(cache):
+    token = make_jwt(time.time() + 3600)
+    cache.put("Admin@Example.com", "acct", token, base_url=PROD)
+    assert cache.get("admin@example.com", "acct", base_url=PROD) == token
+
+
+def test_keys_separate_account_and_base_url(cache):
+    token = make_jwt(time.time() + 3600)
+    cache.put("a@b.c", "acct", token, base_url=MOCK)
+    assert cache.get("a@b.c", None, base_url=MOCK) is None
+    assert cache.get("a@b.c", "other", base_url=MOCK) is None
+    assert cache.get("a@b.c", "acct", base_url=PROD) is None
+    assert cache.get("a@b.c", "acct", base_url=MOCK + "/") == token
+
+
+def test_normalize_base_url():
+    assert normalize_base_url("HTTPS://CSP.Infoblox.com/") == PROD
+    assert normalize_base_url("csp.infoblox.com") == PROD
+    assert normalize_base_url(None) == "-"
+
+
+def test_token_near_expiry_is_not_reused(cache):
+    cache.put("a@b.c", None, make_jwt(time.time() + 200), base_url=PROD)
+    assert cache.get("a@b.c", base_url=PROD) is None
+
+
+def test_token_without_exp_is_never_cached(cache, tmp_path):
+    cache.put("a@b.c", None, make_jwt(), base_url=PROD)
+    assert cache.get("a@b.c", base_url=PROD) is None
+    assert not (tmp_path / "tokens.json").exists()
+
+
+def test_invalidate_and_expired_entries_pruned(cache):
+    cache.put("a@b.c", "old", make_jwt(time.time() - 10), base_url=PROD)
+    cache.put("a@b.c", "acct", make_jwt(time.time() + 3600), base_url=PROD)
+    cache.put("a@b.c", "keep", make_jwt(time.time() + 3600), base_url=PROD)
+    with open(cache.path) as f:
+        assert len(json.load(f)) == 2
+    cache.invalidate("a@b.c", "acct", base_url=PROD)
+    assert cache.get("a@b.c", "acct", base_url=PROD) is None
+    assert cache.get("a@b.c", "keep", base_url=PROD) is not None
+
+
+def test_cache_file_is_private(cache, tmp_path):
+    cache.put("a@b.c", None, make_jwt(time.time() + 3600), base_url=PROD)
+    assert (tmp_path / "tokens.json").stat().st_mode & 0o777 == 0o600